@@ -2,20 +2,25 @@ import logging
 import time
 from datetime import datetime
 from datetime import timezone
+from multiprocessing.managers import BaseManager
 
+import dask
 from dask.distributed import Client
 from dask.distributed import Future
 from distributed import LocalCluster
 from sqlalchemy.orm import Session
 
+from danswer.configs.app_configs import ENABLE_SHARED_EMBEDDING_SERVICE
+from danswer.configs.app_configs import NUM_CHUNKING_PROCESSES
 from danswer.configs.app_configs import NUM_INDEXING_WORKERS
+from danswer.configs.app_configs import PDF_EXTRACTION_PROCESSES
 from danswer.connectors.factory import instantiate_connector
 from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
 from danswer.connectors.interfaces import PollConnector
 from danswer.connectors.models import IndexAttemptMetadata
 from danswer.connectors.models import InputType
-from danswer.datastores.indexing_pipeline import build_indexing_pipeline
+from danswer.datastores.indexing_pipeline import build_staged_indexing_pipeline
 from danswer.db.connector import disable_connector
 from danswer.db.connector import fetch_connectors
 from danswer.db.connector_credential_pair import get_last_successful_attempt_time
@@ -36,6 +41,10 @@ from danswer.db.index_attempt import update_docs_indexed
 from danswer.db.models import Connector
 from danswer.db.models import IndexAttempt
 from danswer.db.models import IndexingStatus
+from danswer.search.embedding_service import EmbeddingServiceConnectionInfo
+from danswer.search.embedding_service import get_embedding_service_stats
+from danswer.search.embedding_service import SharedServiceEmbedder
+from danswer.search.embedding_service import start_embedding_service
 from danswer.search.search_utils import warm_up_models
 from danswer.utils.acl import set_acl_for_vespa_nonblocking
 from danswer.utils.logger import IndexAttemptSingleton
@@ -191,11 +200,14 @@ def cleanup_indexing_jobs(
 def _run_indexing(
     db_session: Session,
     index_attempt: IndexAttempt,
+    embedding_service_info: EmbeddingServiceConnectionInfo | None = None,
 ) -> None:
     """
     1. Get documents which are either new or updated from specified application
     2. Embed and index these documents into the chosen datastores (e.g. Qdrant / Typesense or Vespa)
     3. Updates Postgres to record the indexed documents + the outcome of this run
+    If `embedding_service_info` is provided, embedding is done by the shared embedding
+    service rather than by a model loaded in this process
     """
 
     def _get_document_generator(
@@ -264,7 +276,11 @@ def _run_indexing(
         doc_batch_generator: GenerateDocumentsOutput,
         run_time: float,
     ) -> None:
-        indexing_pipeline = build_indexing_pipeline()
+        indexing_pipeline = build_staged_indexing_pipeline(
+            embedder=SharedServiceEmbedder(embedding_service_info)
+            if embedding_service_info
+            else None
+        )
 
         run_dt = datetime.fromtimestamp(run_time, tz=timezone.utc)
         db_connector = attempt.connector
@@ -282,18 +298,17 @@ def _run_indexing(
             net_doc_change = 0
             document_count = 0
             chunk_count = 0
-            for doc_batch in doc_batch_generator:
+            for doc_batch, new_docs, total_batch_chunks in indexing_pipeline(
+                doc_batch_generator=doc_batch_generator,
+                index_attempt_metadata=IndexAttemptMetadata(
+                    connector_id=db_connector.id,
+                    credential_id=db_credential.id,
+                ),
+            ):
                 logger.debug(
-                    f"Indexing batch of documents: {[doc.to_short_descriptor() for doc in doc_batch]}"
+                    f"Indexed batch of documents: {[doc.to_short_descriptor() for doc in doc_batch]}"
                 )
 
-                new_docs, total_batch_chunks = indexing_pipeline(
-                    documents=doc_batch,
-                    index_attempt_metadata=IndexAttemptMetadata(
-                        connector_id=db_connector.id,
-                        credential_id=db_credential.id,
-                    ),
-                )
                 net_doc_change += new_docs
                 chunk_count += total_batch_chunks
                 document_count += len(doc_batch)
@@ -345,7 +360,10 @@ def _run_indexing(
     _index(db_session, index_attempt, doc_batch_generator, run_time)
 
 
-def _run_indexing_entrypoint(index_attempt_id: int) -> None:
+def _run_indexing_entrypoint(
+    index_attempt_id: int,
+    embedding_service_info: EmbeddingServiceConnectionInfo | None = None,
+) -> None:
     """Entrypoint for indexing run when using dask distributed.
     Wraps the actual logic in a `try` block so that we can catch any exceptions
     and mark the attempt as failed."""
@@ -378,6 +396,7 @@ def _run_indexing_entrypoint(index_attempt_id: int) -> None:
             _run_indexing(
                 db_session=db_session,
                 index_attempt=attempt,
+                embedding_service_info=embedding_service_info,
             )
 
             logger.info(
@@ -393,6 +412,7 @@ def kickoff_indexing_jobs(
     db_session: Session,
     existing_jobs: dict[int, Future],
     client: Client,
+    embedding_service_info: EmbeddingServiceConnectionInfo | None = None,
 ) -> dict[int, Future]:
     existing_jobs_copy = existing_jobs.copy()
 
@@ -424,13 +444,30 @@ def kickoff_indexing_jobs(
             f"with credentials: '{attempt.credential_id}'"
         )
         mark_attempt_in_progress(attempt, db_session)
-        run = client.submit(_run_indexing_entrypoint, attempt.id, pure=False)
+        run = client.submit(
+            _run_indexing_entrypoint, attempt.id, embedding_service_info, pure=False
+        )
         existing_jobs_copy[attempt.id] = run
 
     return existing_jobs_copy
 
 
-def update_loop(delay: int = 10, num_workers: int = NUM_INDEXING_WORKERS) -> None:
+def update_loop(
+    delay: int = 10,
+    num_workers: int = NUM_INDEXING_WORKERS,
+    use_shared_embedding_service: bool = ENABLE_SHARED_EMBEDDING_SERVICE,
+) -> None:
+    # the manager must stay referenced for the service process to stay up
+    embedding_service_manager: BaseManager | None = None
+    embedding_service_info: EmbeddingServiceConnectionInfo | None = None
+    if use_shared_embedding_service:
+        embedding_service_manager, embedding_service_info = start_embedding_service()
+
+    if NUM_CHUNKING_PROCESSES > 1 or PDF_EXTRACTION_PROCESSES > 0:
+        # daemonic processes can't start children, which the chunking pool and PDF
+        # extraction need to when enabled
+        dask.config.set({"distributed.worker.daemon": False})
+
     cluster = LocalCluster(
         n_workers=num_workers,
         threads_per_worker=1,
@@ -466,8 +503,16 @@ def update_loop(delay: int = 10, num_workers: int = NUM_INDEXING_WORKERS) -> Non
                 )
                 create_indexing_jobs(db_session=db_session, existing_jobs=existing_jobs)
                 existing_jobs = kickoff_indexing_jobs(
-                    db_session=db_session, existing_jobs=existing_jobs, client=client
+                    db_session=db_session,
+                    existing_jobs=existing_jobs,
+                    client=client,
+                    embedding_service_info=embedding_service_info,
+                )
+            if embedding_service_manager is not None:
+                embedding_service_stats = get_embedding_service_stats(
+                    embedding_service_manager
                 )
+                logger.info(f"Embedding service stats: {embedding_service_stats}")
         except Exception as e:
             logger.exception(f"Failed to run update due to {e}")
         sleep_time = delay - (time.time() - start)
@@ -476,7 +521,9 @@ def update_loop(delay: int = 10, num_workers: int = NUM_INDEXING_WORKERS) -> Non
 
 
 if __name__ == "__main__":
-    logger.info("Warming up Embedding Model(s)")
-    warm_up_models(indexer_only=True)
+    # with the shared embedding service, the model is only loaded in the service process
+    if not ENABLE_SHARED_EMBEDDING_SERVICE:
+        logger.info("Warming up Embedding Model(s)")
+        warm_up_models(indexer_only=True)
     logger.info("Starting Indexing Loop")
     update_loop()
@@ -13,6 +13,7 @@ from slack_sdk.models.metadata import Metadata
 from danswer.bots.slack.tokens import fetch_tokens
 from danswer.configs.app_configs import DANSWER_BOT_NUM_RETRIES
 from danswer.configs.constants import ID_SEPARATOR
+from danswer.connectors.slack.utils import get_slack_user_directory
 from danswer.connectors.slack.utils import make_slack_api_rate_limited
 from danswer.connectors.slack.utils import UserIdReplacer
 from danswer.utils.logger import setup_logger
@@ -159,8 +160,14 @@ def get_channel_name_from_id(client: WebClient, channel_id: str) -> str:
 
 
 def fetch_userids_from_emails(user_emails: list[str], client: WebClient) -> list[str]:
+    user_directory = get_slack_user_directory(client)
     user_ids: list[str] = []
     for email in user_emails:
+        user_id = user_directory.get_user_id_by_email(email)
+        if user_id:
+            user_ids.append(user_id)
+            continue
+
         try:
             user = client.users_lookupByEmail(email=email)
             user_ids.append(user.data["user"]["id"])  # type: ignore
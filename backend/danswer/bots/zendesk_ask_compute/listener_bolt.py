@@ -15,6 +15,7 @@ from danswer.bots.slack.handlers.handle_feedback import handle_slack_feedback
 from danswer.bots.slack.handlers.handle_message import handle_message
 from danswer.bots.zendesk_ask_compute.gpt_helper import get_thread_summary
 from danswer.bots.zendesk_ask_compute.logger import setup_logger
+from danswer.connectors.slack.utils import get_slack_user_directory
 
 logger = setup_logger(constants.MODULE_NAME, constants.LOG_LEVEL)
 
@@ -87,13 +88,9 @@ def get_thread_messages(
 
 
 def get_user_info(client: WebClient, user_id: str) -> Optional[dict]:
-    try:
-        response = client.users_info(user=user_id)
-        user = response["user"]
-        return user
-    except SlackApiError as e:
-        logger.error(f"Error fetching user info: {e.response['error']}")
-        return None
+    # shared with the Slack connector and bot, so users are mostly already known
+    # rather than looked up one by one
+    return get_slack_user_directory(client).get_user(user_id)
 
 
 def get_permalink(client: WebClient, channel_id: str, message_ts: str) -> str:
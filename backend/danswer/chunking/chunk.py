@@ -1,38 +1,97 @@
 import abc
+import contextlib
+import functools
+import multiprocessing
+import sys
+import threading
+import time
 from collections.abc import Callable
-
-from llama_index.text_splitter import SentenceSplitter
-from transformers import AutoTokenizer  # type:ignore
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING
 
 from danswer.chunking.models import DocAwareChunk
 from danswer.configs.app_configs import BLURB_SIZE
 from danswer.configs.app_configs import CHUNK_OVERLAP
 from danswer.configs.app_configs import CHUNK_SIZE
 from danswer.configs.app_configs import MINI_CHUNK_SIZE
+from danswer.configs.app_configs import NUM_CHUNKING_PROCESSES
 from danswer.connectors.models import Document
 from danswer.connectors.models import Section
 from danswer.search.search_utils import get_default_tokenizer
+from danswer.utils.logger import setup_logger
 from danswer.utils.text_processing import shared_precompare_cleanup
 
+if TYPE_CHECKING:
+    from llama_index.text_splitter import SentenceSplitter
+
+logger = setup_logger()
 
 SECTION_SEPARATOR = "\n\n"
 ChunkFunc = Callable[[Document], list[DocAwareChunk]]
+# Documents taking longer than this to chunk are logged
+_SLOW_CHUNKING_THRESHOLD = 5.0  # seconds
+# Batches with less text than this are not worth sending to the chunking processes
+_MIN_PARALLEL_CHUNKING_CHARS = 200_000
 
 
-def extract_blurb(text: str, blurb_size: int) -> str:
-    token_count_func = get_default_tokenizer().tokenize
-    blurb_splitter = SentenceSplitter(
-        tokenizer=token_count_func, chunk_size=blurb_size, chunk_overlap=0
+# The splitters tokenize the same pieces of text more than once, and the sections are
+# tokenized again for their blurbs. The token lists are only kept while a document is
+# being chunked, so the memory held does not grow with what the worker has indexed
+_document_tokens = threading.local()
+
+
+def _tokenize(text: str) -> list[str]:
+    token_cache: dict[str, list[str]] | None = getattr(_document_tokens, "cache", None)
+    if token_cache is None:
+        return get_default_tokenizer().tokenize(text)
+
+    tokens = token_cache.get(text)
+    if tokens is None:
+        tokens = get_default_tokenizer().tokenize(text)
+        token_cache[text] = tokens
+    return tokens
+
+
+@contextlib.contextmanager
+def _cache_document_tokens() -> Iterator[None]:
+    _document_tokens.cache = {}
+    try:
+        yield
+    finally:
+        _document_tokens.cache = None
+
+
+@functools.lru_cache(maxsize=None)
+def _get_sentence_tokenizer() -> Callable[[str], list[str]]:
+    from llama_index.text_splitter.utils import split_by_sentence_tokenizer
+
+    # Loads the nltk punkt model, the returned function holds no per call state
+    return split_by_sentence_tokenizer()
+
+
+def _get_sentence_splitter(chunk_size: int, chunk_overlap: int) -> "SentenceSplitter":
+    from llama_index.text_splitter import SentenceSplitter
+
+    # Not reused across calls, the splitter's callback manager records every split and
+    # would grow for the lifetime of the worker
+    return SentenceSplitter(
+        tokenizer=_tokenize,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        chunking_tokenizer_fn=_get_sentence_tokenizer(),
     )
 
-    return blurb_splitter.split_text(text)[0]
+
+def extract_blurb(text: str, blurb_size: int) -> str:
+    return _get_sentence_splitter(blurb_size, 0).split_text(text)[0]
 
 
 def chunk_large_section(
     section: Section,
     document: Document,
     start_chunk_id: int,
-    tokenizer: AutoTokenizer,
     chunk_size: int = CHUNK_SIZE,
     chunk_overlap: int = CHUNK_OVERLAP,
     blurb_size: int = BLURB_SIZE,
@@ -40,9 +99,7 @@ def chunk_large_section(
     section_text = section.text
     blurb = extract_blurb(section_text, blurb_size)
 
-    sentence_aware_splitter = SentenceSplitter(
-        tokenizer=tokenizer.tokenize, chunk_size=chunk_size, chunk_overlap=chunk_overlap
-    )
+    sentence_aware_splitter = _get_sentence_splitter(chunk_size, chunk_overlap)
 
     split_texts = sentence_aware_splitter.split_text(section_text)
 
@@ -66,15 +123,35 @@ def chunk_document(
     subsection_overlap: int = CHUNK_OVERLAP,
     blurb_size: int = BLURB_SIZE,
 ) -> list[DocAwareChunk]:
-    tokenizer = get_default_tokenizer()
+    with _cache_document_tokens():
+        return _chunk_document(
+            document,
+            chunk_tok_size=chunk_tok_size,
+            subsection_overlap=subsection_overlap,
+            blurb_size=blurb_size,
+        )
+
+
+def _chunk_document(
+    document: Document,
+    chunk_tok_size: int,
+    subsection_overlap: int,
+    blurb_size: int,
+) -> list[DocAwareChunk]:
+    separator_tok_length = len(_tokenize(SECTION_SEPARATOR))
+    separator_offset_len = len(shared_precompare_cleanup(SECTION_SEPARATOR))
 
     chunks: list[DocAwareChunk] = []
     link_offsets: dict[int, str] = {}
     chunk_text = ""
+    # Token count and cleaned up length of chunk_text, updated as sections are added
+    # rather than recomputed from the whole chunk_text for every section. The separator
+    # is whitespace so the counts of the pieces add up to the count of the joined text
+    chunk_tok_length = 0
+    chunk_offset_len = 0
     for section in document.sections:
-        section_tok_length = len(tokenizer.tokenize(section.text))
-        current_tok_length = len(tokenizer.tokenize(chunk_text))
-        curr_offset_len = len(shared_precompare_cleanup(chunk_text))
+        section_tok_length = len(_tokenize(section.text))
+        section_offset_len = len(shared_precompare_cleanup(section.text))
 
         # Large sections are considered self-contained/unique therefore they start a new chunk and are not concatenated
         # at the end by other sections
@@ -92,12 +169,13 @@ def chunk_document(
                 )
                 link_offsets = {}
                 chunk_text = ""
+                chunk_tok_length = 0
+                chunk_offset_len = 0
 
             large_section_chunks = chunk_large_section(
                 section=section,
                 document=document,
                 start_chunk_id=len(chunks),
-                tokenizer=tokenizer,
                 chunk_size=chunk_tok_size,
                 chunk_overlap=subsection_overlap,
                 blurb_size=blurb_size,
@@ -107,15 +185,18 @@ def chunk_document(
 
         # In the case where the whole section is shorter than a chunk, either adding to chunk or start a new one
         if (
-            current_tok_length
-            + len(tokenizer.tokenize(SECTION_SEPARATOR))
-            + section_tok_length
+            chunk_tok_length + separator_tok_length + section_tok_length
             <= chunk_tok_size
         ):
-            chunk_text += (
-                SECTION_SEPARATOR + section.text if chunk_text else section.text
-            )
-            link_offsets[curr_offset_len] = section.link
+            link_offsets[chunk_offset_len] = section.link
+            if chunk_text:
+                chunk_text += SECTION_SEPARATOR + section.text
+                chunk_tok_length += separator_tok_length + section_tok_length
+                chunk_offset_len += separator_offset_len + section_offset_len
+            else:
+                chunk_text = section.text
+                chunk_tok_length = section_tok_length
+                chunk_offset_len = section_offset_len
         else:
             chunks.append(
                 DocAwareChunk(
@@ -129,6 +210,8 @@ def chunk_document(
             )
             link_offsets = {0: section.link}
             chunk_text = section.text
+            chunk_tok_length = section_tok_length
+            chunk_offset_len = section_offset_len
 
     # Once we hit the end, if we're still in the process of building a chunk, add what we have
     if chunk_text:
@@ -148,12 +231,36 @@ def chunk_document(
 def split_chunk_text_into_mini_chunks(
     chunk_text: str, mini_chunk_size: int = MINI_CHUNK_SIZE
 ) -> list[str]:
-    token_count_func = get_default_tokenizer().tokenize
-    sentence_aware_splitter = SentenceSplitter(
-        tokenizer=token_count_func, chunk_size=mini_chunk_size, chunk_overlap=0
+    return _get_sentence_splitter(mini_chunk_size, 0).split_text(chunk_text)
+
+
+def _chunk_document_with_stats(
+    chunker: "Chunker", document: Document
+) -> tuple[list[DocAwareChunk], float]:
+    """Chunks the document and logs the time taken and the number of memory blocks
+    allocated while chunking. The block count is process wide, so with the staged
+    indexing pipeline it also includes what the other stages allocated meanwhile"""
+    blocks_before = sys.getallocatedblocks()
+    start = time.monotonic()
+    chunks = chunker.chunk(document=document)
+    chunk_time = time.monotonic() - start
+    logger.debug(
+        f"Chunked document {document.id} ({len(document.sections)} sections) "
+        f"into {len(chunks)} chunks in {chunk_time:.3f} seconds, "
+        f"{sys.getallocatedblocks() - blocks_before} memory blocks allocated"
     )
+    return chunks, chunk_time
+
 
-    return sentence_aware_splitter.split_text(chunk_text)
+def _log_slowest_document(documents: list[Document], chunk_times: list[float]) -> None:
+    if not documents:
+        return
+    slowest_ind = max(range(len(documents)), key=lambda ind: chunk_times[ind])
+    if chunk_times[slowest_ind] > _SLOW_CHUNKING_THRESHOLD:
+        logger.info(
+            f"Chunking document {documents[slowest_ind].id} took "
+            f"{chunk_times[slowest_ind]:.2f} seconds"
+        )
 
 
 class Chunker:
@@ -161,7 +268,106 @@ class Chunker:
     def chunk(self, document: Document) -> list[DocAwareChunk]:
         raise NotImplementedError
 
+    def chunk_batch(self, documents: list[Document]) -> list[list[DocAwareChunk]]:
+        """Chunks of each of the documents, in the same order as the documents"""
+        results = [_chunk_document_with_stats(self, document) for document in documents]
+        _log_slowest_document(documents, [chunk_time for _, chunk_time in results])
+        return [chunks for chunks, _ in results]
+
 
 class DefaultChunker(Chunker):
     def chunk(self, document: Document) -> list[DocAwareChunk]:
         return chunk_document(document)
+
+
+_CHUNKING_POOL: ProcessPoolExecutor | None = None
+_CHUNKING_POOL_LOCK = threading.Lock()
+
+
+def _get_chunking_pool(num_processes: int) -> ProcessPoolExecutor:
+    global _CHUNKING_POOL
+    with _CHUNKING_POOL_LOCK:
+        if _CHUNKING_POOL is None:
+            # forking a process with running threads (the pipeline stages, the
+            # tokenizer's thread pool) can deadlock the child, start fresh instead
+            _CHUNKING_POOL = ProcessPoolExecutor(
+                max_workers=num_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _CHUNKING_POOL
+
+
+def _shutdown_chunking_pool() -> None:
+    global _CHUNKING_POOL
+    with _CHUNKING_POOL_LOCK:
+        if _CHUNKING_POOL is not None:
+            _CHUNKING_POOL.shutdown(wait=False, cancel_futures=True)
+            _CHUNKING_POOL = None
+
+
+class ProcessPoolChunker(Chunker):
+    """Chunks the documents of a batch in parallel across worker processes with the
+    wrapped chunker, which must be picklable. Chunk ids are assigned per document so
+    they are unaffected. Batches with little text are chunked in process since sending
+    the documents to the workers would cost more than it saves"""
+
+    def __init__(
+        self,
+        chunker: Chunker | None = None,
+        num_processes: int = NUM_CHUNKING_PROCESSES,
+        min_batch_chars: int = _MIN_PARALLEL_CHUNKING_CHARS,
+    ) -> None:
+        self.chunker = chunker or DefaultChunker()
+        self.num_processes = num_processes
+        self.min_batch_chars = min_batch_chars
+
+    def chunk(self, document: Document) -> list[DocAwareChunk]:
+        return self.chunker.chunk(document)
+
+    def chunk_batch(self, documents: list[Document]) -> list[list[DocAwareChunk]]:
+        batch_chars = sum(
+            len(section.text) for document in documents for section in document.sections
+        )
+        if len(documents) < 2 or batch_chars < self.min_batch_chars:
+            return self.chunker.chunk_batch(documents)
+
+        try:
+            pool = _get_chunking_pool(self.num_processes)
+            # largest documents first so a big one doesn't end up last on a worker
+            futures = {
+                ind: pool.submit(
+                    _chunk_document_with_stats, self.chunker, documents[ind]
+                )
+                for ind in sorted(
+                    range(len(documents)),
+                    key=lambda ind: -sum(
+                        len(section.text) for section in documents[ind].sections
+                    ),
+                )
+            }
+            results = [futures[ind].result() for ind in range(len(documents))]
+        except BrokenProcessPool:
+            # e.g. a worker ran out of memory, start over with a new pool next batch
+            logger.exception("Chunking pool broke, chunking the batch in process")
+            _shutdown_chunking_pool()
+            return self.chunker.chunk_batch(documents)
+        except AssertionError as e:
+            # daemonic processes (such as the dask workers by default) aren't allowed
+            # to start child processes
+            logger.warning(
+                f"Unable to start the chunking processes, chunking in process: {e}"
+            )
+            return self.chunker.chunk_batch(documents)
+
+        for document, (chunks, _) in zip(documents, results):
+            # unpickling made a copy of the document for its chunks, share the original
+            for chunk in chunks:
+                chunk.source_document = document
+        _log_slowest_document(documents, [chunk_time for _, chunk_time in results])
+        return [chunks for chunks, _ in results]
+
+
+def get_default_chunker() -> Chunker:
+    if NUM_CHUNKING_PROCESSES > 1:
+        return ProcessPoolChunker()
+    return DefaultChunker()
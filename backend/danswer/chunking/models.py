@@ -5,6 +5,8 @@ from dataclasses import fields
 from typing import Any
 from typing import cast
 
+import numpy
+
 from danswer.access.models import DocumentAccess
 from danswer.configs.constants import BLURB
 from danswer.configs.constants import BOOST
@@ -20,13 +22,17 @@ from danswer.utils.logger import setup_logger
 logger = setup_logger()
 
 
-Embedding = list[float]
+# float32 vector. During indexing, the embeddings of all chunks of a batch are stored in
+# one contiguous matrix and each chunk only holds views into it. Conversion to the wire
+# format of a document index happens once, when the chunk is written
+Embedding = numpy.ndarray
 
 
 @dataclass
 class ChunkEmbedding:
     full_embedding: Embedding
-    mini_chunk_embeddings: list[Embedding]
+    # One row per mini-chunk, no rows if mini-chunks are disabled
+    mini_chunk_embeddings: numpy.ndarray
 
 
 @dataclass
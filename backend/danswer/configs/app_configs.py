@@ -8,6 +8,9 @@ from danswer.configs.constants import DocumentIndexType
 #####
 APP_HOST = "0.0.0.0"
 APP_PORT = 8080
+# Start serving right away and load the models / set up the document index on a
+# background thread. /health responds immediately, /ready only once warm-up is done
+BACKGROUND_WARM_UP = os.environ.get("BACKGROUND_WARM_UP", "").lower() == "true"
 
 
 #####
@@ -92,6 +95,15 @@ VESPA_TENANT_PORT = os.environ.get("VESPA_TENANT_PORT") or "19071"
 VESPA_DEPLOYMENT_ZIP = (
     os.environ.get("VESPA_DEPLOYMENT_ZIP") or "/app/danswer/vespa-app.zip"
 )
+# All Vespa traffic of a process goes through one pooled keep-alive client, the pool is
+# sized for the threads that feed / update chunks in parallel
+VESPA_CONNECTION_POOL_SIZE = int(os.environ.get("VESPA_CONNECTION_POOL_SIZE") or 16)
+VESPA_CONNECT_TIMEOUT = float(os.environ.get("VESPA_CONNECT_TIMEOUT") or 5)
+VESPA_READ_TIMEOUT = float(os.environ.get("VESPA_READ_TIMEOUT") or 60)
+# Connection errors and overloaded responses (429 / 503 / 504) are retried with
+# exponential backoff starting at VESPA_RETRY_BACKOFF seconds
+VESPA_MAX_RETRIES = int(os.environ.get("VESPA_MAX_RETRIES") or 5)
+VESPA_RETRY_BACKOFF = float(os.environ.get("VESPA_RETRY_BACKOFF") or 0.5)
 # Qdrant is Semantic Search Vector DB
 # Url / Key are used to connect to a remote Qdrant instance
 QDRANT_URL = os.environ.get("QDRANT_URL", "")
@@ -123,6 +135,16 @@ GOOGLE_DRIVE_FOLLOW_SHORTCUTS = False
 FILE_CONNECTOR_TMP_STORAGE_PATH = os.environ.get(
     "FILE_CONNECTOR_TMP_STORAGE_PATH", "/home/file_connector_storage"
 )
+# Files (currently PDFs) larger than this are skipped by the file, web and Google Drive
+# connectors, the content of a very large file would take up too much indexer memory
+CONNECTOR_MAX_FILE_SIZE_MB = int(os.environ.get("CONNECTOR_MAX_FILE_SIZE_MB") or 200)
+# Only the first pages of longer PDFs are indexed
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES") or 2000)
+# Extract PDF text in a separate process per file, at most this many at once, so that
+# a malformed file can't hang or exhaust the memory of the indexing job. Extraction is
+# aborted after the timeout. Defaults to 0, extracting in process without a timeout
+PDF_EXTRACTION_PROCESSES = int(os.environ.get("PDF_EXTRACTION_PROCESSES") or 0)
+PDF_EXTRACTION_TIMEOUT = int(os.environ.get("PDF_EXTRACTION_TIMEOUT") or 300)  # seconds
 # TODO these should be available for frontend configuration, via advanced options expandable
 WEB_CONNECTOR_IGNORED_CLASSES = os.environ.get(
     "WEB_CONNECTOR_IGNORED_CLASSES", "sidebar,footer"
@@ -133,6 +155,36 @@ WEB_CONNECTOR_IGNORED_ELEMENTS = os.environ.get(
 WEB_CONNECTOR_OAUTH_CLIENT_ID = os.environ.get("WEB_CONNECTOR_OAUTH_CLIENT_ID")
 WEB_CONNECTOR_OAUTH_CLIENT_SECRET = os.environ.get("WEB_CONNECTOR_OAUTH_CLIENT_SECRET")
 WEB_CONNECTOR_OAUTH_TOKEN_URL = os.environ.get("WEB_CONNECTOR_OAUTH_TOKEN_URL")
+# Number of pages the web connector fetches at once, each worker has its own browser
+WEB_CONNECTOR_NUM_WORKERS = int(os.environ.get("WEB_CONNECTOR_NUM_WORKERS") or 4)
+# Politeness limits, at most this many requests to the same host at a time, and at
+# least this many seconds between the start of two requests to the same host
+WEB_CONNECTOR_MAX_REQUESTS_PER_HOST = int(
+    os.environ.get("WEB_CONNECTOR_MAX_REQUESTS_PER_HOST") or 4
+)
+WEB_CONNECTOR_HOST_REQUEST_INTERVAL = float(
+    os.environ.get("WEB_CONNECTOR_HOST_REQUEST_INTERVAL", 0.25)
+)
+# Number of channels the Slack connector crawls at once, and number of threads fetching
+# the replies of threaded messages across those channels. API calls are throttled to
+# Slack's rate limits regardless
+SLACK_CONNECTOR_CHANNEL_WORKERS = int(
+    os.environ.get("SLACK_CONNECTOR_CHANNEL_WORKERS") or 4
+)
+SLACK_CONNECTOR_THREAD_WORKERS = int(
+    os.environ.get("SLACK_CONNECTOR_THREAD_WORKERS") or 8
+)
+# The Slack connector and bots share a directory of the workspace's users, fetched in
+# bulk and stored in the dynamic config store. It is refetched after this many seconds
+SLACK_USER_DIRECTORY_TTL = int(os.environ.get("SLACK_USER_DIRECTORY_TTL") or 86400)
+# Number of pages the Confluence connector fetches the comments of at once
+CONFLUENCE_CONNECTOR_COMMENT_WORKERS = int(
+    os.environ.get("CONFLUENCE_CONNECTOR_COMMENT_WORKERS") or 8
+)
+# Number of issues the GitHub connector fetches the comments of at once
+GITHUB_CONNECTOR_COMMENT_WORKERS = int(
+    os.environ.get("GITHUB_CONNECTOR_COMMENT_WORKERS") or 4
+)
 
 NOTION_CONNECTOR_ENABLE_RECURSIVE_PAGE_LOOKUP = (
     os.environ.get("NOTION_CONNECTOR_ENABLE_RECURSIVE_PAGE_LOOKUP", "").lower()
@@ -144,6 +196,12 @@ NOTION_CONNECTOR_ENABLE_RECURSIVE_PAGE_LOOKUP = (
 #####
 NUM_RETURNED_HITS = 50
 NUM_RERANKED_RESULTS = 15
+# When the user hasn't picked a search type, run keyword and semantic retrieval (and the
+# intent model) concurrently and merge the results with reciprocal rank fusion before
+# reranking, instead of waiting on the intent model to pick one of them
+ENABLE_FUSED_RETRIEVAL = os.environ.get("ENABLE_FUSED_RETRIEVAL", "").lower() == "true"
+# Reciprocal rank fusion constant, larger values flatten the advantage of the top ranks
+FUSED_RETRIEVAL_RRF_K = int(os.environ.get("FUSED_RETRIEVAL_RRF_K") or 60)
 # We feed in document chunks until we reach this token limit.
 # Default is ~5 full chunks (max chunk size is 2000 chars), although some chunks
 # may be smaller which could result in passing in more total chunks
@@ -172,6 +230,9 @@ ENABLE_MINI_CHUNK = os.environ.get("ENABLE_MINI_CHUNK", "").lower() == "true"
 # Slightly larger since the sentence aware split is a max cutoff so most minichunks will be under MINI_CHUNK_SIZE
 # tokens. But we need it to be at least as big as 1/4th chunk size to avoid having a tiny mini-chunk at the end
 MINI_CHUNK_SIZE = 150
+# Chunk the documents of a batch in parallel across this many processes per indexing
+# worker. Tokenizing large documents (e.g. PDFs) is CPU heavy and single threaded
+NUM_CHUNKING_PROCESSES = int(os.environ.get("NUM_CHUNKING_PROCESSES") or 1)
 
 
 #####
@@ -204,6 +265,20 @@ CONTINUE_ON_CONNECTOR_FAILURE = os.environ.get(
 # fairly large amount of memory in order to increase substantially, since
 # each worker loads the embedding models into memory.
 NUM_INDEXING_WORKERS = int(os.environ.get("NUM_INDEXING_WORKERS") or 1)
+# Instead of each indexing worker loading its own copy of the embedding model, run a
+# single embedding process which all indexing workers send their batches to. Memory
+# then doesn't grow with the number of workers and the cores aren't oversubscribed
+ENABLE_SHARED_EMBEDDING_SERVICE = (
+    os.environ.get("ENABLE_SHARED_EMBEDDING_SERVICE", "").lower() == "true"
+)
+# Number of batches the shared embedding process encodes at the same time
+EMBEDDING_SERVICE_CONCURRENCY = int(
+    os.environ.get("EMBEDDING_SERVICE_CONCURRENCY") or 1
+)
+# Within an indexing job, fetching, chunking, embedding and writing of consecutive
+# batches overlap. This is how many batches may be buffered between two stages,
+# higher values smooth out uneven stages at the cost of memory
+INDEXING_PIPELINE_QUEUE_SIZE = int(os.environ.get("INDEXING_PIPELINE_QUEUE_SIZE") or 1)
 
 # Logs every model prompt and output, mostly used for development or exploration purposes
 LOG_ALL_MODEL_INTERACTIONS = (
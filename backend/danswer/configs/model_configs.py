@@ -30,6 +30,40 @@ ASYM_QUERY_PREFIX = os.environ.get("ASYM_QUERY_PREFIX", "")
 ASYM_PASSAGE_PREFIX = os.environ.get("ASYM_PASSAGE_PREFIX", "")
 # Purely an optimization, memory limitation consideration
 BATCH_SIZE_ENCODE_CHUNKS = 8
+# Instead of fixed size batches in arrival order, group passages of similar token length
+# into batches bounded by a token budget (number of passages x longest passage). Full
+# chunks and mini-chunks then aren't padded to each other's length
+ENCODE_CHUNKS_LENGTH_BUCKETING = (
+    os.environ.get("ENCODE_CHUNKS_LENGTH_BUCKETING", "").lower() == "true"
+)
+# Default keeps the same worst case memory as full batches of max length passages
+ENCODE_CHUNKS_TOKEN_BUDGET = int(
+    os.environ.get("ENCODE_CHUNKS_TOKEN_BUDGET")
+    or BATCH_SIZE_ENCODE_CHUNKS * DOC_EMBEDDING_CONTEXT_SIZE
+)
+# Connectors re-emit whole documents when any part of them changes, a local on-disk
+# cache of passage embeddings avoids re-encoding the chunks that didn't change.
+# Disabled unless a path for the cache file is provided
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "")
+# Least recently used embeddings are evicted past this, ~1.5KB per entry at 384 dims
+EMBEDDING_CACHE_MAX_ENTRIES = int(
+    os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES") or 250_000
+)
+# In-process LRU of query embeddings, repeated queries from chat, Slack bot retries and
+# the web UI skip the encoder. Set the size to 0 to disable
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", 1024))
+QUERY_EMBEDDING_CACHE_TTL = int(os.environ.get("QUERY_EMBEDDING_CACHE_TTL") or 3600)
+# Optional on-disk cache behind the in-process one, shared by the API workers of a host
+QUERY_EMBEDDING_CACHE_SHARED_PATH = os.environ.get(
+    "QUERY_EMBEDDING_CACHE_SHARED_PATH", ""
+)
+
+# Serve the embedding, cross-encoder and intent models with ONNX Runtime instead of
+# PyTorch / TensorFlow. Models are exported on first use and cached in ONNX_MODEL_DIR
+ENABLE_ONNX_INFERENCE = os.environ.get("ENABLE_ONNX_INFERENCE", "").lower() == "true"
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR") or "/app/onnx_models"
+# int8 dynamic quantization of the exported weights, faster on CPU at a small accuracy cost
+ONNX_QUANTIZE = os.environ.get("ONNX_QUANTIZE", "").lower() != "false"
 
 # Cross Encoder Settings
 SKIP_RERANKING = os.environ.get("SKIP_RERANKING", "").lower() == "true"
@@ -42,6 +76,22 @@ CROSS_ENCODER_MODEL_ENSEMBLE = [
 CROSS_ENCODER_RANGE_MAX = 12
 CROSS_ENCODER_RANGE_MIN = -12
 CROSS_EMBED_CONTEXT_SIZE = 512
+# Coalesce the (query, passage) pairs of concurrent searches into one forward pass per
+# cross-encoder model instead of many small ones competing for the CPU
+ENABLE_RERANK_BATCHING = os.environ.get("ENABLE_RERANK_BATCHING", "").lower() == "true"
+# Latency SLO of the batching, the longest a search waits for others to join its batch
+RERANK_BATCH_MAX_WAIT_MS = float(os.environ.get("RERANK_BATCH_MAX_WAIT_MS") or 10)
+# A batch is run as soon as it reaches this many pairs, regardless of the wait
+RERANK_BATCH_MAX_PAIRS = int(os.environ.get("RERANK_BATCH_MAX_PAIRS") or 128)
+# Cascaded reranking, the first stage model scores all the candidates and only the top
+# RERANK_CASCADE_NUM_SURVIVORS of them are scored by the rest of the ensemble
+ENABLE_RERANK_CASCADE = os.environ.get("ENABLE_RERANK_CASCADE", "").lower() == "true"
+# Should be the cheapest model of the ensemble, TinyBERT-L-2 for the default one
+RERANK_CASCADE_FIRST_STAGE_MODEL = (
+    os.environ.get("RERANK_CASCADE_FIRST_STAGE_MODEL")
+    or CROSS_ENCODER_MODEL_ENSEMBLE[-1]
+)
+RERANK_CASCADE_NUM_SURVIVORS = int(os.environ.get("RERANK_CASCADE_NUM_SURVIVORS") or 8)
 
 
 # Better to keep it loose, surfacing more results better than missing results
@@ -104,6 +154,17 @@ GEN_AI_TEMPERATURE = float(os.environ.get("GEN_AI_TEMPERATURE") or 0)
 
 # Danswer custom Deep Learning Models
 INTENT_MODEL_VERSION = "danswer/intent-model"
+# Queries arriving while the intent model is busy are classified together in its next
+# forward pass. A query can also wait this long for others to join its batch, the
+# default of 0 only batches what queued up on its own and adds no latency
+INTENT_BATCH_MAX_WAIT_MS = float(os.environ.get("INTENT_BATCH_MAX_WAIT_MS") or 0)
+INTENT_BATCH_MAX_SIZE = int(os.environ.get("INTENT_BATCH_MAX_SIZE") or 32)
+# Without a search type picked by the user, both the keyword and the semantic retrieval
+# run while the intent model classifies the query and only the predicted one is kept.
+# Hides the intent model latency at the cost of twice the load on the document index
+ENABLE_SPECULATIVE_RETRIEVAL = (
+    os.environ.get("ENABLE_SPECULATIVE_RETRIEVAL", "").lower() == "true"
+)
 
 #####
 # OpenAI Azure
@@ -1,15 +1,24 @@
 import os
 from collections.abc import Callable
 from collections.abc import Collection
+from collections.abc import Iterator
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from datetime import timedelta
 from datetime import timezone
 from typing import Any
 from typing import cast
 from urllib.parse import urlparse
 
+import requests
 from atlassian import Confluence  # type:ignore
 from requests import HTTPError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from danswer.configs.app_configs import CONFLUENCE_CONNECTOR_COMMENT_WORKERS
 from danswer.configs.app_configs import CONTINUE_ON_CONNECTOR_FAILURE
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
 from danswer.configs.constants import DocumentSource
@@ -30,6 +39,14 @@ logger = setup_logger()
 # 2. Include attachments, etc
 # 3. Segment into Sections for more accurate linking, can split by headers but make sure no text/ordering is lost
 
+# Confluence Cloud responds with 429 when rate limited, these requests are retried with
+# exponential backoff (or after the Retry-After the response asks for)
+_RETRYABLE_STATUS_CODES = {429, 503}
+_MAX_RETRIES = 6
+_RETRY_BACKOFF = 1  # seconds
+# Covers the offset of any timezone from UTC, CQL dates are in the user's timezone
+_CQL_TIME_MARGIN = timedelta(hours=14)
+
 
 def extract_confluence_keys_from_url(wiki_url: str) -> tuple[str, str]:
     """Sample
@@ -53,6 +70,26 @@ def extract_confluence_keys_from_url(wiki_url: str) -> tuple[str, str]:
     return wiki_base, space
 
 
+def _to_cql_date(time: datetime) -> str:
+    return time.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+def _build_session(pool_size: int) -> requests.Session:
+    retry = Retry(
+        total=_MAX_RETRIES,
+        backoff_factor=_RETRY_BACKOFF,
+        status_forcelist=_RETRYABLE_STATUS_CODES,
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+    # sized for the comment fetching threads plus the page fetching one
+    adapter = HTTPAdapter(pool_maxsize=pool_size + 1, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 def _comment_dfs(
     comments_str: str,
     comment_pages: Collection[dict[str, Any]],
@@ -80,9 +117,11 @@ class ConfluenceConnector(LoadConnector, PollConnector):
         wiki_page_url: str,
         batch_size: int = INDEX_BATCH_SIZE,
         continue_on_failure: bool = CONTINUE_ON_CONNECTOR_FAILURE,
+        num_comment_workers: int = CONFLUENCE_CONNECTOR_COMMENT_WORKERS,
     ) -> None:
         self.batch_size = batch_size
         self.continue_on_failure = continue_on_failure
+        self.num_comment_workers = max(num_comment_workers, 1)
         self.wiki_base, self.space = extract_confluence_keys_from_url(wiki_page_url)
         self.confluence_client: Confluence | None = None
 
@@ -94,6 +133,7 @@ class ConfluenceConnector(LoadConnector, PollConnector):
             username=username,
             password=access_token,
             cloud=True,
+            session=_build_session(self.num_comment_workers),
         )
         return None
 
@@ -187,14 +227,16 @@ class ConfluenceConnector(LoadConnector, PollConnector):
             return ""
 
     def _get_doc_batch(
-        self, start_ind: int, time_filter: Callable[[datetime], bool] | None = None
-    ) -> tuple[list[Document], int]:
-        doc_batch: list[Document] = []
-
+        self,
+        batch: Collection[dict[str, Any]],
+        comment_fetcher: Executor,
+        time_filter: Callable[[datetime], bool] | None = None,
+    ) -> list[Document]:
         if self.confluence_client is None:
             raise ConnectorMissingCredentialError("Confluence")
 
-        batch = self._fetch_pages(self.confluence_client, start_ind)
+        # (page, page url, page text, comments text)
+        pages: list[tuple[dict[str, Any], str, str, Future[str]]] = []
         for page in batch:
             last_modified_str = page["version"]["when"]
             last_modified = datetime.fromisoformat(last_modified_str)
@@ -212,57 +254,129 @@ class ConfluenceConnector(LoadConnector, PollConnector):
                 page_text = (
                     page.get("title", "") + "\n" + parse_html_page_basic(page_html)
                 )
-                comments_text = self._fetch_comments(self.confluence_client, page["id"])
-                page_text += comments_text
-
-                doc_batch.append(
-                    Document(
-                        id=page_url,
-                        sections=[Section(link=page_url, text=page_text)],
-                        source=DocumentSource.CONFLUENCE,
-                        semantic_identifier=page["title"],
-                        metadata={
-                            "Wiki Space Name": self.space,
-                            "Updated At": page["version"]["friendlyWhen"],
-                        },
-                    )
+                comments_text = comment_fetcher.submit(
+                    self._fetch_comments, self.confluence_client, page["id"]
                 )
-        return doc_batch, len(batch)
+                pages.append((page, page_url, page_text, comments_text))
+
+        return [
+            Document(
+                id=page_url,
+                sections=[
+                    Section(link=page_url, text=page_text + comments_text.result())
+                ],
+                source=DocumentSource.CONFLUENCE,
+                semantic_identifier=page["title"],
+                metadata={
+                    "Wiki Space Name": self.space,
+                    "Updated At": page["version"]["friendlyWhen"],
+                },
+            )
+            for page, page_url, page_text, comments_text in pages
+        ]
 
-    def load_from_state(self) -> GenerateDocumentsOutput:
+    def _iter_space_page_batches(self) -> Iterator[Collection[dict[str, Any]]]:
         if self.confluence_client is None:
             raise ConnectorMissingCredentialError("Confluence")
 
         start_ind = 0
         while True:
-            doc_batch, num_pages = self._get_doc_batch(start_ind)
-            start_ind += num_pages
-            if doc_batch:
-                yield doc_batch
+            batch = self._fetch_pages(self.confluence_client, start_ind)
+            yield batch
+            if len(batch) < self.batch_size:
+                break
+            start_ind += len(batch)
+
+    def _search_pages(
+        self, confluence_client: Confluence, params: dict[str, Any] | None, path: str
+    ) -> dict[str, Any]:
+        try:
+            return confluence_client.get(path, params=params)
+        except HTTPError as e:
+            if params is None:
+                raise
+            # Could be that one of the pages failed due to this bug:
+            # https://jira.atlassian.com/browse/CONFCLOUD-76433
+            logger.warning(
+                f"Search failed with space {self.space}, "
+                f"trying alternative expand option: {e}"
+            )
+            return confluence_client.get(
+                path, params={**params, "expand": "body.view.value,version"}
+            )
+
+    def _iter_modified_page_batches(
+        self, start_time: datetime, end_time: datetime
+    ) -> Iterator[Collection[dict[str, Any]]]:
+        """Only the pages modified in the time range, as found by a CQL search rather
+        than by going through every page of the space"""
+        if self.confluence_client is None:
+            raise ConnectorMissingCredentialError("Confluence")
 
-            if num_pages < self.batch_size:
+        # CQL dates have minute precision and are in the timezone of the user's
+        # profile, the range is widened to cover any timezone and the pages are then
+        # filtered by their exact (UTC) modified time
+        cql = (
+            f'space = "{self.space}" and type = page'
+            f' and lastmodified >= "{_to_cql_date(start_time - _CQL_TIME_MARGIN)}"'
+            f' and lastmodified <= "{_to_cql_date(end_time + _CQL_TIME_MARGIN)}"'
+            " order by lastmodified"
+        )
+        params: dict[str, Any] | None = {
+            "cql": cql,
+            "limit": self.batch_size,
+            "expand": "body.storage.value,version",
+        }
+        path = "rest/api/content/search"
+        while True:
+            # not covered by continue_on_failure, unlike a single page failing this
+            # would silently skip every page modified in the rest of the time range.
+            # The poll fails instead so that the range is polled again
+            response = self._search_pages(self.confluence_client, params, path)
+            yield cast(list[dict[str, Any]], response.get("results", []))
+
+            # the next page of results is only reachable through its link, which
+            # carries the cursor and the rest of the parameters
+            next_link = response.get("_links", {}).get("next")
+            if not next_link:
                 break
+            path = next_link.removeprefix(urlparse(self.wiki_base).path)
+            params = None
+
+    def _get_doc_batches(
+        self,
+        page_batches: Iterator[Collection[dict[str, Any]]],
+        time_filter: Callable[[datetime], bool] | None = None,
+    ) -> GenerateDocumentsOutput:
+        with ThreadPoolExecutor(max_workers=1) as page_fetcher, ThreadPoolExecutor(
+            max_workers=self.num_comment_workers
+        ) as comment_fetcher:
+            next_batch = page_fetcher.submit(next, page_batches, None)
+            while True:
+                batch = next_batch.result()
+                if batch is None:
+                    break
+                # the next batch of pages is fetched while the comments of this one
+                # are, and while the documents are being indexed
+                next_batch = page_fetcher.submit(next, page_batches, None)
+
+                doc_batch = self._get_doc_batch(batch, comment_fetcher, time_filter)
+                if doc_batch:
+                    yield doc_batch
+
+    def load_from_state(self) -> GenerateDocumentsOutput:
+        yield from self._get_doc_batches(self._iter_space_page_batches())
 
     def poll_source(
         self, start: SecondsSinceUnixEpoch, end: SecondsSinceUnixEpoch
     ) -> GenerateDocumentsOutput:
-        if self.confluence_client is None:
-            raise ConnectorMissingCredentialError("Confluence")
-
         start_time = datetime.fromtimestamp(start, tz=timezone.utc)
         end_time = datetime.fromtimestamp(end, tz=timezone.utc)
 
-        start_ind = 0
-        while True:
-            doc_batch, num_pages = self._get_doc_batch(
-                start_ind, time_filter=lambda t: start_time <= t <= end_time
-            )
-            start_ind += num_pages
-            if doc_batch:
-                yield doc_batch
-
-            if num_pages < self.batch_size:
-                break
+        yield from self._get_doc_batches(
+            self._iter_modified_page_batches(start_time, end_time),
+            time_filter=lambda t: start_time <= t <= end_time,
+        )
 
 
 if __name__ == "__main__":
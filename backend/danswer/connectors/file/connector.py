@@ -1,3 +1,4 @@
+import io
 import json
 import os
 import zipfile
@@ -6,8 +7,6 @@ from pathlib import Path
 from typing import Any
 from typing import IO
 
-from PyPDF2 import PdfReader
-
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
 from danswer.configs.constants import DocumentSource
 from danswer.connectors.file.utils import check_file_ext_is_valid
@@ -16,6 +15,8 @@ from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
 from danswer.connectors.models import Document
 from danswer.connectors.models import Section
+from danswer.connectors.pdf_extraction import extract_pdf_sections
+from danswer.connectors.pdf_extraction import FileTooLargeError
 from danswer.utils.logger import setup_logger
 
 
@@ -56,24 +57,39 @@ def _process_file(file_name: str, file: IO[Any]) -> list[Document]:
         logger.warning(f"Skipping file '{file_name}' with extension '{extension}'")
         return []
 
-    metadata = {}
-    file_content_raw = ""
     if extension == ".pdf":
-        pdf_reader = PdfReader(file)
-        if not pdf_reader.is_encrypted:
-            file_content_raw = "\n".join(
-                page.extract_text() for page in pdf_reader.pages
+        # files opened from disk are read in place, files from a zip are first
+        # written out to a temporary file
+        pdf_file = file.name if isinstance(file, io.BufferedReader) else file
+        try:
+            sections = list(
+                extract_pdf_sections(pdf_file, link="", file_name=file_name)
             )
-    else:
-        for ind, line in enumerate(file):
-            if isinstance(line, bytes):
-                line = line.decode("utf-8")
-            line = str(line)
-
-            if ind == 0 and line.startswith(_METADATA_FLAG):
-                metadata = json.loads(line.replace(_METADATA_FLAG, "", 1).strip())
-            else:
-                file_content_raw += line
+        except (FileTooLargeError, TimeoutError) as e:
+            logger.warning(f"Skipping file '{file_name}': {e}")
+            return []
+
+        return [
+            Document(
+                id=file_name,
+                sections=sections or [Section(link="", text="")],
+                source=DocumentSource.FILE,
+                semantic_identifier=file_name,
+                metadata={},
+            )
+        ]
+
+    metadata = {}
+    file_content_raw = ""
+    for ind, line in enumerate(file):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = str(line)
+
+        if ind == 0 and line.startswith(_METADATA_FLAG):
+            metadata = json.loads(line.replace(_METADATA_FLAG, "", 1).strip())
+        else:
+            file_content_raw += line
 
     return [
         Document(
@@ -1,6 +1,15 @@
 import itertools
+import queue
+import threading
+import time
+from collections.abc import Callable
 from collections.abc import Iterator
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from datetime import timezone
 from typing import Any
 from typing import cast
 
@@ -8,7 +17,9 @@ from github import Github
 from github.Issue import Issue
 from github.PaginatedList import PaginatedList
 from github.PullRequest import PullRequest
+from github.Repository import Repository
 
+from danswer.configs.app_configs import GITHUB_CONNECTOR_COMMENT_WORKERS
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
 from danswer.configs.constants import DocumentSource
 from danswer.connectors.interfaces import GenerateDocumentsOutput
@@ -23,16 +34,12 @@ from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
 
-
-def _batch_github_objects(
-    git_objs: PaginatedList, batch_size: int
-) -> Iterator[list[PullRequest | Issue]]:
-    it = iter(git_objs)
-    while True:
-        batch = list(itertools.islice(it, batch_size))
-        if not batch:
-            break
-        yield batch
+# max allowed by the GitHub API, fewer requests to page through the listings
+_PER_PAGE = 100
+# requests of the hourly quota left for anything else using the same access token
+_RATE_LIMIT_RESERVE = 100
+# max number of document batches the listings put out ahead of the consumer
+_MAX_QUEUED_BATCHES = 4
 
 
 def _convert_pr_to_document(pull_request: PullRequest) -> Document:
@@ -50,13 +57,18 @@ def _convert_pr_to_document(pull_request: PullRequest) -> Document:
     )
 
 
-def _fetch_issue_comments(issue: Issue) -> str:
-    comments = issue.get_comments()
-    return "\nComment: ".join(comment.body for comment in comments)
+def _fetch_issue_comments(github_client: Github, issue_url: str) -> str:
+    # the issue object belongs to the client of the thread that listed it, PyGithub
+    # clients can't be shared between threads so the comments are paged through the
+    # given client, straight from the issue's url without fetching the issue again
+    issue = github_client.create_from_raw_data(Issue, {"url": issue_url})
+    return "\nComment: ".join(comment.body or "" for comment in issue.get_comments())
 
 
-def _convert_issue_to_document(issue: Issue) -> Document:
+def _convert_issue_to_document(issue: Issue, comments: str = "") -> Document:
     full_context = f"Issue {issue.title}\n{issue.body}"
+    if comments:
+        full_context += f"\nComment: {comments}"
     return Document(
         id=issue.html_url,
         sections=[Section(link=issue.html_url, text=full_context)],
@@ -69,6 +81,77 @@ def _convert_issue_to_document(issue: Issue) -> Document:
     )
 
 
+class _GithubRateLimiter:
+    """Tracks the remaining quota of the access token from the rate limit headers of the
+    responses to all the clients, and holds back further requests once it runs low
+    until the quota resets"""
+
+    def __init__(self, reserve: int = _RATE_LIMIT_RESERVE) -> None:
+        self.reserve = reserve
+        self.remaining: int | None = None
+        self.limit: int | None = None
+        self.reset_time = 0.0
+        # waiting releases it, so the other threads can still report their responses
+        self._reset: threading.Condition = threading.Condition()
+
+    def update(self, github_client: Github) -> None:
+        remaining, limit = github_client.rate_limiting
+        reset_time = github_client.rate_limiting_resettime
+        with self._reset:
+            # responses to the different threads can arrive out of order
+            if (
+                self.remaining is None
+                or reset_time > self.reset_time
+                or remaining < self.remaining
+            ):
+                self.remaining, self.limit, self.reset_time = (
+                    remaining,
+                    limit,
+                    reset_time,
+                )
+                self._reset.notify_all()
+
+    def wait(self) -> None:
+        with self._reset:
+            logged = False
+            while self.remaining is not None and self.remaining <= self.reserve:
+                wait_time = self.reset_time - time.time() + 1
+                if wait_time <= 0:
+                    # the quota has reset, the next response tells how much is left
+                    self.remaining = None
+                    self._reset.notify_all()
+                    return
+                if not logged:
+                    logger.warning(
+                        f"GitHub rate limit almost used up, waiting {wait_time:.0f}s "
+                        "for it to reset"
+                    )
+                    logged = True
+                # everyone waiting holds off until the reset time has passed
+                self._reset.wait(wait_time)
+
+
+@dataclass
+class _ListingDone:
+    error: Exception | None = None
+
+
+_OutputQueue = queue.Queue[list[Document] | _ListingDone]
+
+
+def _put(
+    output_queue: _OutputQueue,
+    stop: threading.Event,
+    item: list[Document] | _ListingDone,
+) -> None:
+    while not stop.is_set():
+        try:
+            output_queue.put(item, timeout=1)
+            return
+        except queue.Full:
+            continue
+
+
 class GithubConnector(LoadConnector, PollConnector):
     def __init__(
         self,
@@ -78,6 +161,7 @@ class GithubConnector(LoadConnector, PollConnector):
         state_filter: str = "all",
         include_prs: bool = True,
         include_issues: bool = False,
+        num_comment_workers: int = GITHUB_CONNECTOR_COMMENT_WORKERS,
     ) -> None:
         self.repo_owner = repo_owner
         self.repo_name = repo_name
@@ -85,55 +169,174 @@ class GithubConnector(LoadConnector, PollConnector):
         self.state_filter = state_filter
         self.include_prs = include_prs
         self.include_issues = include_issues
+        self.num_comment_workers = max(num_comment_workers, 1)
         self.github_client: Github | None = None
+        self.access_token: str | None = None
+        self.rate_limiter = _GithubRateLimiter()
+        self._thread_local = threading.local()
 
     def load_credentials(self, credentials: dict[str, Any]) -> dict[str, Any] | None:
-        self.github_client = Github(credentials["github_access_token"])
+        self.access_token = credentials["github_access_token"]
+        self.github_client = Github(self.access_token, per_page=_PER_PAGE)
         return None
 
+    def _get_thread_client(self) -> Github:
+        """PyGithub clients reuse one connection for all their requests and can't be
+        shared between threads, each thread gets its own"""
+        if not hasattr(self._thread_local, "github_client"):
+            self._thread_local.github_client = Github(
+                self.access_token, per_page=_PER_PAGE
+            )
+        return self._thread_local.github_client
+
+    def _get_repo(self) -> Repository:
+        return self._get_thread_client().get_repo(
+            f"{self.repo_owner}/{self.repo_name}", lazy=True
+        )
+
+    def _run_listing(
+        self,
+        list_func: Callable[[], Iterator[list[Document]]],
+        output_queue: _OutputQueue,
+        stop: threading.Event,
+    ) -> None:
+        error: Exception | None = None
+        try:
+            for doc_batch in list_func():
+                _put(output_queue, stop, doc_batch)
+                if stop.is_set():
+                    return
+        except Exception as e:
+            error = e
+        _put(output_queue, stop, _ListingDone(error=error))
+
+    def _iter_batches(
+        self, git_objs: PaginatedList
+    ) -> Iterator[list[PullRequest | Issue]]:
+        """Batches of the listing, checking the rate limit before every page"""
+        it = iter(git_objs)
+        while True:
+            self.rate_limiter.wait()
+            batch = list(itertools.islice(it, self.batch_size))
+            self.rate_limiter.update(self._get_thread_client())
+            if not batch:
+                break
+            yield batch
+
+    def _list_pull_requests(
+        self, start: datetime | None, end: datetime | None
+    ) -> Iterator[list[Document]]:
+        # the pulls endpoint has no `since`, the listing is stopped at the first pull
+        # request updated before the start instead
+        pull_requests = self._get_repo().get_pulls(
+            state=self.state_filter, sort="updated", direction="desc"
+        )
+        for pr_batch in self._iter_batches(pull_requests):
+            doc_batch: list[Document] = []
+            for pr in pr_batch:
+                if start is not None and pr.updated_at < start:
+                    yield doc_batch
+                    return
+                if end is not None and pr.updated_at > end:
+                    continue
+                doc_batch.append(_convert_pr_to_document(cast(PullRequest, pr)))
+            yield doc_batch
+
+    def _fetch_comments(self, issue_url: str) -> str:
+        self.rate_limiter.wait()
+        github_client = self._get_thread_client()
+        comments = _fetch_issue_comments(github_client, issue_url)
+        self.rate_limiter.update(github_client)
+        return comments
+
+    def _list_issues(
+        self, start: datetime | None, end: datetime | None, comment_fetcher: Executor
+    ) -> Iterator[list[Document]]:
+        repo = self._get_repo()
+        if start is not None:
+            # only the issues updated since are returned
+            issues = repo.get_issues(
+                state=self.state_filter, sort="updated", direction="desc", since=start
+            )
+        else:
+            issues = repo.get_issues(
+                state=self.state_filter, sort="updated", direction="desc"
+            )
+        for issue_batch in self._iter_batches(issues):
+            batch_issues: list[tuple[Issue, Future[str] | None]] = []
+            for issue in issue_batch:
+                issue = cast(Issue, issue)
+                if end is not None and issue.updated_at > end:
+                    continue
+                if issue.pull_request is not None:
+                    # PRs are handled separately
+                    continue
+                # the comments of the whole batch are fetched at once, issues without
+                # comments don't need a request
+                batch_issues.append(
+                    (
+                        issue,
+                        comment_fetcher.submit(self._fetch_comments, issue.url)
+                        if issue.comments
+                        else None,
+                    )
+                )
+            yield [
+                _convert_issue_to_document(
+                    issue, comments.result() if comments is not None else ""
+                )
+                for issue, comments in batch_issues
+            ]
+
     def _fetch_from_github(
         self, start: datetime | None = None, end: datetime | None = None
     ) -> GenerateDocumentsOutput:
         if self.github_client is None:
             raise ConnectorMissingCredentialError("GitHub")
 
-        repo = self.github_client.get_repo(f"{self.repo_owner}/{self.repo_name}")
-
-        if self.include_prs:
-            pull_requests = repo.get_pulls(
-                state=self.state_filter, sort="updated", direction="desc"
-            )
+        output_queue: _OutputQueue = queue.Queue(maxsize=_MAX_QUEUED_BATCHES)
+        stop = threading.Event()
+        # pull requests and issues are listed at the same time
+        with ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="github_listing"
+        ) as listing_pool, ThreadPoolExecutor(
+            max_workers=self.num_comment_workers, thread_name_prefix="github_comments"
+        ) as comment_fetcher:
+            num_listings = 0
+            if self.include_prs:
+                listing_pool.submit(
+                    self._run_listing,
+                    lambda: self._list_pull_requests(start, end),
+                    output_queue,
+                    stop,
+                )
+                num_listings += 1
+            if self.include_issues:
+                listing_pool.submit(
+                    self._run_listing,
+                    lambda: self._list_issues(start, end, comment_fetcher),
+                    output_queue,
+                    stop,
+                )
+                num_listings += 1
 
-            for pr_batch in _batch_github_objects(pull_requests, self.batch_size):
-                doc_batch: list[Document] = []
-                for pr in pr_batch:
-                    if start is not None and pr.updated_at < start:
-                        yield doc_batch
-                        return
-                    if end is not None and pr.updated_at > end:
-                        continue
-                    doc_batch.append(_convert_pr_to_document(cast(PullRequest, pr)))
-                yield doc_batch
-
-        if self.include_issues:
-            issues = repo.get_issues(
-                state=self.state_filter, sort="updated", direction="desc"
-            )
+            try:
+                while num_listings:
+                    item = output_queue.get()
+                    if isinstance(item, _ListingDone):
+                        if item.error is not None:
+                            raise item.error
+                        num_listings -= 1
+                    elif item:
+                        yield item
+            finally:
+                # also reached if the caller stops consuming the batches early
+                stop.set()
 
-            for issue_batch in _batch_github_objects(issues, self.batch_size):
-                doc_batch = []
-                for issue in issue_batch:
-                    issue = cast(Issue, issue)
-                    if start is not None and issue.updated_at < start:
-                        yield doc_batch
-                        return
-                    if end is not None and issue.updated_at > end:
-                        continue
-                    if issue.pull_request is not None:
-                        # PRs are handled separately
-                        continue
-                    doc_batch.append(_convert_issue_to_document(issue))
-                yield doc_batch
+        logger.info(
+            f"GitHub rate limit remaining: {self.rate_limiter.remaining}/"
+            f"{self.rate_limiter.limit}"
+        )
 
     def load_from_state(self) -> GenerateDocumentsOutput:
         return self._fetch_from_github()
@@ -141,8 +344,11 @@ class GithubConnector(LoadConnector, PollConnector):
     def poll_source(
         self, start: SecondsSinceUnixEpoch, end: SecondsSinceUnixEpoch
     ) -> GenerateDocumentsOutput:
-        start_datetime = datetime.fromtimestamp(start)
-        end_datetime = datetime.fromtimestamp(end)
+        # PyGithub returns the update times as naive UTC datetimes
+        start_datetime = datetime.fromtimestamp(start, tz=timezone.utc).replace(
+            tzinfo=None
+        )
+        end_datetime = datetime.fromtimestamp(end, tz=timezone.utc).replace(tzinfo=None)
         return self._fetch_from_github(start_datetime, end_datetime)
 
 
@@ -12,7 +12,7 @@ import docx2txt  # type:ignore
 from google.auth.credentials import Credentials  # type: ignore
 from googleapiclient import discovery  # type: ignore
 from googleapiclient.errors import HttpError  # type: ignore
-from PyPDF2 import PdfReader
+from googleapiclient.http import MediaIoBaseDownload  # type: ignore
 
 from danswer.configs.app_configs import CONTINUE_ON_CONNECTOR_FAILURE
 from danswer.configs.app_configs import GOOGLE_DRIVE_FOLLOW_SHORTCUTS
@@ -39,6 +39,9 @@ from danswer.connectors.interfaces import PollConnector
 from danswer.connectors.interfaces import SecondsSinceUnixEpoch
 from danswer.connectors.models import Document
 from danswer.connectors.models import Section
+from danswer.connectors.pdf_extraction import check_file_size
+from danswer.connectors.pdf_extraction import extract_pdf_sections
+from danswer.connectors.pdf_extraction import FileTooLargeError
 from danswer.utils.batching import batch_generator
 from danswer.utils.logger import setup_logger
 
@@ -49,6 +52,7 @@ DRIVE_START_TIME_OFFSET = 60 * 10
 DRIVE_FOLDER_TYPE = "application/vnd.google-apps.folder"
 DRIVE_SHORTCUT_TYPE = "application/vnd.google-apps.shortcut"
 UNSUPPORTED_FILE_TYPE_CONTENT = ""  # keep empty for now
+_DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024
 
 
 class GDriveMimeType(str, Enum):
@@ -82,7 +86,7 @@ def _run_drive_file_query(
                 supportsAllDrives=include_shared,
                 includeItemsFromAllDrives=include_shared,
                 fields=(
-                    "nextPageToken, files(mimeType, id, name, "
+                    "nextPageToken, files(mimeType, id, name, size, "
                     "webViewLink, shortcutDetails)"
                 ),
                 pageToken=next_page_token,
@@ -98,7 +102,9 @@ def _run_drive_file_query(
                     file = service.files().get(
                         fileId=file["shortcutDetails"]["targetId"],
                         supportsAllDrives=include_shared,
-                        fields="mimeType, id, name, webViewLink, shortcutDetails",
+                        fields=(
+                            "mimeType, id, name, size, webViewLink, shortcutDetails"
+                        ),
                     )
                     file = file.execute()
                 except HttpError:
@@ -311,20 +317,44 @@ def extract_text(file: dict[str, str], service: discovery.Resource) -> str:
             temp.write(word_stream.getvalue())
             temp_path = temp.name
         return docx2txt.process(temp_path)
-    elif mime_type == GDriveMimeType.PDF.value:
-        response = service.files().get_media(fileId=file["id"]).execute()
-        pdf_stream = io.BytesIO(response)
-        pdf_reader = PdfReader(pdf_stream)
 
-        if pdf_reader.is_encrypted:
-            logger.warning(
-                f"Google drive file: {file['name']} is encrypted - Danswer will ignore it's content"
-            )
-            return ""
+    return UNSUPPORTED_FILE_TYPE_CONTENT
 
-        return "\n".join(page.extract_text() for page in pdf_reader.pages)
 
-    return UNSUPPORTED_FILE_TYPE_CONTENT
+def _get_pdf_sections(
+    file: dict[str, str], service: discovery.Resource
+) -> list[Section]:
+    """Downloads the PDF to a temporary file in pieces, rather than into memory, and
+    extracts its text page by page. PDFs over the size limit or taking too long to
+    extract are indexed by their title only"""
+    try:
+        file_size = file.get("size")
+        check_file_size(file["name"], int(file_size) if file_size else None)
+        return _download_and_extract_pdf(file, service)
+    except (FileTooLargeError, TimeoutError) as e:
+        logger.warning(f"Skipping the content of Google Drive file: {e}")
+        return []
+
+
+def _download_and_extract_pdf(
+    file: dict[str, str], service: discovery.Resource
+) -> list[Section]:
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as temp_file:
+        downloader = MediaIoBaseDownload(
+            temp_file,
+            service.files().get_media(fileId=file["id"]),
+            chunksize=_DOWNLOAD_CHUNK_SIZE,
+        )
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+        temp_file.flush()
+
+        return list(
+            extract_pdf_sections(
+                temp_file.name, link=file["webViewLink"], file_name=file["name"]
+            )
+        )
 
 
 class GoogleDriveConnector(LoadConnector, PollConnector):
@@ -458,21 +488,31 @@ class GoogleDriveConnector(LoadConnector, PollConnector):
             doc_batch = []
             for file in files_batch:
                 try:
-                    text_contents = extract_text(file, service)
-                    if text_contents:
-                        full_context = file["name"] + " - " + text_contents
+                    if file["mimeType"] == GDriveMimeType.PDF.value:
+                        sections = _get_pdf_sections(file, service)
+                    else:
+                        text_contents = extract_text(file, service)
+                        sections = (
+                            [Section(link=file["webViewLink"], text=text_contents)]
+                            if text_contents
+                            else []
+                        )
+
+                    has_content = bool(sections)
+                    if has_content:
+                        sections[0].text = file["name"] + " - " + sections[0].text
                     else:
-                        full_context = file["name"]
+                        sections = [
+                            Section(link=file["webViewLink"], text=file["name"])
+                        ]
 
                     doc_batch.append(
                         Document(
                             id=file["webViewLink"],
-                            sections=[
-                                Section(link=file["webViewLink"], text=full_context)
-                            ],
+                            sections=sections,
                             source=DocumentSource.GOOGLE_DRIVE,
                             semantic_identifier=file["name"],
-                            metadata={} if text_contents else {IGNORE_FOR_QA: True},
+                            metadata={} if has_content else {IGNORE_FOR_QA: True},
                         )
                     )
                 except Exception as e:
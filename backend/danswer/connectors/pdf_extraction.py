@@ -0,0 +1,199 @@
+import functools
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Iterable
+from collections.abc import Iterator
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import IO
+
+from danswer.configs.app_configs import CONNECTOR_MAX_FILE_SIZE_MB
+from danswer.configs.app_configs import PDF_EXTRACTION_PROCESSES
+from danswer.configs.app_configs import PDF_EXTRACTION_TIMEOUT
+from danswer.configs.app_configs import PDF_MAX_PAGES
+from danswer.connectors.models import Section
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class FileTooLargeError(Exception):
+    pass
+
+
+def get_max_file_size() -> int:
+    return CONNECTOR_MAX_FILE_SIZE_MB * 1024 * 1024
+
+
+def check_file_size(file_name: str, size: int | None) -> None:
+    if size is not None and size > get_max_file_size():
+        raise FileTooLargeError(
+            f"File '{file_name}' is {size / (1024 * 1024):.1f}MB, larger than the "
+            f"{CONNECTOR_MAX_FILE_SIZE_MB}MB limit"
+        )
+
+
+def spool_to_temp_file(
+    file_name: str, data: IO[bytes] | Iterable[bytes]
+) -> "tempfile._TemporaryFileWrapper":
+    """Copies the file or stream of bytes to a temporary file on disk without holding
+    it all in memory. The file is deleted when closed"""
+    temp_file = tempfile.NamedTemporaryFile(suffix=Path(file_name).suffix)
+    try:
+        if hasattr(data, "read"):
+            data_chunks: Iterable[bytes] = iter(
+                lambda: data.read(_COPY_CHUNK_SIZE), b""  # type: ignore
+            )
+        else:
+            data_chunks = data
+
+        size = 0
+        for data_chunk in data_chunks:
+            size += len(data_chunk)
+            check_file_size(file_name, size)
+            temp_file.write(data_chunk)
+        temp_file.flush()
+    except Exception:
+        temp_file.close()
+        raise
+    return temp_file
+
+
+def _iter_pdf_page_texts(file_path: str, max_pages: int) -> Iterator[str]:
+    from PyPDF2 import PdfReader
+
+    # reading from the open file rather than the path, PyPDF2 would otherwise load all
+    # of it into memory, pages are then only parsed as they are accessed
+    with open(file_path, "rb") as file:
+        pdf_reader = PdfReader(file)
+        if pdf_reader.is_encrypted:
+            logger.warning(f"PDF '{file_path}' is encrypted, skipping its content")
+            return
+
+        num_pages = len(pdf_reader.pages)
+        if num_pages > max_pages:
+            logger.warning(
+                f"PDF '{file_path}' has {num_pages} pages, only the first "
+                f"{max_pages} are indexed"
+            )
+        for page_ind in range(min(num_pages, max_pages)):
+            yield pdf_reader.pages[page_ind].extract_text()
+
+
+def _send_pdf_page_texts(conn: Connection, file_path: str, max_pages: int) -> None:
+    """Runs in the extraction process. Sends the text of each page as soon as it's
+    extracted, then None once done, or the error the extraction failed with"""
+    try:
+        for page_text in _iter_pdf_page_texts(file_path, max_pages):
+            conn.send(page_text)
+        conn.send(None)
+    except Exception as e:
+        conn.send(RuntimeError(f"Failed to extract the text of PDF '{file_path}': {e}"))
+    finally:
+        conn.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_extraction_slots(num_processes: int) -> threading.BoundedSemaphore:
+    return threading.BoundedSemaphore(num_processes)
+
+
+def _extract_pdf_page_texts(
+    file_path: str, max_pages: int, num_processes: int, timeout: float
+) -> Iterator[str]:
+    """Every PDF is extracted in a process of its own, at most num_processes at once, so
+    that one which times out can be killed without affecting the others. The timeout
+    only starts once its process does, not while waiting for a free slot"""
+    if num_processes <= 0:
+        yield from _iter_pdf_page_texts(file_path, max_pages)
+        return
+
+    with _get_extraction_slots(num_processes):
+        ctx = multiprocessing.get_context("spawn")
+        receive_conn, send_conn = ctx.Pipe(duplex=False)
+        process = ctx.Process(
+            target=_send_pdf_page_texts,
+            args=(send_conn, file_path, max_pages),
+            daemon=True,
+        )
+        try:
+            process.start()
+        except AssertionError as e:
+            # daemonic processes (such as the dask workers by default) aren't allowed
+            # to start child processes
+            logger.warning(f"Unable to start the PDF extraction process: {e}")
+            receive_conn.close()
+            send_conn.close()
+            yield from _iter_pdf_page_texts(file_path, max_pages)
+            return
+        # only the extraction process writes to the pipe, without closing this end the
+        # receiving end would not notice if the process dies
+        send_conn.close()
+
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                if not receive_conn.poll(max(deadline - time.monotonic(), 0)):
+                    raise TimeoutError(
+                        f"Extracting the text of PDF '{file_path}' took over "
+                        f"{timeout} seconds"
+                    )
+                try:
+                    message = receive_conn.recv()
+                except EOFError:
+                    raise RuntimeError(
+                        f"The process extracting the text of PDF '{file_path}' exited "
+                        f"with code {process.exitcode}"
+                    )
+                if message is None:
+                    break
+                if isinstance(message, Exception):
+                    raise message
+                yield message
+        finally:
+            receive_conn.close()
+            # on a timeout, or if the caller stops early, only this extraction is
+            # stopped, the process of any other PDF is left running
+            if process.is_alive():
+                process.kill()
+            process.join()
+
+
+def extract_pdf_sections(
+    file: str | Path | IO[bytes] | Iterable[bytes],
+    link: str,
+    file_name: str = "",
+    max_pages: int = PDF_MAX_PAGES,
+    num_processes: int = PDF_EXTRACTION_PROCESSES,
+    timeout: float = PDF_EXTRACTION_TIMEOUT,
+) -> Iterator[Section]:
+    """Yields a Section per page of the PDF, pages without text are skipped. The PDF can
+    be a path, an open file or a stream of bytes such as a streamed HTTP response, in
+    the latter cases it is written to a temporary file first. Raises FileTooLargeError
+    if the file is over CONNECTOR_MAX_FILE_SIZE_MB, and TimeoutError if extraction takes
+    longer than the timeout"""
+    if isinstance(file, (str, Path)):
+        file_name = file_name or str(file)
+        check_file_size(file_name, os.path.getsize(file))
+        page_texts = _extract_pdf_page_texts(
+            str(file), max_pages, num_processes, timeout
+        )
+        for page_text in page_texts:
+            if page_text.strip():
+                yield Section(link=link, text=page_text)
+        return
+
+    with spool_to_temp_file(file_name or link, file) as temp_file:
+        yield from extract_pdf_sections(
+            temp_file.name,
+            link=link,
+            file_name=file_name or link,
+            max_pages=max_pages,
+            num_processes=num_processes,
+            timeout=timeout,
+        )
@@ -1,7 +1,14 @@
 import json
 import os
+import queue
+import threading
+import time
 from collections.abc import Callable
 from collections.abc import Generator
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 from typing import cast
@@ -11,6 +18,8 @@ from slack_sdk.errors import SlackApiError
 from slack_sdk.web import SlackResponse
 
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
+from danswer.configs.app_configs import SLACK_CONNECTOR_CHANNEL_WORKERS
+from danswer.configs.app_configs import SLACK_CONNECTOR_THREAD_WORKERS
 from danswer.configs.constants import DocumentSource
 from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
@@ -23,6 +32,7 @@ from danswer.connectors.slack.utils import get_message_link
 from danswer.connectors.slack.utils import make_slack_api_call_logged
 from danswer.connectors.slack.utils import make_slack_api_call_paginated
 from danswer.connectors.slack.utils import make_slack_api_rate_limited
+from danswer.connectors.slack.utils import SlackRateLimiter
 from danswer.connectors.slack.utils import UserIdReplacer
 from danswer.utils.logger import setup_logger
 
@@ -34,19 +44,30 @@ MessageType = dict[str, Any]
 # list of messages in a thread
 ThreadType = list[MessageType]
 
+# max number of documents the crawl workers put out ahead of the consumer
+_MAX_QUEUED_DOCS = 1000
+
 
 def _make_paginated_slack_api_call(
-    call: Callable[..., SlackResponse], **kwargs: Any
+    call: Callable[..., SlackResponse],
+    rate_limiter: SlackRateLimiter | None = None,
+    **kwargs: Any,
 ) -> Generator[dict[str, Any], None, None]:
     return make_slack_api_call_paginated(
-        make_slack_api_rate_limited(make_slack_api_call_logged(call))
+        make_slack_api_rate_limited(
+            make_slack_api_call_logged(call), rate_limiter=rate_limiter
+        )
     )(**kwargs)
 
 
 def _make_slack_api_call(
-    call: Callable[..., SlackResponse], **kwargs: Any
+    call: Callable[..., SlackResponse],
+    rate_limiter: SlackRateLimiter | None = None,
+    **kwargs: Any,
 ) -> SlackResponse:
-    return make_slack_api_rate_limited(make_slack_api_call_logged(call))(**kwargs)
+    return make_slack_api_rate_limited(
+        make_slack_api_call_logged(call), rate_limiter=rate_limiter
+    )(**kwargs)
 
 
 def get_channel_info(client: WebClient, channel_id: str) -> ChannelType:
@@ -60,10 +81,12 @@ def _get_channels(
     client: WebClient,
     exclude_archived: bool,
     get_private: bool,
+    rate_limiter: SlackRateLimiter | None = None,
 ) -> list[ChannelType]:
     channels: list[dict[str, Any]] = []
     for result in _make_paginated_slack_api_call(
         client.conversations_list,
+        rate_limiter=rate_limiter,
         exclude_archived=exclude_archived,
         # also get private channels the bot is added to
         types=["public_channel", "private_channel"]
@@ -78,18 +101,25 @@ def _get_channels(
 def get_channels(
     client: WebClient,
     exclude_archived: bool = True,
+    rate_limiter: SlackRateLimiter | None = None,
 ) -> list[ChannelType]:
     """Get all channels in the workspace"""
     # try getting private channels as well at first
     try:
         return _get_channels(
-            client=client, exclude_archived=exclude_archived, get_private=True
+            client=client,
+            exclude_archived=exclude_archived,
+            get_private=True,
+            rate_limiter=rate_limiter,
         )
     except SlackApiError as e:
         logger.info(f"Unable to fetch private channels due to - {e}")
 
     return _get_channels(
-        client=client, exclude_archived=exclude_archived, get_private=False
+        client=client,
+        exclude_archived=exclude_archived,
+        get_private=False,
+        rate_limiter=rate_limiter,
     )
 
 
@@ -98,12 +128,14 @@ def get_channel_messages(
     channel: dict[str, Any],
     oldest: str | None = None,
     latest: str | None = None,
+    rate_limiter: SlackRateLimiter | None = None,
 ) -> Generator[list[MessageType], None, None]:
     """Get all messages in a channel"""
     # join so that the bot can access messages
     if not channel["is_member"]:
         _make_slack_api_call(
             client.conversations_join,
+            rate_limiter=rate_limiter,
             channel=channel["id"],
             is_private=channel["is_private"],
         )
@@ -111,6 +143,7 @@ def get_channel_messages(
 
     for result in _make_paginated_slack_api_call(
         client.conversations_history,
+        rate_limiter=rate_limiter,
         channel=channel["id"],
         oldest=oldest,
         latest=latest,
@@ -118,11 +151,19 @@ def get_channel_messages(
         yield cast(list[MessageType], result["messages"])
 
 
-def get_thread(client: WebClient, channel_id: str, thread_id: str) -> ThreadType:
+def get_thread(
+    client: WebClient,
+    channel_id: str,
+    thread_id: str,
+    rate_limiter: SlackRateLimiter | None = None,
+) -> ThreadType:
     """Get all messages in a thread"""
     threads: list[MessageType] = []
     for result in _make_paginated_slack_api_call(
-        client.conversations_replies, channel=channel_id, ts=thread_id
+        client.conversations_replies,
+        rate_limiter=rate_limiter,
+        channel=channel_id,
+        ts=thread_id,
     ):
         threads.extend(result["messages"])
     return threads
@@ -195,30 +236,119 @@ def _filter_channels(
     ]
 
 
-def get_all_docs(
-    client: WebClient,
-    workspace: str,
-    channels: list[str] | None = None,
-    oldest: str | None = None,
-    latest: str | None = None,
-    msg_filter_func: Callable[[MessageType], bool] = _default_msg_filter,
-) -> Generator[Document, None, None]:
-    """Get all documents in the workspace, channel by channel"""
-    user_id_replacer = UserIdReplacer(client=client)
+@dataclass
+class _ChannelDone:
+    channel_name: str
+    error: Exception | None = None
 
-    all_channels = get_channels(client)
-    filtered_channels = _filter_channels(all_channels, channels)
 
-    for channel in filtered_channels:
-        channel_docs = 0
-        channel_message_batches = get_channel_messages(
-            client=client, channel=channel, oldest=oldest, latest=latest
+class _SlackCrawler:
+    """Crawls several channels at once, with the thread replies of all channels fetched
+    through one bounded pool. Every API call goes through the shared per method token
+    buckets so that all the workers together stay within Slack's rate limits"""
+
+    def __init__(
+        self,
+        client: WebClient,
+        workspace: str,
+        oldest: str | None,
+        latest: str | None,
+        msg_filter_func: Callable[[MessageType], bool],
+        num_channel_workers: int,
+        num_thread_workers: int,
+    ) -> None:
+        self.client = client
+        self.workspace = workspace
+        self.oldest = oldest
+        self.latest = latest
+        self.msg_filter_func = msg_filter_func
+        self.num_channel_workers = max(num_channel_workers, 1)
+        self.num_thread_workers = max(num_thread_workers, 1)
+        self.rate_limiter = SlackRateLimiter()
+        self.user_id_replacer = UserIdReplacer(client=client)
+        # bounded so that the workers don't get far ahead of the indexing
+        self._output_queue: queue.Queue[Document | _ChannelDone] = queue.Queue(
+            maxsize=_MAX_QUEUED_DOCS
+        )
+        self._stop = threading.Event()
+
+    def crawl(self, channels: list[ChannelType]) -> Generator[Document, None, None]:
+        if not channels:
+            return
+
+        start_time = time.monotonic()
+        channel_pool = ThreadPoolExecutor(
+            max_workers=self.num_channel_workers, thread_name_prefix="slack_channel"
+        )
+        thread_pool = ThreadPoolExecutor(
+            max_workers=self.num_thread_workers, thread_name_prefix="slack_thread"
+        )
+        try:
+            for channel in channels:
+                channel_pool.submit(self._crawl_channel, channel, thread_pool)
+
+            num_done = 0
+            while num_done < len(channels):
+                item = self._output_queue.get()
+                if isinstance(item, Document):
+                    yield item
+                    continue
+
+                if item.error is not None:
+                    raise item.error
+                num_done += 1
+                logger.info(
+                    f"Finished {num_done}/{len(channels)} slack channels, "
+                    f"{self.rate_limiter.total_calls} API calls so far"
+                )
+        finally:
+            # also reached if the caller stops consuming the documents early
+            self._stop.set()
+            channel_pool.shutdown(wait=True, cancel_futures=True)
+            thread_pool.shutdown(wait=True, cancel_futures=True)
+
+        logger.info(
+            f"Pulled {len(channels)} slack channels in "
+            f"{time.monotonic() - start_time:.1f}s with "
+            f"{self.rate_limiter.total_calls} API calls: "
+            f"{dict(self.rate_limiter.call_counts)}"
         )
 
+    def _put(self, item: Document | _ChannelDone) -> None:
+        while not self._stop.is_set():
+            try:
+                self._output_queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def _crawl_channel(self, channel: ChannelType, thread_pool: Executor) -> None:
+        error: Exception | None = None
+        try:
+            self._crawl_channel_messages(channel, thread_pool)
+        except Exception as e:
+            error = e
+        self._put(_ChannelDone(channel_name=channel["name"], error=error))
+
+    def _crawl_channel_messages(
+        self, channel: ChannelType, thread_pool: Executor
+    ) -> None:
+        start_time = time.monotonic()
+        rate_limiter = self.rate_limiter.scoped()
+        channel_docs = 0
+        channel_threads = 0
         seen_thread_ts: set[str] = set()
-        for message_batch in channel_message_batches:
+        for message_batch in get_channel_messages(
+            client=self.client,
+            channel=channel,
+            oldest=self.oldest,
+            latest=self.latest,
+            rate_limiter=rate_limiter,
+        ):
+            # the replies of all the threads of the page are fetched at once, the
+            # documents are still put out in message order
+            threads: list[ThreadType | Future[ThreadType]] = []
             for message in message_batch:
-                filtered_thread: ThreadType | None = None
                 thread_ts = message.get("thread_ts")
                 if thread_ts:
                     # skip threads we've already seen, since we've already processed all
@@ -226,29 +356,76 @@ def get_all_docs(
                     if thread_ts in seen_thread_ts:
                         continue
                     seen_thread_ts.add(thread_ts)
-                    thread = get_thread(
-                        client=client, channel_id=channel["id"], thread_id=thread_ts
+                    threads.append(
+                        thread_pool.submit(
+                            get_thread,
+                            client=self.client,
+                            channel_id=channel["id"],
+                            thread_id=thread_ts,
+                            rate_limiter=rate_limiter,
+                        )
                     )
-                    filtered_thread = [
-                        message for message in thread if not msg_filter_func(message)
-                    ]
-                elif not msg_filter_func(message):
-                    filtered_thread = [message]
-
+                    channel_threads += 1
+                elif not self.msg_filter_func(message):
+                    threads.append([message])
+
+            for thread in threads:
+                if self._stop.is_set():
+                    return
+
+                filtered_thread = [
+                    message
+                    for message in (
+                        thread.result() if isinstance(thread, Future) else thread
+                    )
+                    if not self.msg_filter_func(message)
+                ]
                 if filtered_thread:
                     channel_docs += 1
-                    yield thread_to_doc(
-                        workspace=workspace,
-                        channel=channel,
-                        thread=filtered_thread,
-                        user_id_replacer=user_id_replacer,
+                    self._put(
+                        thread_to_doc(
+                            workspace=self.workspace,
+                            channel=channel,
+                            thread=filtered_thread,
+                            user_id_replacer=self.user_id_replacer,
+                        )
                     )
 
         logger.info(
-            f"Pulled {channel_docs} documents from slack channel {channel['name']}"
+            f"Pulled {channel_docs} documents ({channel_threads} threads) from slack "
+            f"channel {channel['name']} in {time.monotonic() - start_time:.1f}s with "
+            f"{rate_limiter.total_calls} API calls"
         )
 
 
+def get_all_docs(
+    client: WebClient,
+    workspace: str,
+    channels: list[str] | None = None,
+    oldest: str | None = None,
+    latest: str | None = None,
+    msg_filter_func: Callable[[MessageType], bool] = _default_msg_filter,
+    num_channel_workers: int = SLACK_CONNECTOR_CHANNEL_WORKERS,
+    num_thread_workers: int = SLACK_CONNECTOR_THREAD_WORKERS,
+) -> Generator[Document, None, None]:
+    """Get all documents in the workspace, several channels at a time. Documents are
+    yielded as they are ready, so documents of different channels are interleaved"""
+    crawler = _SlackCrawler(
+        client=client,
+        workspace=workspace,
+        oldest=oldest,
+        latest=latest,
+        msg_filter_func=msg_filter_func,
+        num_channel_workers=num_channel_workers,
+        num_thread_workers=num_thread_workers,
+    )
+
+    all_channels = get_channels(client, rate_limiter=crawler.rate_limiter)
+    filtered_channels = _filter_channels(all_channels, channels)
+
+    yield from crawler.crawl(filtered_channels)
+
+
 class SlackLoadConnector(LoadConnector):
     def __init__(
         self,
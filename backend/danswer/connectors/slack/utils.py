@@ -1,5 +1,7 @@
 import re
+import threading
 import time
+from collections import Counter
 from collections.abc import Callable
 from collections.abc import Generator
 from functools import wraps
@@ -10,12 +12,25 @@ from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 from slack_sdk.web import SlackResponse
 
+from danswer.configs.app_configs import SLACK_USER_DIRECTORY_TTL
+from danswer.dynamic_configs import get_dynamic_config_store
+from danswer.dynamic_configs.interface import ConfigNotFoundError
 from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
 
 # number of messages we request per page when fetching paginated slack messages
 _SLACK_LIMIT = 900
+# calls per minute allowed by Slack's rate limit tiers, see
+# https://api.slack.com/docs/rate-limits, methods not listed are assumed to be Tier 3
+_TIER_2_CALLS_PER_MINUTE = 20
+_TIER_3_CALLS_PER_MINUTE = 50
+_TIER_4_CALLS_PER_MINUTE = 100
+_SLACK_METHOD_CALLS_PER_MINUTE = {
+    "conversations_list": _TIER_2_CALLS_PER_MINUTE,
+    "users_list": _TIER_2_CALLS_PER_MINUTE,
+    "users_info": _TIER_4_CALLS_PER_MINUTE,
+}
 
 
 def get_message_link(
@@ -33,6 +48,82 @@ def get_message_link(
     )
 
 
+class _TokenBucket:
+    def __init__(self, calls_per_minute: int) -> None:
+        self.rate = calls_per_minute / 60
+        # Slack tolerates short bursts over the limit
+        self.capacity = max(calls_per_minute / 10, 1)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last_refill) * self.rate
+                )
+                self._last_refill = now
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def block(self, seconds: float) -> None:
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class SlackRateLimiter:
+    """Token bucket per Slack API method, shared by all the threads making calls so
+    that together they stay within the method's rate limit tier. Also counts the calls
+    made, `scoped` gives a limiter with the same buckets but its own call counts, e.g.
+    to report the calls made for one channel"""
+
+    def __init__(self, parent: "SlackRateLimiter | None" = None) -> None:
+        self._parent = parent
+        self._buckets: dict[str, _TokenBucket] = parent._buckets if parent else {}
+        self._lock: threading.Lock = parent._lock if parent else threading.Lock()
+        self.call_counts: Counter[str] = Counter()
+
+    def scoped(self) -> "SlackRateLimiter":
+        return SlackRateLimiter(parent=self)
+
+    def _get_bucket(self, method_name: str) -> _TokenBucket:
+        with self._lock:
+            if method_name not in self._buckets:
+                self._buckets[method_name] = _TokenBucket(
+                    _SLACK_METHOD_CALLS_PER_MINUTE.get(
+                        method_name, _TIER_3_CALLS_PER_MINUTE
+                    )
+                )
+            return self._buckets[method_name]
+
+    def _count_call(self, method_name: str) -> None:
+        with self._lock:
+            limiter: SlackRateLimiter | None = self
+            while limiter is not None:
+                limiter.call_counts[method_name] += 1
+                limiter = limiter._parent
+
+    def acquire(self, method_name: str) -> None:
+        self._get_bucket(method_name).acquire()
+        self._count_call(method_name)
+
+    def block(self, method_name: str, seconds: float) -> None:
+        """Holds back all callers of the method, e.g. after Slack responded with
+        Retry-After"""
+        self._get_bucket(method_name).block(seconds)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.call_counts.values())
+
+
 def make_slack_api_call_logged(
     call: Callable[..., SlackResponse],
 ) -> Callable[..., SlackResponse]:
@@ -67,14 +158,20 @@ def make_slack_api_call_paginated(
 
 
 def make_slack_api_rate_limited(
-    call: Callable[..., SlackResponse], max_retries: int = 3
+    call: Callable[..., SlackResponse],
+    max_retries: int = 3,
+    rate_limiter: SlackRateLimiter | None = None,
 ) -> Callable[..., SlackResponse]:
-    """Wraps calls to slack API so that they automatically handle rate limiting"""
+    """Wraps calls to slack API so that they automatically handle rate limiting. With a
+    rate_limiter, calls also wait for their method's token bucket"""
 
     @wraps(call)
     def rate_limited_call(**kwargs: Any) -> SlackResponse:
         for _ in range(max_retries):
             try:
+                if rate_limiter:
+                    rate_limiter.acquire(call.__name__)
+
                 # Make the API call
                 response = call(**kwargs)
 
@@ -90,7 +187,12 @@ def make_slack_api_rate_limited(
                     logger.info(
                         f"Slack call rate limited, retrying after {retry_after} seconds. Exception: {e}"
                     )
-                    time.sleep(retry_after)
+                    if rate_limiter:
+                        # the other threads calling the method back off as well, the
+                        # next attempt waits in acquire
+                        rate_limiter.block(call.__name__, retry_after)
+                    else:
+                        time.sleep(retry_after)
                 else:
                     # Raise the error for non-transient errors
                     raise
@@ -101,33 +203,201 @@ def make_slack_api_rate_limited(
     return rate_limited_call
 
 
-class UserIdReplacer:
-    """Utility class to replace user IDs with usernames in a message.
-    Handles caching, so the same request is not made multiple times
-    for the same user ID"""
+_USER_DIRECTORY_KEY_PREFIX = "slack_user_directory_"
 
-    def __init__(self, client: WebClient) -> None:
-        self._client = client
-        self._user_id_to_name_map: dict[str, str] = {}
+# the subset of the users.list / users.info user objects that is kept
+SlackUserType = dict[str, str]
+
+
+def _to_directory_user(user: dict[str, Any]) -> SlackUserType:
+    """Only the fields needed to show the user, the directory is persisted so personal
+    data such as emails is left out"""
+    profile = user.get("profile", {})
+    return {
+        "id": user["id"],
+        "name": user.get("name", ""),
+        "real_name": profile.get("real_name", ""),
+        "display_name": profile.get("display_name", ""),
+    }
 
-    def _get_slack_user_name(self, user_id: str) -> str:
-        if user_id not in self._user_id_to_name_map:
+
+def _get_user_email(user: dict[str, Any]) -> str:
+    return user.get("profile", {}).get("email", "").lower()
+
+
+class SlackUserDirectory:
+    """The users of a Slack workspace by id, fetched in bulk with users.list rather
+    than one users.info call per user. The directory is persisted in the dynamic config
+    store so that the connector runs and the bots share it, and is refetched in the
+    background once it is older than the TTL. Users missing from it (e.g. those who
+    joined since, external users of shared channels, or all of them until the first
+    fetch completes) are looked up individually. Emails are only kept in memory, for
+    the users fetched by this process"""
+
+    def __init__(
+        self,
+        client: WebClient,
+        ttl: int = SLACK_USER_DIRECTORY_TTL,
+        rate_limiter: SlackRateLimiter | None = None,
+    ) -> None:
+        self._client = client
+        self._ttl = ttl
+        self._rate_limiter = rate_limiter or SlackRateLimiter()
+        self._lock = threading.Lock()
+        self._store_key: str | None = None
+        self._users: dict[str, SlackUserType] = {}
+        self._email_to_user_id: dict[str, str] = {}
+        # ids users.info had no user for, so they aren't looked up again
+        self._missing_user_ids: set[str] = set()
+        self._updated_at = 0.0
+        self._refresh_thread: threading.Thread | None = None
+
+    def _get_store_key(self) -> str:
+        if self._store_key is None:
+            team_id = make_slack_api_rate_limited(
+                self._client.auth_test, rate_limiter=self._rate_limiter
+            )()["team_id"]
+            self._store_key = _USER_DIRECTORY_KEY_PREFIX + team_id
+        return self._store_key
+
+    def _set_users(self, users: dict[str, SlackUserType], updated_at: float) -> None:
+        self._users = users
+        self._missing_user_ids = set()
+        self._updated_at = updated_at
+
+    def _load_stored_users(self) -> None:
+        try:
+            stored = cast(
+                dict[str, Any], get_dynamic_config_store().load(self._get_store_key())
+            )
+        except ConfigNotFoundError:
+            return
+        if stored["updated_at"] > self._updated_at:
+            self._set_users(stored["users"], stored["updated_at"])
+
+    def _fetch_users(self) -> None:
+        start_time = time.monotonic()
+        users: dict[str, SlackUserType] = {}
+        email_to_user_id: dict[str, str] = {}
+        for result in make_slack_api_call_paginated(
+            make_slack_api_rate_limited(
+                self._client.users_list, rate_limiter=self._rate_limiter
+            )
+        )():
+            for user in result["members"]:
+                users[user["id"]] = _to_directory_user(user)
+                email = _get_user_email(user)
+                if email:
+                    email_to_user_id[email] = user["id"]
+
+        self._set_users(users, time.time())
+        self._email_to_user_id = email_to_user_id
+        logger.info(
+            f"Fetched {len(users)} Slack users in {time.monotonic() - start_time:.1f}s"
+        )
+        try:
+            get_dynamic_config_store().store(
+                self._get_store_key(),
+                {"updated_at": self._updated_at, "users": users},
+            )
+        except Exception as e:
+            logger.warning(f"Unable to store the Slack user directory: {e}")
+
+    def _refresh(self) -> None:
+        try:
+            self._fetch_users()
+        except Exception as e:
+            # e.g. the token missing the users:read scope, users are then only looked
+            # up one by one. Retried once the TTL is up again
+            logger.warning(f"Unable to fetch the Slack user directory: {e}")
+            self._updated_at = time.time()
+        finally:
+            with self._lock:
+                self._refresh_thread = None
+
+    def _ensure_fresh(self) -> None:
+        """Does not wait on users.list, it is a Tier 2 method (~20 calls a minute) so
+        listing a large workspace takes a while. The refetch runs in the background
+        while the current (possibly empty) directory keeps being used"""
+        if time.time() - self._updated_at < self._ttl:
+            return
+
+        with self._lock:
+            if (
+                time.time() - self._updated_at < self._ttl
+                or self._refresh_thread is not None
+            ):
+                return
             try:
-                response = make_slack_api_rate_limited(self._client.users_info)(
-                    user=user_id
-                )
-                # prefer display name if set, since that is what is shown in Slack
-                self._user_id_to_name_map[user_id] = (
-                    response["user"]["profile"]["display_name"]
-                    or response["user"]["profile"]["real_name"]
-                )
-            except SlackApiError as e:
-                logger.exception(
-                    f"Error fetching data for user {user_id}: {e.response['error']}"
-                )
-                raise
+                # another process may have refreshed it already
+                self._load_stored_users()
+            except Exception as e:
+                logger.warning(f"Unable to load the stored Slack user directory: {e}")
+            if time.time() - self._updated_at < self._ttl:
+                return
+
+            self._refresh_thread = threading.Thread(target=self._refresh, daemon=True)
+            self._refresh_thread.start()
+
+    def get_user(self, user_id: str) -> SlackUserType | None:
+        self._ensure_fresh()
+        user = self._users.get(user_id)
+        if user is not None or user_id in self._missing_user_ids:
+            return user
+
+        try:
+            response = make_slack_api_rate_limited(
+                self._client.users_info, rate_limiter=self._rate_limiter
+            )(user=user_id)
+        except SlackApiError as e:
+            logger.error(
+                f"Error fetching data for user {user_id}: {e.response['error']}"
+            )
+            self._missing_user_ids.add(user_id)
+            return None
+
+        user = _to_directory_user(response["user"])
+        self._users[user_id] = user
+        email = _get_user_email(response["user"])
+        if email:
+            self._email_to_user_id[email] = user_id
+        return user
+
+    def get_user_name(self, user_id: str) -> str | None:
+        """Name to show for the user, the display name if set since that is what is
+        shown in Slack"""
+        user = self.get_user(user_id)
+        if user is None:
+            return None
+        return user["display_name"] or user["real_name"]
 
-        return self._user_id_to_name_map[user_id]
+    def get_user_id_by_email(self, email: str) -> str | None:
+        """Only finds users fetched by this process, emails are only included if the
+        token has the users:read.email scope"""
+        self._ensure_fresh()
+        return self._email_to_user_id.get(email.lower())
+
+
+_USER_DIRECTORIES: dict[str, SlackUserDirectory] = {}
+_USER_DIRECTORIES_LOCK = threading.Lock()
+
+
+def get_slack_user_directory(client: WebClient) -> SlackUserDirectory:
+    """One directory per token for the lifetime of the process"""
+    with _USER_DIRECTORIES_LOCK:
+        token = client.token or ""
+        if token not in _USER_DIRECTORIES:
+            _USER_DIRECTORIES[token] = SlackUserDirectory(client)
+        return _USER_DIRECTORIES[token]
+
+
+class UserIdReplacer:
+    """Utility class to replace user IDs with usernames in a message.
+    Names come from the shared SlackUserDirectory, so users are not looked
+    up one at a time"""
+
+    def __init__(self, client: WebClient) -> None:
+        self._user_directory = get_slack_user_directory(client)
 
     def replace_user_ids_with_names(self, message: str) -> str:
         # Find user IDs in the message
@@ -136,10 +406,9 @@ class UserIdReplacer:
         # Iterate over each user ID found
         for user_id in user_ids:
             try:
-                if user_id in self._user_id_to_name_map:
-                    user_name = self._user_id_to_name_map[user_id]
-                else:
-                    user_name = self._get_slack_user_name(user_id)
+                user_name = self._user_directory.get_user_name(user_id)
+                if user_name is None:
+                    continue
 
                 # Replace the user ID with the username in the message
                 message = message.replace(f"<@{user_id}>", f"@{user_name}")
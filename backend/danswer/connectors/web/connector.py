@@ -1,12 +1,21 @@
-import io
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 from copy import copy
+from dataclasses import dataclass
+from dataclasses import field
 from datetime import datetime
 from enum import Enum
 from typing import Any
 from typing import cast
 from typing import Tuple
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
 from urllib.parse import urljoin
 from urllib.parse import urlparse
+from urllib.parse import urlunparse
 
 import requests
 from bs4 import BeautifulSoup
@@ -14,12 +23,14 @@ from oauthlib.oauth2 import BackendApplicationClient
 from playwright.sync_api import BrowserContext
 from playwright.sync_api import Playwright
 from playwright.sync_api import sync_playwright
-from PyPDF2 import PdfReader
 from requests_oauthlib import OAuth2Session  # type:ignore
 
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
+from danswer.configs.app_configs import WEB_CONNECTOR_HOST_REQUEST_INTERVAL
 from danswer.configs.app_configs import WEB_CONNECTOR_IGNORED_CLASSES
 from danswer.configs.app_configs import WEB_CONNECTOR_IGNORED_ELEMENTS
+from danswer.configs.app_configs import WEB_CONNECTOR_MAX_REQUESTS_PER_HOST
+from danswer.configs.app_configs import WEB_CONNECTOR_NUM_WORKERS
 from danswer.configs.app_configs import WEB_CONNECTOR_OAUTH_CLIENT_ID
 from danswer.configs.app_configs import WEB_CONNECTOR_OAUTH_CLIENT_SECRET
 from danswer.configs.app_configs import WEB_CONNECTOR_OAUTH_TOKEN_URL
@@ -28,6 +39,8 @@ from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
 from danswer.connectors.models import Document
 from danswer.connectors.models import Section
+from danswer.connectors.pdf_extraction import check_file_size
+from danswer.connectors.pdf_extraction import extract_pdf_sections
 from danswer.utils.logger import setup_logger
 from danswer.utils.text_processing import format_document_soup
 
@@ -35,6 +48,13 @@ logger = setup_logger()
 
 
 MINTLIFY_UNWANTED = ["sticky", "hidden"]
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+_REQUEST_TIMEOUT = 30  # seconds
+# Pages fetched without a browser with less text than this are assumed to be rendered
+# client side and are loaded in the browser instead
+_MIN_STATIC_PAGE_TEXT_LEN = 200
+# The browsers otherwise slowly accumulate memory over long crawls
+_PAGES_BEFORE_CLIENT_RESET = 100
 
 
 class WEB_CONNECTOR_VALID_SETTINGS(str, Enum):
@@ -77,12 +97,25 @@ def get_internal_links(
     return internal_links
 
 
-def start_playwright() -> Tuple[Playwright, BrowserContext]:
-    playwright = sync_playwright().start()
-    browser = playwright.chromium.launch(headless=True)
+def normalize_url(url: str) -> str:
+    """Form of the URL used to tell whether a page was already visited, so that e.g.
+    https://Docs.site.com/a/ and https://docs.site.com/a#intro are only crawled once"""
+    try:
+        parsed = urlparse(url)
+        port = parsed.port
+    except ValueError:
+        return url
+
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    if (scheme, port) in (("http", 80), ("https", 443)):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parsed.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, path, parsed.params, query, ""))
 
-    context = browser.new_context()
 
+def _get_oauth_headers() -> dict[str, str]:
     if (
         WEB_CONNECTOR_OAUTH_CLIENT_ID
         and WEB_CONNECTOR_OAUTH_CLIENT_SECRET
@@ -95,9 +128,19 @@ def start_playwright() -> Tuple[Playwright, BrowserContext]:
             client_id=WEB_CONNECTOR_OAUTH_CLIENT_ID,
             client_secret=WEB_CONNECTOR_OAUTH_CLIENT_SECRET,
         )
-        context.set_extra_http_headers(
-            {"Authorization": "Bearer {}".format(token["access_token"])}
-        )
+        return {"Authorization": "Bearer {}".format(token["access_token"])}
+    return {}
+
+
+def start_playwright() -> Tuple[Playwright, BrowserContext]:
+    playwright = sync_playwright().start()
+    browser = playwright.chromium.launch(headless=True)
+
+    context = browser.new_context()
+
+    oauth_headers = _get_oauth_headers()
+    if oauth_headers:
+        context.set_extra_http_headers(oauth_headers)
 
     return playwright, context
 
@@ -124,6 +167,291 @@ def _read_urls_file(location: str) -> list[str]:
     return urls
 
 
+class _HostRateLimiter:
+    """Caps the number of concurrent requests to each host and spaces out the start of
+    the requests to the same host"""
+
+    def __init__(self, max_concurrent: int, min_interval: float) -> None:
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self._next_request_times: dict[str, float] = {}
+
+    @contextmanager
+    def limit(self, url: str) -> Iterator[None]:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            semaphore = self._semaphores.setdefault(
+                host, threading.BoundedSemaphore(self.max_concurrent)
+            )
+
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                request_time = max(now, self._next_request_times.get(host, now))
+                self._next_request_times[host] = request_time + self.min_interval
+            time.sleep(request_time - now)
+            yield
+
+
+class _WorkerClients:
+    """The requests session and browser of a crawl worker. Playwright's sync API can
+    only be used from the thread that started it, so each worker has its own browser,
+    started once a page needs it. Both are recreated periodically and after errors,
+    which also refreshes the OAuth token"""
+
+    def __init__(self) -> None:
+        self._session: requests.Session | None = None
+        self._playwright: Playwright | None = None
+        self._context: BrowserContext | None = None
+        self._num_pages = 0
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers.update(_get_oauth_headers())
+        return self._session
+
+    @property
+    def browser_context(self) -> BrowserContext:
+        if self._context is None:
+            self._playwright, self._context = start_playwright()
+        return self._context
+
+    def page_done(self) -> None:
+        self._num_pages += 1
+        if self._num_pages >= _PAGES_BEFORE_CLIENT_RESET:
+            self.reset()
+
+    def reset(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception as e:
+                logger.warning(f"Failed to stop Playwright: {e}")
+            self._playwright = None
+            self._context = None
+        self._num_pages = 0
+
+
+@dataclass
+class _PageResult:
+    url: str
+    # differs from the url if the page was redirected
+    final_url: str
+    document: Document | None = None
+    links: set[str] = field(default_factory=set)
+
+
+class _WebCrawler:
+    """Fetches pages on a pool of worker threads while the calling thread keeps track
+    of the visited pages and batches up the documents as they complete.
+
+    Pages are first fetched without a browser, if that returns HTML with enough text
+    it is used as is, otherwise (JS rendered pages, blocked requests) the page is
+    loaded in the worker's browser"""
+
+    def __init__(
+        self,
+        base_url: str,
+        recursive: bool,
+        mintlify_cleanup: bool,
+        batch_size: int,
+        num_workers: int = WEB_CONNECTOR_NUM_WORKERS,
+        max_requests_per_host: int = WEB_CONNECTOR_MAX_REQUESTS_PER_HOST,
+        host_request_interval: float = WEB_CONNECTOR_HOST_REQUEST_INTERVAL,
+    ) -> None:
+        self.base_url = base_url
+        self.recursive = recursive
+        self.mintlify_cleanup = mintlify_cleanup
+        self.batch_size = batch_size
+        self.num_workers = max(num_workers, 1)
+        self._host_limiter = _HostRateLimiter(
+            max_requests_per_host, host_request_interval
+        )
+        self._url_queue: queue.Queue[str | None] = queue.Queue()
+        self._result_queue: queue.Queue[_PageResult] = queue.Queue()
+        self._stop = threading.Event()
+
+    def crawl(self, start_urls: list[str]) -> GenerateDocumentsOutput:
+        visited_links: set[str] = set()
+        num_pending = 0
+        workers: list[threading.Thread] = []
+
+        def _enqueue(url: str) -> None:
+            nonlocal num_pending
+            normalized_url = normalize_url(url)
+            if normalized_url not in visited_links:
+                visited_links.add(normalized_url)
+                self._url_queue.put(url)
+                num_pending += 1
+                # recursive crawls start from a single page, more workers are started
+                # as links are found rather than all of them up front
+                if len(workers) < min(self.num_workers, num_pending):
+                    worker = threading.Thread(target=self._run_worker, daemon=True)
+                    worker.start()
+                    workers.append(worker)
+
+        doc_batch: list[Document] = []
+        try:
+            for url in start_urls:
+                _enqueue(url)
+
+            while num_pending:
+                result = self._result_queue.get()
+                num_pending -= 1
+
+                normalized_final_url = normalize_url(result.final_url)
+                if normalized_final_url != normalize_url(result.url):
+                    logger.info(f"Redirected to {result.final_url}")
+                    if normalized_final_url in visited_links:
+                        logger.info("Redirected page already indexed")
+                        continue
+                    visited_links.add(normalized_final_url)
+
+                for link in result.links:
+                    _enqueue(link)
+
+                if result.document is not None:
+                    doc_batch.append(result.document)
+                if len(doc_batch) >= self.batch_size:
+                    yield doc_batch
+                    doc_batch = []
+
+            if doc_batch:
+                yield doc_batch
+        finally:
+            # also reached if the caller stops consuming the batches early, the workers
+            # drop the rest of the queue and shut down their browsers
+            self._stop.set()
+            for _ in workers:
+                self._url_queue.put(None)
+            for worker in workers:
+                worker.join()
+
+    def _run_worker(self) -> None:
+        clients = _WorkerClients()
+        try:
+            while True:
+                url = self._url_queue.get()
+                if url is None or self._stop.is_set():
+                    return
+                self._result_queue.put(self._fetch_page(url, clients))
+        finally:
+            clients.reset()
+
+    def _fetch_page(self, url: str, clients: _WorkerClients) -> _PageResult:
+        logger.info(f"Visiting {url}")
+        try:
+            result = self._fetch_static_page(url, clients)
+            if result is None:
+                result = self._fetch_rendered_page(url, clients)
+            clients.page_done()
+            return result
+        except Exception as e:
+            logger.error(f"Failed to fetch '{url}': {e}")
+            clients.reset()
+            return _PageResult(url=url, final_url=url)
+
+    def _fetch_static_page(
+        self, url: str, clients: _WorkerClients
+    ) -> _PageResult | None:
+        current_visit_time = datetime.now().strftime("%B %d, %Y, %H:%M:%S")
+        with self._host_limiter.limit(url), clients.session.get(
+            url, stream=True, timeout=_REQUEST_TIMEOUT
+        ) as response:
+            content_type = response.headers.get("Content-Type", "")
+            if url.split(".")[-1] == "pdf" or "application/pdf" in content_type:
+                response.raise_for_status()
+                content_length = response.headers.get("Content-Length")
+                check_file_size(url, int(content_length) if content_length else None)
+                sections = list(
+                    extract_pdf_sections(
+                        response.iter_content(chunk_size=_DOWNLOAD_CHUNK_SIZE),
+                        link=url,
+                        file_name=url,
+                    )
+                )
+                # PDF files are not checked for links
+                document = Document(
+                    id=url,
+                    sections=sections or [Section(link=url, text="")],
+                    source=DocumentSource.WEB,
+                    semantic_identifier=url.split(".")[-1],
+                    metadata={"Time Visited": current_visit_time},
+                )
+                return _PageResult(url=url, final_url=response.url, document=document)
+
+            if not response.ok or "text/html" not in content_type:
+                return None
+            soup = BeautifulSoup(response.content, "html.parser")
+
+        result = self._parse_page(url, response.url, soup)
+        if (
+            result.document is None
+            or len(result.document.sections[0].text) < _MIN_STATIC_PAGE_TEXT_LEN
+        ):
+            return None
+        return result
+
+    def _fetch_rendered_page(self, url: str, clients: _WorkerClients) -> _PageResult:
+        with self._host_limiter.limit(url):
+            page = clients.browser_context.new_page()
+            try:
+                page.goto(url)
+                final_url = page.url
+                content = page.content()
+            finally:
+                page.close()
+
+        return self._parse_page(url, final_url, BeautifulSoup(content, "html.parser"))
+
+    def _parse_page(self, url: str, final_url: str, soup: BeautifulSoup) -> _PageResult:
+        links = (
+            get_internal_links(self.base_url, final_url, soup)
+            if self.recursive
+            else set()
+        )
+
+        title_tag = soup.find("title")
+        title = None
+        if title_tag and title_tag.text:
+            title = title_tag.text
+            title_tag.extract()
+
+        # Heuristics based cleaning of elements based on css classes
+        unwanted_classes = copy(WEB_CONNECTOR_IGNORED_CLASSES)
+        if self.mintlify_cleanup:
+            unwanted_classes.extend(MINTLIFY_UNWANTED)
+        for undesired_element in unwanted_classes:
+            [
+                tag.extract()
+                for tag in soup.find_all(
+                    class_=lambda x: x and undesired_element in x.split()
+                )
+            ]
+
+        for undesired_tag in WEB_CONNECTOR_IGNORED_ELEMENTS:
+            [tag.extract() for tag in soup.find_all(undesired_tag)]
+
+        # 200B is ZeroWidthSpace which we don't care for
+        page_text = format_document_soup(soup).replace("\u200B", "")
+
+        document = Document(
+            id=final_url,
+            sections=[Section(link=final_url, text=page_text)],
+            source=DocumentSource.WEB,
+            semantic_identifier=title or final_url,
+            metadata={},
+        )
+        return _PageResult(url=url, final_url=final_url, document=document, links=links)
+
+
 class WebConnector(LoadConnector):
     def __init__(
         self,
@@ -163,117 +491,13 @@ class WebConnector(LoadConnector):
     def load_from_state(self) -> GenerateDocumentsOutput:
         """Traverses through all pages found on the website
         and converts them into documents"""
-        visited_links: set[str] = set()
-        to_visit: list[str] = self.to_visit_list
-        base_url = to_visit[0]  # For the recursive case
-        doc_batch: list[Document] = []
-
-        playwright, context = start_playwright()
-        restart_playwright = False
-        while to_visit:
-            current_url = to_visit.pop()
-            if current_url in visited_links:
-                continue
-            visited_links.add(current_url)
-
-            logger.info(f"Visiting {current_url}")
-
-            try:
-                current_visit_time = datetime.now().strftime("%B %d, %Y, %H:%M:%S")
-
-                if restart_playwright:
-                    playwright, context = start_playwright()
-                    restart_playwright = False
-
-                if current_url.split(".")[-1] == "pdf":
-                    # PDF files are not checked for links
-                    response = requests.get(current_url)
-                    pdf_reader = PdfReader(io.BytesIO(response.content))
-                    page_text = ""
-                    for pdf_page in pdf_reader.pages:
-                        page_text += pdf_page.extract_text()
-
-                    doc_batch.append(
-                        Document(
-                            id=current_url,
-                            sections=[Section(link=current_url, text=page_text)],
-                            source=DocumentSource.WEB,
-                            semantic_identifier=current_url.split(".")[-1],
-                            metadata={"Time Visited": current_visit_time},
-                        )
-                    )
-                    continue
-
-                page = context.new_page()
-                page.goto(current_url)
-                final_page = page.url
-                if final_page != current_url:
-                    logger.info(f"Redirected to {final_page}")
-                    current_url = final_page
-                    if current_url in visited_links:
-                        logger.info("Redirected page already indexed")
-                        continue
-                    visited_links.add(current_url)
-
-                content = page.content()
-                soup = BeautifulSoup(content, "html.parser")
-
-                if self.recursive:
-                    internal_links = get_internal_links(base_url, current_url, soup)
-                    for link in internal_links:
-                        if link not in visited_links:
-                            to_visit.append(link)
-
-                title_tag = soup.find("title")
-                title = None
-                if title_tag and title_tag.text:
-                    title = title_tag.text
-                    title_tag.extract()
-
-                # Heuristics based cleaning of elements based on css classes
-                unwanted_classes = copy(WEB_CONNECTOR_IGNORED_CLASSES)
-                if self.mintlify_cleanup:
-                    unwanted_classes.extend(MINTLIFY_UNWANTED)
-                for undesired_element in unwanted_classes:
-                    [
-                        tag.extract()
-                        for tag in soup.find_all(
-                            class_=lambda x: x and undesired_element in x.split()
-                        )
-                    ]
-
-                for undesired_tag in WEB_CONNECTOR_IGNORED_ELEMENTS:
-                    [tag.extract() for tag in soup.find_all(undesired_tag)]
-
-                # 200B is ZeroWidthSpace which we don't care for
-                page_text = format_document_soup(soup).replace("\u200B", "")
-
-                doc_batch.append(
-                    Document(
-                        id=current_url,
-                        sections=[Section(link=current_url, text=page_text)],
-                        source=DocumentSource.WEB,
-                        semantic_identifier=title or current_url,
-                        metadata={},
-                    )
-                )
-
-                page.close()
-            except Exception as e:
-                logger.error(f"Failed to fetch '{current_url}': {e}")
-                playwright.stop()
-                restart_playwright = True
-                continue
-
-            if len(doc_batch) >= self.batch_size:
-                playwright.stop()
-                restart_playwright = True
-                yield doc_batch
-                doc_batch = []
-
-        if doc_batch:
-            playwright.stop()
-            yield doc_batch
+        crawler = _WebCrawler(
+            base_url=self.to_visit_list[0],  # For the recursive case
+            recursive=self.recursive,
+            mintlify_cleanup=self.mintlify_cleanup,
+            batch_size=self.batch_size,
+        )
+        yield from crawler.crawl(self.to_visit_list)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,24 @@
+import queue
+import threading
+import time
+from collections.abc import Callable
+from collections.abc import Iterator
+from dataclasses import dataclass
+from dataclasses import field
 from functools import partial
 from itertools import chain
+from typing import Any
 from typing import Protocol
 
 from sqlalchemy.orm import Session
 
 from danswer.access.access import get_access_for_documents
 from danswer.chunking.chunk import Chunker
-from danswer.chunking.chunk import DefaultChunker
+from danswer.chunking.chunk import get_default_chunker
 from danswer.chunking.models import DocAwareChunk
 from danswer.chunking.models import DocMetadataAwareIndexChunk
+from danswer.chunking.models import IndexChunk
+from danswer.configs.app_configs import INDEXING_PIPELINE_QUEUE_SIZE
 from danswer.connectors.models import Document
 from danswer.connectors.models import IndexAttemptMetadata
 from danswer.datastores.document_index import get_default_document_index
@@ -24,6 +34,9 @@ from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
 
+# How often blocked stages check whether the pipeline has been shut down
+_QUEUE_POLL_INTERVAL = 0.5  # seconds
+
 
 class IndexingPipelineProtocol(Protocol):
     def __call__(
@@ -32,6 +45,125 @@ class IndexingPipelineProtocol(Protocol):
         ...
 
 
+class StagedIndexingPipelineProtocol(Protocol):
+    def __call__(
+        self,
+        doc_batch_generator: Iterator[list[Document]],
+        index_attempt_metadata: IndexAttemptMetadata,
+    ) -> Iterator[tuple[list[Document], int, int]]:
+        ...
+
+
+@dataclass
+class IndexingStageStats:
+    batches: int = 0
+    seconds: float = 0.0
+    # Depth of the stage's input queue each time it picked up a batch. A stage whose
+    # input queue is consistently full is the one limiting the pipeline
+    total_queue_depth: int = 0
+    max_queue_depth: int = 0
+
+    def record(self, seconds: float, queue_depth: int) -> None:
+        self.batches += 1
+        self.seconds += seconds
+        self.total_queue_depth += queue_depth
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+
+@dataclass
+class IndexingPipelineStats:
+    stages: dict[str, IndexingStageStats] = field(
+        default_factory=lambda: {
+            stage: IndexingStageStats()
+            for stage in ["fetch", "chunk", "embed", "write"]
+        }
+    )
+
+    def log_summary(self) -> None:
+        for stage, stats in self.stages.items():
+            avg_queue_depth = stats.total_queue_depth / max(stats.batches, 1)
+            logger.info(
+                f"Indexing stage '{stage}': {stats.batches} batches in {stats.seconds:.2f} seconds, "
+                f"avg input queue depth {avg_queue_depth:.2f}, max {stats.max_queue_depth}"
+            )
+
+
+class _StageFailure:
+    def __init__(self, exception: Exception) -> None:
+        self.exception = exception
+
+
+# Marks that the upstream stage has no more batches
+_STAGE_DONE = object()
+
+
+def _put_until_stopped(
+    output_queue: queue.Queue, item: Any, stop_event: threading.Event
+) -> bool:
+    while not stop_event.is_set():
+        try:
+            output_queue.put(item, timeout=_QUEUE_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get_until_stopped(input_queue: queue.Queue, stop_event: threading.Event) -> Any:
+    while not stop_event.is_set():
+        try:
+            return input_queue.get(timeout=_QUEUE_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return _STAGE_DONE
+
+
+def _run_source_stage(
+    stage_stats: IndexingStageStats,
+    doc_batches: Iterator[list[Document]],
+    output_queue: queue.Queue,
+    stop_event: threading.Event,
+) -> None:
+    try:
+        while not stop_event.is_set():
+            start = time.time()
+            doc_batch = next(doc_batches, None)
+            if doc_batch is None:
+                break
+            stage_stats.record(time.time() - start, 0)
+
+            if not _put_until_stopped(output_queue, doc_batch, stop_event):
+                return
+        _put_until_stopped(output_queue, _STAGE_DONE, stop_event)
+    except Exception as e:
+        _put_until_stopped(output_queue, _StageFailure(e), stop_event)
+
+
+def _run_stage(
+    stage_stats: IndexingStageStats,
+    process: Callable[[Any], Any],
+    input_queue: queue.Queue,
+    output_queue: queue.Queue,
+    stop_event: threading.Event,
+) -> None:
+    try:
+        while True:
+            item = _get_until_stopped(input_queue, stop_event)
+            if item is _STAGE_DONE or isinstance(item, _StageFailure):
+                _put_until_stopped(output_queue, item, stop_event)
+                return
+
+            queue_depth = input_queue.qsize()
+            start = time.time()
+            result = process(item)
+            stage_stats.record(time.time() - start, queue_depth)
+
+            if not _put_until_stopped(output_queue, result, stop_event):
+                return
+    except Exception as e:
+        _put_until_stopped(output_queue, _StageFailure(e), stop_event)
+
+
 def _upsert_documents(
     document_ids: list[str],
     index_attempt_metadata: IndexAttemptMetadata,
@@ -58,17 +190,26 @@ def _extract_minimal_document_metadata(doc: Document) -> tuple[str, str]:
     return doc.semantic_identifier, first_link
 
 
-def _indexing_pipeline(
+def _chunk_documents(
+    chunker: Chunker, documents: list[Document]
+) -> list[DocAwareChunk]:
+    chunks: list[DocAwareChunk] = list(chain(*chunker.chunk_batch(documents)))
+    logger.debug(
+        f"Indexing the following chunks: {[chunk.to_short_descriptor() for chunk in chunks]}"
+    )
+    return chunks
+
+
+def _write_chunks(
     *,
-    chunker: Chunker,
-    embedder: Embedder,
     document_index: DocumentIndex,
     documents: list[Document],
+    chunks_with_embeddings: list[IndexChunk],
     index_attempt_metadata: IndexAttemptMetadata,
-) -> tuple[int, int]:
-    """Takes different pieces of the indexing pipeline and applies it to a batch of documents
-    Note that the documents should already be batched at this point so that it does not inflate the
-    memory requirements"""
+) -> int:
+    """Records the documents in Postgres and writes their chunks to the document index.
+    The document locks are only held for the duration of this step. Returns the number
+    of documents which did not exist in the index before"""
     document_ids = [document.id for document in documents]
     document_metadata_lookup = {
         doc.id: _extract_minimal_document_metadata(doc) for doc in documents
@@ -86,14 +227,6 @@ def _indexing_pipeline(
             db_session=db_session,
         )
 
-        chunks: list[DocAwareChunk] = list(
-            chain(*[chunker.chunk(document=document) for document in documents])
-        )
-        logger.debug(
-            f"Indexing the following chunks: {[chunk.to_short_descriptor() for chunk in chunks]}"
-        )
-        chunks_with_embeddings = embedder.embed(chunks=chunks)
-
         # Attach the latest status from Postgres (source of truth for access) to each
         # chunk. This access status will be attached to each chunk in the document index
         # TODO: attach document sets to the chunk based on the status of Postgres as well
@@ -124,9 +257,121 @@ def _indexing_pipeline(
             chunks=access_aware_chunks,
         )
 
-    return len([r for r in insertion_records if r.already_existed is False]), len(
-        chunks
+    return len([r for r in insertion_records if r.already_existed is False])
+
+
+def _indexing_pipeline(
+    *,
+    chunker: Chunker,
+    embedder: Embedder,
+    document_index: DocumentIndex,
+    documents: list[Document],
+    index_attempt_metadata: IndexAttemptMetadata,
+) -> tuple[int, int]:
+    """Takes different pieces of the indexing pipeline and applies it to a batch of documents
+    Note that the documents should already be batched at this point so that it does not inflate the
+    memory requirements"""
+    chunks = _chunk_documents(chunker=chunker, documents=documents)
+    chunks_with_embeddings = embedder.embed(chunks=chunks)
+    new_docs = _write_chunks(
+        document_index=document_index,
+        documents=documents,
+        chunks_with_embeddings=chunks_with_embeddings,
+        index_attempt_metadata=index_attempt_metadata,
     )
+    return new_docs, len(chunks)
+
+
+def _staged_indexing_pipeline(
+    *,
+    chunker: Chunker,
+    embedder: Embedder,
+    document_index: DocumentIndex,
+    doc_batch_generator: Iterator[list[Document]],
+    index_attempt_metadata: IndexAttemptMetadata,
+    queue_size: int = INDEXING_PIPELINE_QUEUE_SIZE,
+) -> Iterator[tuple[list[Document], int, int]]:
+    """Same steps as `_indexing_pipeline` but over a stream of document batches, with
+    fetching, chunking and embedding each running in their own thread connected by
+    bounded queues. While batch N is being written, batch N+1 can be embedded and batch
+    N+2 chunked. Writes happen on the calling thread, in order, and for each batch the
+    documents, the number of new documents and the number of chunks are yielded"""
+    stats = IndexingPipelineStats()
+    stop_event = threading.Event()
+    fetched_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    chunked_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    embedded_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+    def _chunk(documents: list[Document]) -> tuple[list[Document], list[DocAwareChunk]]:
+        return documents, _chunk_documents(chunker=chunker, documents=documents)
+
+    def _embed(
+        item: tuple[list[Document], list[DocAwareChunk]]
+    ) -> tuple[list[Document], list[IndexChunk]]:
+        documents, chunks = item
+        return documents, embedder.embed(chunks=chunks)
+
+    stage_threads = [
+        threading.Thread(
+            target=_run_source_stage,
+            args=(
+                stats.stages["fetch"],
+                doc_batch_generator,
+                fetched_queue,
+                stop_event,
+            ),
+            daemon=True,
+        ),
+        threading.Thread(
+            target=_run_stage,
+            args=(
+                stats.stages["chunk"],
+                _chunk,
+                fetched_queue,
+                chunked_queue,
+                stop_event,
+            ),
+            daemon=True,
+        ),
+        threading.Thread(
+            target=_run_stage,
+            args=(
+                stats.stages["embed"],
+                _embed,
+                chunked_queue,
+                embedded_queue,
+                stop_event,
+            ),
+            daemon=True,
+        ),
+    ]
+    for thread in stage_threads:
+        thread.start()
+
+    try:
+        while True:
+            item = embedded_queue.get()
+            if item is _STAGE_DONE:
+                break
+            if isinstance(item, _StageFailure):
+                raise item.exception
+
+            queue_depth = embedded_queue.qsize()
+            start = time.time()
+            documents, chunks_with_embeddings = item
+            new_docs = _write_chunks(
+                document_index=document_index,
+                documents=documents,
+                chunks_with_embeddings=chunks_with_embeddings,
+                index_attempt_metadata=index_attempt_metadata,
+            )
+            stats.stages["write"].record(time.time() - start, queue_depth)
+
+            yield documents, new_docs, len(chunks_with_embeddings)
+    finally:
+        # Stops the other stages if the consumer stopped early or a stage failed
+        stop_event.set()
+        stats.log_summary()
 
 
 def build_indexing_pipeline(
@@ -136,7 +381,7 @@ def build_indexing_pipeline(
     document_index: DocumentIndex | None = None,
 ) -> IndexingPipelineProtocol:
     """Builds a pipline which takes in a list (batch) of docs and indexes them."""
-    chunker = chunker or DefaultChunker()
+    chunker = chunker or get_default_chunker()
 
     embedder = embedder or DefaultEmbedder()
 
@@ -148,3 +393,25 @@ def build_indexing_pipeline(
         embedder=embedder,
         document_index=document_index,
     )
+
+
+def build_staged_indexing_pipeline(
+    *,
+    chunker: Chunker | None = None,
+    embedder: Embedder | None = None,
+    document_index: DocumentIndex | None = None,
+) -> StagedIndexingPipelineProtocol:
+    """Builds a pipeline which takes in a generator of document batches and indexes
+    them with the fetch / chunk / embed / write stages overlapping across batches."""
+    chunker = chunker or get_default_chunker()
+
+    embedder = embedder or DefaultEmbedder()
+
+    document_index = document_index or get_default_document_index()
+
+    return partial(
+        _staged_indexing_pipeline,
+        chunker=chunker,
+        embedder=embedder,
+        document_index=document_index,
+    )
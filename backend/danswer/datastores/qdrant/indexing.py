@@ -112,7 +112,7 @@ def index_qdrant_chunks(
                         ALLOWED_USERS: json.dumps(chunk.access.to_acl()),
                         METADATA: json.dumps(document.metadata),
                     },
-                    vector=embedding,
+                    vector=embedding.tolist(),
                 )
             )
 
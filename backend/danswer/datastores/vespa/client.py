@@ -0,0 +1,166 @@
+import bisect
+import threading
+import time
+from typing import Any
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from danswer.configs.app_configs import VESPA_CONNECT_TIMEOUT
+from danswer.configs.app_configs import VESPA_CONNECTION_POOL_SIZE
+from danswer.configs.app_configs import VESPA_MAX_RETRIES
+from danswer.configs.app_configs import VESPA_READ_TIMEOUT
+from danswer.configs.app_configs import VESPA_RETRY_BACKOFF
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Vespa responds with these when it is temporarily overloaded, requests receiving them
+# are retried with exponential backoff
+_RETRYABLE_STATUS_CODES = {429, 503, 504}
+# Upper bounds of the latency histogram buckets, in milliseconds
+_LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+# How many requests between logging of the latency histograms
+_LATENCY_LOG_INTERVAL = 1000
+
+
+class LatencyHistogram:
+    def __init__(self) -> None:
+        # the last bucket holds everything slower than the largest bound
+        self.bucket_counts = [0] * (len(_LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, latency_ms: float) -> None:
+        self.bucket_counts[bisect.bisect_left(_LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile, inf if it is past the
+        largest bucket"""
+        target = q * self.count
+        cumulative = 0
+        for ind, bucket_count in enumerate(self.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= target and bucket_count:
+                return (
+                    _LATENCY_BUCKETS_MS[ind]
+                    if ind < len(_LATENCY_BUCKETS_MS)
+                    else float("inf")
+                )
+        return 0.0
+
+
+class _VespaLatencyTracker:
+    """Latency histograms per Vespa endpoint, logged periodically"""
+
+    def __init__(self) -> None:
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._num_requests = 0
+
+    def observe(self, url: str, latency_ms: float) -> None:
+        endpoint = _get_endpoint_label(url)
+        with self._lock:
+            self._histograms.setdefault(endpoint, LatencyHistogram()).observe(
+                latency_ms
+            )
+            self._num_requests += 1
+            if self._num_requests % _LATENCY_LOG_INTERVAL == 0:
+                self._log()
+
+    def _get_stats(self) -> dict[str, dict[str, float]]:
+        return {
+            endpoint: {
+                "count": histogram.count,
+                "avg_ms": histogram.total_ms / max(histogram.count, 1),
+                "p50_ms": histogram.quantile(0.5),
+                "p95_ms": histogram.quantile(0.95),
+                "p99_ms": histogram.quantile(0.99),
+            }
+            for endpoint, histogram in self._histograms.items()
+        }
+
+    def _log(self) -> None:
+        for endpoint, stats in self._get_stats().items():
+            logger.info(
+                f"Vespa {endpoint} latency over {stats['count']} requests: "
+                f"avg {stats['avg_ms']:.1f}ms, p50 <= {stats['p50_ms']}ms, "
+                f"p95 <= {stats['p95_ms']}ms, p99 <= {stats['p99_ms']}ms"
+            )
+
+
+_LATENCY_TRACKER = _VespaLatencyTracker()
+
+
+def _get_endpoint_label(url: str) -> str:
+    """Groups the requests by Vespa API, e.g. /search/ or /document/v1/..., the document
+    ids in the path would otherwise give every request its own histogram"""
+    path_parts = [part for part in urlparse(url).path.split("/") if part]
+    return path_parts[0] if path_parts else "root"
+
+
+class VespaClient:
+    """Shared keep-alive session for all the Vespa traffic of a process. Connections are
+    pooled for the feeding / update threads, every request gets the configured timeouts,
+    and connection errors and overloaded responses are retried with backoff. Once the
+    retries are used up the last response is returned for the caller to handle"""
+
+    def __init__(
+        self,
+        pool_size: int = VESPA_CONNECTION_POOL_SIZE,
+        connect_timeout: float = VESPA_CONNECT_TIMEOUT,
+        read_timeout: float = VESPA_READ_TIMEOUT,
+        max_retries: int = VESPA_MAX_RETRIES,
+        retry_backoff: float = VESPA_RETRY_BACKOFF,
+    ) -> None:
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=retry_backoff,
+            status_forcelist=_RETRYABLE_STATUS_CODES,
+            # document/v1 operations address the document by id so they are idempotent
+            allowed_methods=None,
+            raise_on_status=False,
+            respect_retry_after_header=True,
+        )
+        # one pool for the app container and one for the config server
+        adapter = HTTPAdapter(
+            pool_connections=2, pool_maxsize=pool_size, max_retries=retry
+        )
+        self._session = requests.Session()
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.monotonic()
+        try:
+            return self._session.request(method, url, **kwargs)
+        finally:
+            _LATENCY_TRACKER.observe(url, 1000 * (time.monotonic() - start))
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+
+_VESPA_CLIENT: VespaClient | None = None
+
+
+def get_vespa_client() -> VespaClient:
+    global _VESPA_CLIENT
+    if _VESPA_CLIENT is None:
+        _VESPA_CLIENT = VespaClient()
+    return _VESPA_CLIENT
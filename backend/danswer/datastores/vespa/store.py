@@ -9,7 +9,6 @@ from typing import cast
 from uuid import UUID
 
 import requests
-from requests import HTTPError
 from requests import Response
 
 from danswer.chunking.models import DocMetadataAwareIndexChunk
@@ -43,6 +42,7 @@ from danswer.datastores.interfaces import DocumentIndex
 from danswer.datastores.interfaces import DocumentInsertionRecord
 from danswer.datastores.interfaces import IndexFilter
 from danswer.datastores.interfaces import UpdateRequest
+from danswer.datastores.vespa.client import get_vespa_client
 from danswer.datastores.vespa.utils import remove_invalid_unicode_chars
 from danswer.search.semantic_search import embed_query
 from danswer.utils.batching import batch_generator
@@ -55,8 +55,9 @@ VESPA_CONFIG_SERVER_URL = f"http://{VESPA_HOST}:{VESPA_TENANT_PORT}"
 VESPA_APP_CONTAINER_URL = f"http://{VESPA_HOST}:{VESPA_PORT}"
 VESPA_APPLICATION_ENDPOINT = f"{VESPA_CONFIG_SERVER_URL}/application/v2"
 # danswer_chunk below is defined in vespa/app_configs/schemas/danswer_chunk.sd
+_VESPA_DOCUMENT_TYPE = "danswer_chunk"
 DOCUMENT_ID_ENDPOINT = (
-    f"{VESPA_APP_CONTAINER_URL}/document/v1/default/danswer_chunk/docid"
+    f"{VESPA_APP_CONTAINER_URL}/document/v1/default/{_VESPA_DOCUMENT_TYPE}/docid"
 )
 SEARCH_ENDPOINT = f"{VESPA_APP_CONTAINER_URL}/search/"
 _BATCH_SIZE = 100  # Specific to Vespa
@@ -74,20 +75,55 @@ class _VespaUpdateRequest:
     update_request: dict[str, dict]
 
 
-def _does_document_exist(
-    doc_chunk_id: str,
-) -> bool:
-    """Returns whether the document already exists and the users/group whitelists"""
-    doc_fetch_response = requests.get(f"{DOCUMENT_ID_ENDPOINT}/{doc_chunk_id}")
-    if doc_fetch_response.status_code == 404:
-        return False
+def _get_vespa_feed_error(response: Response) -> str:
+    """Vespa reports the reason an operation failed in the `message` field of the
+    response body, fall back to the raw text if the body is not what we expect"""
+    try:
+        return response.json().get("message", response.text)
+    except ValueError:
+        return response.text
+
+
+def _escape_vespa_string(value: str) -> str:
+    """Escapes a value so it can be placed in a double quoted string of a YQL query
+    or a document selection expression"""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
 
-    if doc_fetch_response.status_code != 200:
-        raise RuntimeError(
-            f"Unexpected fetch document by ID value from Vespa "
-            f"with error {doc_fetch_response.status_code}"
+def _get_existing_document_ids(document_ids: list[str]) -> set[str]:
+    """Returns which of the given documents have at least one chunk in Vespa. Uses a
+    single grouping query per batch of documents instead of a lookup per chunk"""
+    existing_document_ids: set[str] = set()
+    for document_id_batch in batch_generator(document_ids, _BATCH_SIZE):
+        document_id_filter = " or ".join(
+            f'{DOCUMENT_ID} contains "{_escape_vespa_string(document_id)}"'
+            for document_id in document_id_batch
         )
-    return True
+        params: dict[str, int | str] = {
+            "yql": (
+                f"select {DOCUMENT_ID} from {DOCUMENT_INDEX_NAME} "
+                f"where {document_id_filter} "
+                f"| all(group({DOCUMENT_ID}) max({len(document_id_batch)}) "
+                f"each(output(count())))"
+            ),
+            "timeout": "10s",
+            # only the groups are needed, not the matching chunks themselves
+            "hits": 0,
+        }
+        response = get_vespa_client().get(SEARCH_ENDPOINT, params=params)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Unexpected response when checking for existing documents in Vespa "
+                f"with error {response.status_code}: {response.text}"
+            )
+
+        # Grouping results are nested as root -> group list -> one group per document id
+        for group_root in response.json()["root"].get("children", []):
+            for group_list in group_root.get("children", []):
+                for group in group_list.get("children", []):
+                    existing_document_ids.add(group["value"])
+
+    return existing_document_ids
 
 
 def _get_vespa_chunk_ids_by_document_id(
@@ -102,7 +138,7 @@ def _get_vespa_chunk_ids_by_document_id(
         "hits": hits_per_page,
     }
     while True:
-        results = requests.get(SEARCH_ENDPOINT, params=params).json()
+        results = get_vespa_client().get(SEARCH_ENDPOINT, params=params).json()
         hits = results["root"].get("children", [])
 
         # Temporary logging to catch the rare index out of bounds issue
@@ -118,43 +154,39 @@ def _get_vespa_chunk_ids_by_document_id(
     return doc_chunk_ids
 
 
-def _delete_vespa_doc_chunks(document_id: str) -> bool:
-    doc_chunk_ids = _get_vespa_chunk_ids_by_document_id(document_id)
+def _delete_vespa_docs(document_ids: list[str]) -> None:
+    """Removes all chunks of the given documents. Uses a selection based delete, which
+    Vespa executes as a visit, so it is one request per batch of documents (plus one per
+    continuation if the visit does not finish in a single request)"""
+    for document_id_batch in batch_generator(document_ids, _BATCH_SIZE):
+        selection = " or ".join(
+            f'{_VESPA_DOCUMENT_TYPE}.{DOCUMENT_ID}=="{_escape_vespa_string(document_id)}"'
+            for document_id in document_id_batch
+        )
+        params = {"selection": selection, "cluster": DOCUMENT_INDEX_NAME}
+        while True:
+            response = get_vespa_client().delete(DOCUMENT_ID_ENDPOINT, params=params)
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f"Failed to delete chunks for documents with ids: {document_id_batch}. "
+                    f"Got response: '{_get_vespa_feed_error(response)}'"
+                )
 
-    failures = [
-        requests.delete(f"{DOCUMENT_ID_ENDPOINT}/{doc}").status_code != 200
-        for doc in doc_chunk_ids
-    ]
-    return not any(failures)
+            continuation = response.json().get("continuation")
+            if not continuation:
+                break
+            params["continuation"] = continuation
 
 
-def _index_vespa_chunk(
-    chunk: DocMetadataAwareIndexChunk, already_existing_documents: set[str]
-) -> bool:
-    json_header = {
-        "Content-Type": "application/json",
-    }
+def _build_vespa_document_fields(chunk: DocMetadataAwareIndexChunk) -> dict[str, Any]:
     document = chunk.source_document
     # No minichunk documents in vespa, minichunk vectors are stored in the chunk itself
-    vespa_chunk_id = str(get_uuid_from_chunk(chunk))
-
-    # Delete all chunks related to the document if (1) it already exists and
-    # (2) this is our first time running into it during this indexing attempt
-    chunk_exists = _does_document_exist(vespa_chunk_id)
-    if chunk_exists and document.id not in already_existing_documents:
-        deletion_success = _delete_vespa_doc_chunks(document.id)
-        if not deletion_success:
-            raise RuntimeError(
-                f"Failed to delete pre-existing chunks for with document with id: {document.id}"
-            )
-
     embeddings = chunk.embeddings
-    embeddings_name_vector_map = {"full_chunk": embeddings.full_embedding}
-    if embeddings.mini_chunk_embeddings:
-        for ind, m_c_embed in enumerate(embeddings.mini_chunk_embeddings):
-            embeddings_name_vector_map[f"mini_chunk_{ind}"] = m_c_embed
+    embeddings_name_vector_map = {"full_chunk": embeddings.full_embedding.tolist()}
+    for ind, m_c_embed in enumerate(embeddings.mini_chunk_embeddings):
+        embeddings_name_vector_map[f"mini_chunk_{ind}"] = m_c_embed.tolist()
 
-    vespa_document_fields = {
+    return {
         DOCUMENT_ID: document.id,
         CHUNK_ID: chunk.chunk_id,
         BLURB: chunk.blurb,
@@ -174,80 +206,77 @@ def _index_vespa_chunk(
         DOCUMENT_SETS: {document_set: 1 for document_set in chunk.document_sets},
     }
 
-    def _index_chunk(
-        url: str,
-        headers: dict[str, str],
-        fields: dict[str, Any],
-    ) -> Response:
-        logger.debug(f'Indexing to URL "{url}"')
-        res = requests.post(url, headers=headers, json={"fields": fields})
-        try:
-            res.raise_for_status()
-            return res
-        except Exception as e:
-            logger.error(
-                f"Failed to index document: '{document.id}'. Got response: '{res.text}'"
-            )
-            raise e
 
+def _remove_invalid_unicode_from_fields(vespa_document_fields: dict[str, Any]) -> None:
+    for field in [BLURB, SEMANTIC_IDENTIFIER, CONTENT, CONTENT_SUMMARY]:
+        vespa_document_fields[field] = remove_invalid_unicode_chars(
+            cast(str, vespa_document_fields[field])
+        )
+
+
+def _feed_vespa_chunk(chunk: DocMetadataAwareIndexChunk) -> None:
+    document = chunk.source_document
+    vespa_chunk_id = str(get_uuid_from_chunk(chunk))
     vespa_url = f"{DOCUMENT_ID_ENDPOINT}/{vespa_chunk_id}"
-    try:
-        _index_chunk(vespa_url, json_header, vespa_document_fields)
-    except HTTPError as e:
-        if cast(Response, e.response).status_code != 400:
-            raise e
+    vespa_document_fields = _build_vespa_document_fields(chunk)
 
+    # overloaded responses are already retried with backoff by the client
+    logger.debug(f'Indexing to URL "{vespa_url}"')
+    res = get_vespa_client().post(vespa_url, json={"fields": vespa_document_fields})
+    if res.status_code == 400:
         # if it's a 400 response, try again with invalid unicode chars removed
         # only doing this on error to avoid having to go through the content
         # char by char every time
-        vespa_document_fields[BLURB] = remove_invalid_unicode_chars(
-            cast(str, vespa_document_fields[BLURB])
-        )
-        vespa_document_fields[SEMANTIC_IDENTIFIER] = remove_invalid_unicode_chars(
-            cast(str, vespa_document_fields[SEMANTIC_IDENTIFIER])
-        )
-        vespa_document_fields[CONTENT] = remove_invalid_unicode_chars(
-            cast(str, vespa_document_fields[CONTENT])
-        )
-        vespa_document_fields[CONTENT_SUMMARY] = remove_invalid_unicode_chars(
-            cast(str, vespa_document_fields[CONTENT_SUMMARY])
+        _remove_invalid_unicode_from_fields(vespa_document_fields)
+        res = get_vespa_client().post(vespa_url, json={"fields": vespa_document_fields})
+
+    if not res.ok:
+        logger.error(
+            f"Failed to index document: '{document.id}'. "
+            f"Got response: '{_get_vespa_feed_error(res)}'"
         )
-        _index_chunk(vespa_url, json_header, vespa_document_fields)
+        res.raise_for_status()
 
-    return chunk_exists
+
+def _feed_vespa_chunks(chunks: list[DocMetadataAwareIndexChunk]) -> None:
+    """The document/v1 API only accepts one document per operation, so the operations
+    are pipelined over the pooled keep-alive connections of the shared Vespa client"""
+    start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=_NUM_THREADS) as executor:
+        # consume the results so that any failed operation is raised here
+        list(executor.map(_feed_vespa_chunk, chunks))
+
+    time_taken = time.time() - start
+    logger.info(
+        f"Fed {len(chunks)} chunks to Vespa in {time_taken:.2f} seconds "
+        f"({len(chunks) / max(time_taken, 1e-6):.1f} chunks/sec)"
+    )
 
 
 def _index_vespa_chunks(
     chunks: list[DocMetadataAwareIndexChunk],
 ) -> set[DocumentInsertionRecord]:
-    insertion_records: set[DocumentInsertionRecord] = set()
+    # dict to dedupe while keeping the order the documents came in
+    document_ids = list(dict.fromkeys(chunk.source_document.id for chunk in chunks))
+
     # document ids of documents that existed BEFORE this indexing
-    already_existing_documents: set[str] = set()
+    already_existing_documents = _get_existing_document_ids(document_ids)
 
-    # use threads to parallelize since Vespa doesn't allow batching of updates
-    with concurrent.futures.ThreadPoolExecutor(max_workers=_NUM_THREADS) as executor:
-        for chunk_batch in batch_generator(chunks, _BATCH_SIZE):
-            future_to_chunk = {
-                executor.submit(
-                    _index_vespa_chunk, chunk, already_existing_documents
-                ): chunk
-                for chunk in chunk_batch
-            }
-            for future in concurrent.futures.as_completed(future_to_chunk):
-                chunk = future_to_chunk[future]
-                chunk_already_existed = future.result()
-                if chunk_already_existed:
-                    already_existing_documents.add(chunk.source_document.id)
-
-                insertion_records.add(
-                    DocumentInsertionRecord(
-                        document_id=chunk.source_document.id,
-                        already_existed=chunk.source_document.id
-                        in already_existing_documents,
-                    )
-                )
+    # Delete all chunks related to the documents that already exist before any of
+    # the new chunks are written, so that stale chunks (e.g. from a document that
+    # has since shrunk) don't linger in the index
+    if already_existing_documents:
+        _delete_vespa_docs(list(already_existing_documents))
 
-    return insertion_records
+    _feed_vespa_chunks(chunks)
+
+    return {
+        DocumentInsertionRecord(
+            document_id=document_id,
+            already_existed=document_id in already_existing_documents,
+        )
+        for document_id in document_ids
+    }
 
 
 def _build_vespa_filters(
@@ -327,7 +356,7 @@ def _query_vespa(query_params: Mapping[str, str | int]) -> list[InferenceChunk]:
         raise ValueError(
             "Query only consisted of stopwords, should not use Keyword Search"
         )
-    response = requests.get(SEARCH_ENDPOINT, params=query_params)
+    response = get_vespa_client().get(SEARCH_ENDPOINT, params=query_params)
     response.raise_for_status()
 
     hits = response.json()["root"].get("children", [])
@@ -397,11 +426,13 @@ class VespaIndex(DocumentIndex):
         logger.debug(f"Sending Vespa zip to {deploy_url}")
         headers = {"Content-Type": "application/zip"}
         with open(self.deployment_zip, "rb") as f:
-            response = requests.post(deploy_url, headers=headers, data=f)
-            if response.status_code != 200:
-                raise RuntimeError(
-                    f"Failed to prepare Vespa Danswer Index. Response: {response.text}"
-                )
+            # read fully so that the body can be resent if the request is retried
+            app_zip = f.read()
+        response = get_vespa_client().post(deploy_url, headers=headers, data=app_zip)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Failed to prepare Vespa Danswer Index. Response: {response.text}"
+            )
 
     def index(
         self,
@@ -421,7 +452,7 @@ class VespaIndex(DocumentIndex):
             for update_batch in batch_generator(updates, batch_size):
                 future_to_document_id = {
                     executor.submit(
-                        requests.put,
+                        get_vespa_client().put,
                         update.url,
                         headers={"Content-Type": "application/json"},
                         data=json.dumps(update.update_request),
@@ -483,12 +514,7 @@ class VespaIndex(DocumentIndex):
 
     def delete(self, doc_ids: list[str]) -> None:
         logger.info(f"Deleting {len(doc_ids)} documents from Vespa")
-        for doc_id in doc_ids:
-            success = _delete_vespa_doc_chunks(doc_id)
-            if not success:
-                raise RuntimeError(
-                    f"Unable to delete document with document id: {doc_id}"
-                )
+        _delete_vespa_docs(doc_ids)
 
     def keyword_retrieval(
         self,
@@ -2,7 +2,6 @@ from collections.abc import Callable
 
 from sqlalchemy.orm import Session
 
-from danswer.chunking.models import InferenceChunk
 from danswer.configs.app_configs import DISABLE_GENERATIVE_AI
 from danswer.configs.app_configs import ENABLE_DANSWERBOT_REFLEXION
 from danswer.configs.app_configs import NUM_DOCUMENT_TOKENS_FED_TO_GENERATIVE_MODEL
@@ -16,14 +15,12 @@ from danswer.direct_qa.exceptions import UnknownModelError
 from danswer.direct_qa.llm_utils import get_default_qa_model
 from danswer.direct_qa.models import LLMMetricsContainer
 from danswer.direct_qa.qa_utils import get_usable_chunks
-from danswer.search.danswer_helper import query_intent
-from danswer.search.keyword_search import retrieve_keyword_documents
+from danswer.search.danswer_helper import retrieve_documents_with_intent
 from danswer.search.models import QueryFlow
 from danswer.search.models import RerankMetricsContainer
 from danswer.search.models import RetrievalMetricsContainer
 from danswer.search.models import SearchType
 from danswer.search.semantic_search import chunks_to_search_docs
-from danswer.search.semantic_search import retrieve_ranked_documents
 from danswer.secondary_llm_flows.answer_validation import get_answer_validity
 from danswer.server.models import QAResponse
 from danswer.server.models import QuestionRequest
@@ -61,29 +58,23 @@ def answer_qa_query(
         db_session=db_session,
     )
 
-    predicted_search, predicted_flow = query_intent(query)
-    if use_keyword is None:
-        use_keyword = predicted_search == SearchType.KEYWORD
-
     user_id = None if user is None else user.id
-    if use_keyword:
-        ranked_chunks: list[InferenceChunk] | None = retrieve_keyword_documents(
-            query,
-            user_id,
-            filters,
-            get_default_document_index(),
-            retrieval_metrics_callback=retrieval_metrics_callback,
-        )
-        unranked_chunks: list[InferenceChunk] | None = []
-    else:
-        ranked_chunks, unranked_chunks = retrieve_ranked_documents(
-            query,
-            user_id,
-            filters,
-            get_default_document_index(),
-            retrieval_metrics_callback=retrieval_metrics_callback,
-            rerank_metrics_callback=rerank_metrics_callback,
-        )
+    (
+        ranked_chunks,
+        unranked_chunks,
+        predicted_search,
+        predicted_flow,
+    ) = retrieve_documents_with_intent(
+        query,
+        user_id,
+        filters,
+        get_default_document_index(),
+        use_keyword=use_keyword,
+        # the predicted flow is replaced by search below in this case
+        skip_unused_intent=disable_generative_answer,
+        retrieval_metrics_callback=retrieval_metrics_callback,
+        rerank_metrics_callback=rerank_metrics_callback,
+    )
     if not ranked_chunks:
         return QAResponse(
             answer=None,
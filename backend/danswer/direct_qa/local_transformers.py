@@ -1,8 +1,6 @@
 import re
 from collections.abc import Callable
-
-from transformers import pipeline  # type:ignore
-from transformers import QuestionAnsweringPipeline  # type:ignore
+from typing import TYPE_CHECKING
 
 from danswer.chunking.models import InferenceChunk
 from danswer.configs.model_configs import GEN_AI_MODEL_VERSION
@@ -17,19 +15,24 @@ from danswer.direct_qa.models import LLMMetricsContainer
 from danswer.utils.logger import setup_logger
 from danswer.utils.timing import log_function_time
 
+if TYPE_CHECKING:
+    from transformers import QuestionAnsweringPipeline  # type:ignore
+
 logger = setup_logger()
 
 TRANSFORMER_DEFAULT_MAX_CONTEXT = 512
 
-_TRANSFORMER_MODEL: QuestionAnsweringPipeline | None = None
+_TRANSFORMER_MODEL: "QuestionAnsweringPipeline | None" = None
 
 
 def get_default_transformer_model(
     model_version: str = GEN_AI_MODEL_VERSION,
     max_context: int = TRANSFORMER_DEFAULT_MAX_CONTEXT,
-) -> QuestionAnsweringPipeline:
+) -> "QuestionAnsweringPipeline":
     global _TRANSFORMER_MODEL
     if _TRANSFORMER_MODEL is None:
+        from transformers import pipeline  # type:ignore
+
         _TRANSFORMER_MODEL = pipeline(
             "question-answering", model=model_version, max_seq_len=max_context
         )
@@ -1,4 +1,3 @@
-import nltk  # type:ignore
 import uvicorn
 from fastapi import FastAPI
 from fastapi import Request
@@ -16,6 +15,7 @@ from danswer.chat.personas import load_personas_from_yaml
 from danswer.configs.app_configs import APP_HOST
 from danswer.configs.app_configs import APP_PORT
 from danswer.configs.app_configs import AUTH_TYPE
+from danswer.configs.app_configs import BACKGROUND_WARM_UP
 from danswer.configs.app_configs import DISABLE_GENERATIVE_AI
 from danswer.configs.app_configs import OAUTH_CLIENT_ID
 from danswer.configs.app_configs import OAUTH_CLIENT_SECRET
@@ -44,6 +44,9 @@ from danswer.server.state import router as state_router
 from danswer.server.users import router as user_router
 from danswer.utils.logger import setup_logger
 from danswer.utils.variable_functionality import fetch_versioned_implementation
+from danswer.utils.warm_up import run_warm_up
+from danswer.utils.warm_up import start_background_warm_up
+from danswer.utils.warm_up import WarmUpStep
 
 
 logger = setup_logger()
@@ -70,6 +73,19 @@ def value_error_handler(_: Request, exc: ValueError) -> JSONResponse:
     )
 
 
+def download_nltk_data() -> None:
+    import nltk  # type:ignore
+
+    logger.info("Verifying query preprocessing (NLTK) data is downloaded")
+    nltk.download("stopwords", quiet=True)
+    nltk.download("wordnet", quiet=True)
+    nltk.download("punkt", quiet=True)
+
+
+def warm_up_qa_model() -> None:
+    get_default_qa_model().warm_up_model()
+
+
 def get_application() -> FastAPI:
     application = FastAPI(title="Internal Search QA Backend", debug=True, version="0.1")
     application.include_router(backend_router)
@@ -173,24 +189,27 @@ def get_application() -> FastAPI:
             logger.info(f'Query embedding prefix: "{ASYM_QUERY_PREFIX}"')
             logger.info(f'Passage embedding prefix: "{ASYM_PASSAGE_PREFIX}"')
 
-        logger.info("Warming up local NLP models.")
-        warm_up_models()
-        qa_model = get_default_qa_model()
-        qa_model.warm_up_model()
-
-        logger.info("Verifying query preprocessing (NLTK) data is downloaded")
-        nltk.download("stopwords", quiet=True)
-        nltk.download("wordnet", quiet=True)
-        nltk.download("punkt", quiet=True)
-
         logger.info("Verifying public credential exists.")
         create_initial_public_credential()
 
         logger.info("Loading default Chat Personas")
         load_personas_from_yaml()
 
-        logger.info("Verifying Document Index(s) is/are available.")
-        get_default_document_index().ensure_indices_exist()
+        warm_up_steps: list[WarmUpStep] = [
+            ("local_nlp_models", warm_up_models),
+            ("qa_model", warm_up_qa_model),
+            ("nltk_data", download_nltk_data),
+            (
+                "document_index",
+                lambda: get_default_document_index().ensure_indices_exist(),
+            ),
+        ]
+        if BACKGROUND_WARM_UP:
+            logger.info("Warming up models and Document Index(s) in the background.")
+            start_background_warm_up(warm_up_steps)
+        else:
+            logger.info("Warming up models and verifying Document Index(s).")
+            run_warm_up(warm_up_steps)
 
     application.add_middleware(
         CORSMiddleware,
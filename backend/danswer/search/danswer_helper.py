@@ -1,21 +1,35 @@
-import numpy as np
-import tensorflow as tf  # type:ignore
-from transformers import AutoTokenizer  # type:ignore
+from collections.abc import Callable
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from uuid import UUID
 
+from danswer.chunking.models import InferenceChunk
+from danswer.configs.app_configs import NUM_RETURNED_HITS
+from danswer.configs.model_configs import ENABLE_SPECULATIVE_RETRIEVAL
+from danswer.datastores.interfaces import DocumentIndex
+from danswer.datastores.interfaces import IndexFilter
+from danswer.search.intent_batching import get_default_intent_batcher
 from danswer.search.keyword_search import remove_stop_words
+from danswer.search.keyword_search import retrieve_keyword_documents
 from danswer.search.models import QueryFlow
+from danswer.search.models import RerankMetricsContainer
+from danswer.search.models import RetrievalMetricsContainer
 from danswer.search.models import SearchType
-from danswer.search.search_utils import get_default_intent_model
-from danswer.search.search_utils import get_default_intent_model_tokenizer
 from danswer.search.search_utils import get_default_tokenizer
+from danswer.search.semantic_search import rank_retrieved_documents
+from danswer.search.semantic_search import retrieve_ranked_documents
 from danswer.server.models import HelperResponse
 from danswer.utils.logger import setup_logger
 from danswer.utils.timing import log_function_time
 
+if TYPE_CHECKING:
+    from transformers import AutoTokenizer  # type:ignore
+
 logger = setup_logger()
 
 
-def count_unk_tokens(text: str, tokenizer: AutoTokenizer) -> int:
+def count_unk_tokens(text: str, tokenizer: "AutoTokenizer") -> int:
     """Unclear if the wordpiece tokenizer used is actually tokenizing anything as the [UNK] token
     It splits up even foreign characters and unicode emojis without using UNK"""
     tokenized_text = tokenizer.tokenize(text)
@@ -26,17 +40,10 @@ def count_unk_tokens(text: str, tokenizer: AutoTokenizer) -> int:
     return num_unk_tokens
 
 
-@log_function_time()
-def query_intent(query: str) -> tuple[SearchType, QueryFlow]:
-    tokenizer = get_default_intent_model_tokenizer()
-    intent_model = get_default_intent_model()
-    model_input = tokenizer(query, return_tensors="tf", truncation=True, padding=True)
-
-    predictions = intent_model(model_input)[0]
-    probabilities = tf.nn.softmax(predictions, axis=-1)
-    class_percentages = np.round(probabilities.numpy() * 100, 2)
-
-    keyword, semantic, qa = class_percentages.tolist()[0]
+def _intent_from_class_percentages(
+    class_percentages: list[float],
+) -> tuple[SearchType, QueryFlow]:
+    keyword, semantic, qa = class_percentages
 
     # Heavily bias towards QA, from user perspective, answering a statement is not as bad as not answering a question
     if qa > 20:
@@ -64,11 +71,169 @@ def query_intent(query: str) -> tuple[SearchType, QueryFlow]:
     return predicted_search, predicted_flow
 
 
+def submit_query_intent(query: str) -> Future:
+    """Starts classifying the query on the intent model worker, the returned future
+    resolves to the predicted search type and flow"""
+    intent_future: Future = Future()
+
+    def _resolve(class_percentages_future: Future) -> None:
+        try:
+            intent_future.set_result(
+                _intent_from_class_percentages(class_percentages_future.result())
+            )
+        except Exception as e:
+            intent_future.set_exception(e)
+
+    get_default_intent_batcher().submit(query).add_done_callback(_resolve)
+    return intent_future
+
+
+@log_function_time()
+def query_intent(query: str) -> tuple[SearchType, QueryFlow]:
+    return submit_query_intent(query).result()
+
+
+def _retrieve_documents(
+    query: str,
+    user_id: UUID | None,
+    filters: list[IndexFilter] | None,
+    datastore: DocumentIndex,
+    use_keyword: bool,
+    retrieval_metrics_callback: Callable[[RetrievalMetricsContainer], None]
+    | None = None,
+    rerank_metrics_callback: Callable[[RerankMetricsContainer], None] | None = None,
+) -> tuple[list[InferenceChunk] | None, list[InferenceChunk] | None]:
+    if use_keyword:
+        ranked_chunks = retrieve_keyword_documents(
+            query,
+            user_id,
+            filters,
+            datastore,
+            retrieval_metrics_callback=retrieval_metrics_callback,
+        )
+        return ranked_chunks, []
+
+    return retrieve_ranked_documents(
+        query,
+        user_id,
+        filters,
+        datastore,
+        retrieval_metrics_callback=retrieval_metrics_callback,
+        rerank_metrics_callback=rerank_metrics_callback,
+    )
+
+
+def retrieve_documents_with_intent(
+    query: str,
+    user_id: UUID | None,
+    filters: list[IndexFilter] | None,
+    datastore: DocumentIndex,
+    use_keyword: bool | None,
+    skip_unused_intent: bool = False,
+    retrieval_metrics_callback: Callable[[RetrievalMetricsContainer], None]
+    | None = None,
+    rerank_metrics_callback: Callable[[RerankMetricsContainer], None] | None = None,
+) -> tuple[
+    list[InferenceChunk] | None, list[InferenceChunk] | None, SearchType, QueryFlow
+]:
+    """Retrieves the documents and predicts the search type and flow with the intent
+    model, which runs on its own worker. Returns the ranked and unranked chunks along
+    with the predicted search type and flow.
+
+    - If the user picked a search type, it is retrieved right away while the model runs.
+      The prediction then only labels the flow, so callers that override the flow anyway
+      can pass `skip_unused_intent` to not run the model at all.
+    - If the user did not pick one, the predicted search type is retrieved once the
+      model is done.
+    - With ENABLE_SPECULATIVE_RETRIEVAL, both the keyword and the semantic retrieval run
+      while the model classifies the query instead. Only the predicted one is reranked
+      and reported to the metrics callbacks, the other one is dropped.
+    """
+    intent_future: Future | None = None
+    if use_keyword is None or not skip_unused_intent:
+        intent_future = submit_query_intent(query)
+
+    ranked_chunks: list[InferenceChunk] | None
+    unranked_chunks: list[InferenceChunk] | None
+    if use_keyword is not None:
+        ranked_chunks, unranked_chunks = _retrieve_documents(
+            query,
+            user_id,
+            filters,
+            datastore,
+            use_keyword,
+            retrieval_metrics_callback=retrieval_metrics_callback,
+            rerank_metrics_callback=rerank_metrics_callback,
+        )
+
+        if intent_future is None:
+            predicted_search = (
+                SearchType.KEYWORD if use_keyword else SearchType.SEMANTIC
+            )
+            return ranked_chunks, unranked_chunks, predicted_search, QueryFlow.SEARCH
+
+        predicted_search, predicted_flow = intent_future.result()
+        return ranked_chunks, unranked_chunks, predicted_search, predicted_flow
+
+    assert intent_future is not None
+    if not ENABLE_SPECULATIVE_RETRIEVAL:
+        predicted_search, predicted_flow = intent_future.result()
+        ranked_chunks, unranked_chunks = _retrieve_documents(
+            query,
+            user_id,
+            filters,
+            datastore,
+            predicted_search == SearchType.KEYWORD,
+            retrieval_metrics_callback=retrieval_metrics_callback,
+            rerank_metrics_callback=rerank_metrics_callback,
+        )
+        return ranked_chunks, unranked_chunks, predicted_search, predicted_flow
+
+    # The keyword retrieval metrics are held back until the prediction picks a branch
+    keyword_retrieval_metrics: list[RetrievalMetricsContainer] = []
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        keyword_future = executor.submit(
+            retrieve_keyword_documents,
+            query,
+            user_id,
+            filters,
+            datastore,
+            retrieval_metrics_callback=keyword_retrieval_metrics.append,
+        )
+        semantic_future = executor.submit(
+            datastore.semantic_retrieval, query, user_id, filters, NUM_RETURNED_HITS
+        )
+        predicted_search, predicted_flow = intent_future.result()
+
+        if predicted_search == SearchType.KEYWORD:
+            ranked_chunks, unranked_chunks = keyword_future.result(), []
+            if retrieval_metrics_callback is not None:
+                for retrieval_metrics in keyword_retrieval_metrics:
+                    retrieval_metrics_callback(retrieval_metrics)
+        else:
+            ranked_chunks, unranked_chunks = rank_retrieved_documents(
+                query,
+                semantic_future.result(),
+                filters,
+                retrieval_metrics_callback=retrieval_metrics_callback,
+                rerank_metrics_callback=rerank_metrics_callback,
+            )
+    finally:
+        # don't hold up the response on the retrieval that was not picked
+        executor.shutdown(wait=False)
+
+    return ranked_chunks, unranked_chunks, predicted_search, predicted_flow
+
+
 def recommend_search_flow(
     query: str,
     keyword: bool,
     max_percent_stopwords: float = 0.30,  # ~Every third word max, ie "effects of caffeine" still viable keyword search
 ) -> HelperResponse:
+    # the heuristics below run while the intent model classifies the query
+    intent_future = submit_query_intent(query)
+
     heuristic_search_type: SearchType | None = None
     message: str | None = None
 
@@ -90,7 +255,7 @@ def recommend_search_flow(
             message = "Stopwords in query"
 
     # Model based decisions
-    model_search_type, flow = query_intent(query)
+    model_search_type, flow = intent_future.result()
     if not message:
         if model_search_type == SearchType.SEMANTIC and keyword:
             message = "Intent model classified Semantic Search"
@@ -0,0 +1,283 @@
+import abc
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy
+
+from danswer.configs.model_configs import EMBEDDING_CACHE_MAX_ENTRIES
+from danswer.configs.model_configs import EMBEDDING_CACHE_PATH
+from danswer.configs.model_configs import QUERY_EMBEDDING_CACHE_SHARED_PATH
+from danswer.configs.model_configs import QUERY_EMBEDDING_CACHE_SIZE
+from danswer.configs.model_configs import QUERY_EMBEDDING_CACHE_TTL
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+# When the cache grows past its max size, evict down to this fraction of it so that
+# eviction isn't triggered again by the very next insert
+_EVICTION_TARGET_RATIO = 0.9
+# Seconds to wait on the database lock, the cache file may be shared by several
+# indexing processes
+_SQLITE_TIMEOUT = 30
+# How many query embedding lookups between logging of the query cache stats
+_QUERY_CACHE_STATS_LOG_INTERVAL = 100
+
+
+def normalize_embedding_text(text: str) -> str:
+    """Whitespace does not change the tokens the encoder sees, so texts differing only
+    in whitespace share a cache entry"""
+    return " ".join(text.split())
+
+
+def build_embedding_cache_key(
+    text: str,
+    model_name: str,
+    model_backend: str,
+    prefix: str,
+    normalize_embeddings: bool,
+) -> str:
+    key_str = "\0".join(
+        [
+            model_name,
+            model_backend,
+            prefix,
+            str(normalize_embeddings),
+            normalize_embedding_text(text),
+        ]
+    )
+    return hashlib.sha256(key_str.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache(abc.ABC):
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    @abc.abstractmethod
+    def get_many(self, keys: list[str]) -> dict[str, numpy.ndarray]:
+        """Returns the cached embedding for each of the keys that is present"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def put_many(self, embeddings: dict[str, numpy.ndarray]) -> None:
+        raise NotImplementedError
+
+    def record_lookup(self, num_hits: int, num_misses: int) -> None:
+        self.hits += num_hits
+        self.misses += num_misses
+
+
+class SQLiteEmbeddingCache(EmbeddingCache):
+    """Embeddings stored on local disk as float32 blobs. Size is bounded by evicting the
+    least recently used entries once `max_entries` is exceeded"""
+
+    def __init__(self, db_path: str, max_entries: int) -> None:
+        super().__init__()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(
+            db_path, timeout=_SQLITE_TIMEOUT, check_same_thread=False
+        )
+        with self._conn:
+            # WAL allows readers to continue while another process is writing
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embedding_cache_last_used "
+                "ON embedding_cache (last_used)"
+            )
+
+    def get_many(self, keys: list[str]) -> dict[str, numpy.ndarray]:
+        if not keys:
+            return {}
+
+        unique_keys = list(set(keys))
+        found: dict[str, numpy.ndarray] = {}
+        with self._lock, self._conn:
+            # Stay under SQLite's limit on the number of bound parameters
+            for ind in range(0, len(unique_keys), 500):
+                key_batch = unique_keys[ind : ind + 500]
+                rows = self._conn.execute(
+                    "SELECT key, embedding FROM embedding_cache "
+                    f"WHERE key IN ({','.join('?' * len(key_batch))})",
+                    key_batch,
+                ).fetchall()
+                for key, embedding in rows:
+                    found[key] = numpy.frombuffer(embedding, dtype=numpy.float32)
+
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embedding_cache SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+
+        return found
+
+    def put_many(self, embeddings: dict[str, numpy.ndarray]) -> None:
+        if not embeddings:
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, embedding, last_used) "
+                "VALUES (?, ?, ?)",
+                [
+                    (key, numpy.asarray(embedding, dtype=numpy.float32).tobytes(), now)
+                    for key, embedding in embeddings.items()
+                ],
+            )
+
+            num_entries = self._conn.execute(
+                "SELECT COUNT(*) FROM embedding_cache"
+            ).fetchone()[0]
+            if num_entries > self.max_entries:
+                num_to_evict = num_entries - int(
+                    self.max_entries * _EVICTION_TARGET_RATIO
+                )
+                self._conn.execute(
+                    "DELETE FROM embedding_cache WHERE key IN ("
+                    "SELECT key FROM embedding_cache ORDER BY last_used LIMIT ?)",
+                    (num_to_evict,),
+                )
+                logger.info(f"Evicted {num_to_evict} entries from the embedding cache")
+
+
+_EMBEDDING_CACHE: EmbeddingCache | None = None
+
+
+def get_default_embedding_cache() -> EmbeddingCache | None:
+    """Returns None if no embedding cache is configured"""
+    global _EMBEDDING_CACHE
+    if _EMBEDDING_CACHE is None and EMBEDDING_CACHE_PATH:
+        _EMBEDDING_CACHE = SQLiteEmbeddingCache(
+            db_path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+        )
+    return _EMBEDDING_CACHE
+
+
+class QueryEmbeddingCache:
+    """Bounded in-process LRU of query embeddings, entries expire `ttl_seconds` after
+    being stored. Local misses fall through to the optional `shared_cache` so that the
+    API workers of a host can share their hits"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        shared_cache: EmbeddingCache | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared_cache = shared_cache
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.total_encode_time = 0.0
+        self._entries: OrderedDict[str, tuple[float, numpy.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> numpy.ndarray | None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expiry, embedding = entry
+                if expiry > now:
+                    self._entries.move_to_end(key)
+                    self._record_lookup(hit=True, shared=False)
+                    return embedding
+                del self._entries[key]
+
+        if self.shared_cache is not None:
+            shared_embedding = self.shared_cache.get_many([key]).get(key)
+            if shared_embedding is not None:
+                self._put_local(key, shared_embedding)
+                with self._lock:
+                    self._record_lookup(hit=True, shared=True)
+                return shared_embedding
+
+        with self._lock:
+            self._record_lookup(hit=False, shared=False)
+        return None
+
+    def put(self, key: str, embedding: numpy.ndarray, encode_time: float) -> None:
+        """`encode_time` is what the miss cost, used to estimate the time saved by hits"""
+        self._put_local(key, embedding)
+        if self.shared_cache is not None:
+            self.shared_cache.put_many({key: embedding})
+
+        with self._lock:
+            self.total_encode_time += encode_time
+
+    def _record_lookup(self, hit: bool, shared: bool) -> None:
+        """Must be called while holding the lock"""
+        if hit:
+            self.hits += 1
+            self.shared_hits += int(shared)
+        else:
+            self.misses += 1
+        if (self.hits + self.misses) % _QUERY_CACHE_STATS_LOG_INTERVAL == 0:
+            self._log_stats()
+
+    def _put_local(self, key: str, embedding: numpy.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> dict[str, float]:
+        with self._lock:
+            return self._get_stats()
+
+    def _get_stats(self) -> dict[str, float]:
+        num_lookups = self.hits + self.misses
+        avg_encode_time = self.total_encode_time / max(self.misses, 1)
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / max(num_lookups, 1),
+            "saved_encode_seconds": self.hits * avg_encode_time,
+        }
+
+    def _log_stats(self) -> None:
+        stats = self._get_stats()
+        logger.info(
+            f"Query embedding cache: {stats['hit_rate']:.1%} hit rate "
+            f"({stats['hits']} hits, {stats['shared_hits']} of them shared, "
+            f"{stats['misses']} misses), "
+            f"~{stats['saved_encode_seconds']:.2f} seconds of encoding saved"
+        )
+
+
+_QUERY_EMBEDDING_CACHE: QueryEmbeddingCache | None = None
+
+
+def get_default_query_embedding_cache() -> QueryEmbeddingCache | None:
+    """Returns None if the query embedding cache is disabled"""
+    global _QUERY_EMBEDDING_CACHE
+    if _QUERY_EMBEDDING_CACHE is None and QUERY_EMBEDDING_CACHE_SIZE > 0:
+        _QUERY_EMBEDDING_CACHE = QueryEmbeddingCache(
+            max_entries=QUERY_EMBEDDING_CACHE_SIZE,
+            ttl_seconds=QUERY_EMBEDDING_CACHE_TTL,
+            shared_cache=SQLiteEmbeddingCache(
+                db_path=QUERY_EMBEDDING_CACHE_SHARED_PATH,
+                max_entries=QUERY_EMBEDDING_CACHE_SIZE,
+            )
+            if QUERY_EMBEDDING_CACHE_SHARED_PATH
+            else None,
+        )
+    return _QUERY_EMBEDDING_CACHE
@@ -0,0 +1,135 @@
+import secrets
+import threading
+from dataclasses import dataclass
+from multiprocessing.managers import BaseManager
+from typing import Any
+
+import numpy
+
+from danswer.chunking.models import DocAwareChunk
+from danswer.chunking.models import IndexChunk
+from danswer.configs.app_configs import EMBEDDING_SERVICE_CONCURRENCY
+from danswer.configs.model_configs import NORMALIZE_EMBEDDINGS
+from danswer.search.models import Embedder
+from danswer.search.search_utils import get_default_embedding_model
+from danswer.search.semantic_search import encode_chunks
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+@dataclass(frozen=True)
+class EmbeddingServiceConnectionInfo:
+    address: tuple[str, int]
+    authkey: bytes
+
+
+class _EmbeddingService:
+    """Lives in the embedding service process and holds the only copy of the embedding
+    model. Requests from all indexing workers are served from here, at most
+    `concurrency` of them encoding at the same time while the rest wait their turn"""
+
+    def __init__(self, concurrency: int) -> None:
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self._stats_lock = threading.Lock()
+        self._queue_depth = 0
+        self._num_requests = 0
+        self._num_texts = 0
+
+    def encode(self, texts: list[str], normalize_embeddings: bool) -> numpy.ndarray:
+        with self._stats_lock:
+            self._queue_depth += 1
+        with self._semaphore:
+            with self._stats_lock:
+                self._queue_depth -= 1
+                self._num_requests += 1
+                self._num_texts += len(texts)
+            return get_default_embedding_model().encode(
+                texts, normalize_embeddings=normalize_embeddings
+            )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return get_default_embedding_model().get_sentence_embedding_dimension()
+
+    def get_stats(self) -> dict[str, int]:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue_depth,
+                "num_requests": self._num_requests,
+                "num_texts": self._num_texts,
+            }
+
+
+_EMBEDDING_SERVICE: _EmbeddingService | None = None
+
+
+def _get_embedding_service() -> _EmbeddingService:
+    global _EMBEDDING_SERVICE
+    if _EMBEDDING_SERVICE is None:
+        _EMBEDDING_SERVICE = _EmbeddingService(
+            concurrency=EMBEDDING_SERVICE_CONCURRENCY
+        )
+    return _EMBEDDING_SERVICE
+
+
+class _EmbeddingServiceManager(BaseManager):
+    pass
+
+
+_EmbeddingServiceManager.register(
+    "get_embedding_service", callable=_get_embedding_service
+)
+
+
+def start_embedding_service() -> tuple[BaseManager, EmbeddingServiceConnectionInfo]:
+    """Spawns the embedding service process on a free local port. The returned manager
+    must be kept alive for as long as the service is needed"""
+    authkey = secrets.token_bytes(32)
+    manager = _EmbeddingServiceManager(address=("localhost", 0), authkey=authkey)
+    manager.start()
+
+    # load the model up front so that the first indexing batch doesn't wait on it
+    manager.get_embedding_service().encode(  # type: ignore
+        ["Danswer is amazing"], NORMALIZE_EMBEDDINGS
+    )
+
+    connection_info = EmbeddingServiceConnectionInfo(
+        address=manager.address, authkey=authkey  # type: ignore
+    )
+    logger.info(f"Started shared embedding service at {connection_info.address}")
+    return manager, connection_info
+
+
+def get_embedding_service_stats(manager: BaseManager) -> dict[str, int]:
+    return manager.get_embedding_service().get_stats()  # type: ignore
+
+
+class EmbeddingServiceClient:
+    """Stands in for the SentenceTransformer in `encode_chunks`, forwarding the batches
+    to the shared embedding service"""
+
+    def __init__(self, connection_info: EmbeddingServiceConnectionInfo) -> None:
+        manager = _EmbeddingServiceManager(
+            address=connection_info.address, authkey=connection_info.authkey
+        )
+        manager.connect()
+        self._service: Any = manager.get_embedding_service()  # type: ignore
+
+    def encode(
+        self, sentences: list[str], normalize_embeddings: bool = False
+    ) -> numpy.ndarray:
+        return self._service.encode(sentences, normalize_embeddings)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._service.get_sentence_embedding_dimension()
+
+    def get_stats(self) -> dict[str, int]:
+        return self._service.get_stats()
+
+
+class SharedServiceEmbedder(Embedder):
+    def __init__(self, connection_info: EmbeddingServiceConnectionInfo) -> None:
+        self.embedding_model = EmbeddingServiceClient(connection_info)
+
+    def embed(self, chunks: list[DocAwareChunk]) -> list[IndexChunk]:
+        return encode_chunks(chunks, embedding_model=self.embedding_model)
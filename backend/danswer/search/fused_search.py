@@ -0,0 +1,142 @@
+import time
+from collections.abc import Callable
+from typing import Any
+from uuid import UUID
+
+from danswer.chunking.models import InferenceChunk
+from danswer.configs.app_configs import FUSED_RETRIEVAL_RRF_K
+from danswer.configs.app_configs import NUM_RERANKED_RESULTS
+from danswer.configs.app_configs import NUM_RETURNED_HITS
+from danswer.configs.model_configs import SKIP_RERANKING
+from danswer.datastores.interfaces import DocumentIndex
+from danswer.datastores.interfaces import IndexFilter
+from danswer.search.keyword_search import query_processing
+from danswer.search.models import RerankMetricsContainer
+from danswer.search.models import RetrievalTimingsContainer
+from danswer.search.semantic_search import apply_boost
+from danswer.search.semantic_search import semantic_reranking
+from danswer.utils.logger import setup_logger
+from danswer.utils.threadpool_concurrency import run_functions_in_parallel
+from danswer.utils.timing import log_function_time
+
+logger = setup_logger()
+
+
+def _timed_retrieval(
+    retrieval_name: str, retrieval_func: Callable[..., list[InferenceChunk]], *args: Any
+) -> tuple[list[InferenceChunk], float]:
+    """A failing branch should not fail the whole search, the other branch's results
+    are still usable"""
+    start = time.time()
+    try:
+        chunks = retrieval_func(*args)
+    except Exception:
+        logger.exception(f"{retrieval_name} retrieval failed, continuing without it")
+        chunks = []
+    return chunks, time.time() - start
+
+
+def _keyword_retrieval(
+    query: str,
+    user_id: UUID | None,
+    filters: list[IndexFilter] | None,
+    datastore: DocumentIndex,
+    num_hits: int,
+) -> list[InferenceChunk]:
+    edited_query = query_processing(query)
+    if not edited_query.strip():
+        # Query only consisted of stopwords, only the semantic results are meaningful
+        return []
+    return datastore.keyword_retrieval(edited_query, user_id, filters, num_hits)
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: list[list[InferenceChunk]], rrf_k: int = FUSED_RETRIEVAL_RRF_K
+) -> list[InferenceChunk]:
+    """Merges the rankings, each chunk scores the sum of 1 / (rrf_k + rank) over the
+    lists it appears in. The scores of the retrievers are not comparable with each
+    other so only the ranks are used"""
+    fused_scores: dict[tuple[str, int], float] = {}
+    chunks_by_key: dict[tuple[str, int], InferenceChunk] = {}
+    for ranked_chunks in ranked_lists:
+        for rank, chunk in enumerate(ranked_chunks, start=1):
+            key = (chunk.document_id, chunk.chunk_id)
+            chunks_by_key.setdefault(key, chunk)
+            fused_scores[key] = fused_scores.get(key, 0.0) + 1 / (rrf_k + rank)
+
+    fused_keys = sorted(fused_scores, key=lambda key: fused_scores[key], reverse=True)
+    for key in fused_keys:
+        chunks_by_key[key].score = fused_scores[key]
+    return [chunks_by_key[key] for key in fused_keys]
+
+
+@log_function_time()
+def retrieve_fused_documents(
+    query: str,
+    user_id: UUID | None,
+    filters: list[IndexFilter] | None,
+    datastore: DocumentIndex,
+    num_hits: int = NUM_RETURNED_HITS,
+    num_rerank: int = NUM_RERANKED_RESULTS,
+    skip_rerank: bool = SKIP_RERANKING,
+    rerank_metrics_callback: Callable[[RerankMetricsContainer], None] | None = None,
+    retrieval_timings_callback: Callable[[RetrievalTimingsContainer], None]
+    | None = None,
+) -> tuple[list[InferenceChunk] | None, list[InferenceChunk] | None]:
+    """Runs keyword and semantic retrieval concurrently, fuses the two rankings and
+    reranks the top num_rerank of the fused results"""
+    keyword_args = (
+        "Keyword",
+        _keyword_retrieval,
+        query,
+        user_id,
+        filters,
+        datastore,
+        num_hits,
+    )
+    semantic_args = (
+        "Semantic",
+        datastore.semantic_retrieval,
+        query,
+        user_id,
+        filters,
+        num_hits,
+    )
+    keyword_result, semantic_result = run_functions_in_parallel(
+        [(_timed_retrieval, keyword_args), (_timed_retrieval, semantic_args)]
+    )
+    keyword_chunks, keyword_time = keyword_result
+    semantic_chunks, semantic_time = semantic_result
+
+    fusion_start = time.time()
+    top_chunks = reciprocal_rank_fusion([semantic_chunks, keyword_chunks])[:num_hits]
+    fusion_time = time.time() - fusion_start
+    if not top_chunks:
+        logger.warning("Fused retrieval returned no results")
+        return None, None
+
+    rerank_start = time.time()
+    if skip_rerank:
+        ranked_chunks = apply_boost(top_chunks[:num_rerank])
+    else:
+        ranked_chunks = semantic_reranking(
+            query,
+            top_chunks[:num_rerank],
+            rerank_metrics_callback=rerank_metrics_callback,
+        )
+    rerank_time = time.time() - rerank_start
+
+    timings = RetrievalTimingsContainer(
+        keyword_retrieval_seconds=keyword_time,
+        semantic_retrieval_seconds=semantic_time,
+        fusion_seconds=fusion_time,
+        rerank_seconds=rerank_time,
+    )
+    logger.info(
+        f"Fused retrieval of {len(keyword_chunks)} keyword and {len(semantic_chunks)} "
+        f"semantic hits, timings: {timings}"
+    )
+    if retrieval_timings_callback is not None:
+        retrieval_timings_callback(timings)
+
+    return ranked_chunks, top_chunks[num_rerank:]
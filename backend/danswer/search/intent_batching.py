@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from dataclasses import field
+
+import numpy
+
+from danswer.configs.model_configs import INTENT_BATCH_MAX_SIZE
+from danswer.configs.model_configs import INTENT_BATCH_MAX_WAIT_MS
+from danswer.search.search_utils import get_default_intent_model
+from danswer.search.search_utils import get_default_intent_model_tokenizer
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+@dataclass
+class _IntentRequest:
+    query: str
+    enqueue_time: float
+    # Resolves to the keyword / semantic / QA class percentages of the query
+    future: Future = field(default_factory=Future)
+
+
+class IntentModelBatcher:
+    """Runs the intent model on a single worker thread. Queries submitted while a forward
+    pass is running are classified together in the next one, and each query waits at
+    most `max_wait_ms` for others to join its batch. Callers get a future so they can
+    go on with retrieval while the model runs"""
+
+    def __init__(self, max_wait_ms: float, max_batch_size: int) -> None:
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.num_batches = 0
+        self.num_queries = 0
+        self._queue: queue.Queue[_IntentRequest] = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str) -> Future:
+        request = _IntentRequest(query=query, enqueue_time=time.time())
+        self._queue.put(request)
+        return request.future
+
+    def _collect_batch(self) -> list[_IntentRequest]:
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueue_time + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # queries that queued up during the previous forward pass are always taken
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            batch.append(request)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect_batch()
+            try:
+                tokenizer = get_default_intent_model_tokenizer()
+                intent_model = get_default_intent_model()
+                model_input = tokenizer(
+                    [request.query for request in batch],
+                    # numpy inputs work for both the tensorflow and onnx models
+                    return_tensors="np",
+                    truncation=True,
+                    padding=True,
+                )
+                logits = numpy.asarray(intent_model(model_input)[0])
+                exp_logits = numpy.exp(logits - logits.max(axis=-1, keepdims=True))
+                probabilities = exp_logits / exp_logits.sum(axis=-1, keepdims=True)
+                class_percentages = numpy.round(probabilities * 100, 2).tolist()
+            except Exception as e:
+                logger.exception("Failed to run the intent model")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            for request, percentages in zip(batch, class_percentages):
+                request.future.set_result(percentages)
+
+            self.num_batches += 1
+            self.num_queries += len(batch)
+            logger.debug(
+                f"Classified the intent of {len(batch)} queries, "
+                f"avg batch size {self.num_queries / self.num_batches:.2f}"
+            )
+
+
+_INTENT_BATCHER: IntentModelBatcher | None = None
+_INTENT_BATCHER_LOCK = threading.Lock()
+
+
+def get_default_intent_batcher() -> IntentModelBatcher:
+    global _INTENT_BATCHER
+    # the API server calls this from many threads, only ever start one worker
+    with _INTENT_BATCHER_LOCK:
+        if _INTENT_BATCHER is None:
+            _INTENT_BATCHER = IntentModelBatcher(
+                max_wait_ms=INTENT_BATCH_MAX_WAIT_MS,
+                max_batch_size=INTENT_BATCH_MAX_SIZE,
+            )
+    return _INTENT_BATCHER
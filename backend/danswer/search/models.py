@@ -43,3 +43,12 @@ class RerankMetricsContainer(BaseModel):
 
     metrics: list[ChunkMetric]
     raw_similarity_scores: list[float]
+
+
+class RetrievalTimingsContainer(BaseModel):
+    """Time spent in each branch of a fused retrieval, the branches run concurrently"""
+
+    keyword_retrieval_seconds: float
+    semantic_retrieval_seconds: float
+    fusion_seconds: float
+    rerank_seconds: float
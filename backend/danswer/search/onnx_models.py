@@ -0,0 +1,288 @@
+"""
+ONNX Runtime versions of the embedding, cross-encoder and intent models.
+
+Each model is exported from its Hugging Face checkpoint the first time it is needed
+(with int8 dynamic quantization unless ONNX_QUANTIZE is turned off) and cached under
+ONNX_MODEL_DIR. Serving only needs onnxruntime and the tokenizers, torch / tensorflow
+are only imported to export.
+"""
+import json
+import os
+from collections.abc import Sequence
+from typing import Any
+
+import numpy
+from filelock import FileLock
+
+from danswer.configs.model_configs import ONNX_MODEL_DIR
+from danswer.configs.model_configs import ONNX_QUANTIZE
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+_ONNX_MODEL_FILE = "model.onnx"
+_METADATA_FILE = "danswer_onnx.json"
+_OPSET_VERSION = 14
+
+
+def _get_onnx_model_dir(model_name: str, quantize: bool) -> str:
+    dir_name = model_name.replace("/", "__") + ("-int8" if quantize else "")
+    return os.path.join(ONNX_MODEL_DIR, dir_name)
+
+
+def _export_to_onnx(
+    hf_model: Any,
+    tokenizer: Any,
+    model_dir: str,
+    metadata: dict[str, Any],
+    quantize: bool,
+) -> None:
+    import torch  # type: ignore
+    from onnxruntime.quantization import quantize_dynamic  # type: ignore
+    from onnxruntime.quantization import QuantType  # type: ignore
+
+    os.makedirs(model_dir, exist_ok=True)
+    dummy_input = tokenizer(
+        ["Danswer is amazing"], ["Danswer is amazing"], return_tensors="pt"
+    )
+    input_names = list(dummy_input.keys())
+
+    class _TupleOutputModel(torch.nn.Module):
+        """Named inputs in, first output (hidden states or logits) out, which is all
+        the ONNX graph needs to hold"""
+
+        def __init__(self) -> None:
+            super().__init__()
+            self.model = hf_model
+
+        def forward(self, *inputs: Any) -> Any:
+            return self.model(**dict(zip(input_names, inputs)), return_dict=False)[0]
+
+    hf_model.eval()
+    fp32_path = os.path.join(model_dir, "model-fp32.onnx")
+    model_path = os.path.join(model_dir, _ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            _TupleOutputModel(),
+            tuple(dummy_input[name] for name in input_names),
+            fp32_path if quantize else model_path,
+            input_names=input_names,
+            output_names=["output"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in input_names},
+                "output": {0: "batch"},
+            },
+            opset_version=_OPSET_VERSION,
+        )
+
+    if quantize:
+        quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+
+    tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, _METADATA_FILE), "w") as f:
+        json.dump(metadata, f)
+
+
+def _export_embedding_model(model_name: str, model_dir: str, quantize: bool) -> None:
+    from sentence_transformers import SentenceTransformer  # type: ignore
+    from sentence_transformers.models import Normalize  # type: ignore
+
+    model = SentenceTransformer(model_name)
+    metadata = {
+        "pooling": model[1].get_pooling_mode_str(),
+        "normalize": any(isinstance(module, Normalize) for module in model),
+        "dimension": model.get_sentence_embedding_dimension(),
+    }
+    _export_to_onnx(
+        model[0].auto_model, model[0].tokenizer, model_dir, metadata, quantize
+    )
+
+
+def _export_cross_encoder(model_name: str, model_dir: str, quantize: bool) -> None:
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(model_name)
+    metadata = {
+        "sigmoid": not isinstance(model.default_activation_function, torch.nn.Identity)
+    }
+    _export_to_onnx(model.model, model.tokenizer, model_dir, metadata, quantize)
+
+
+def _export_intent_model(model_name: str, model_dir: str, quantize: bool) -> None:
+    from transformers import AutoModelForSequenceClassification  # type: ignore
+    from transformers import AutoTokenizer  # type: ignore
+
+    # the intent model is published as tensorflow weights, load them into pytorch
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, from_tf=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    _export_to_onnx(model, tokenizer, model_dir, {}, quantize)
+
+
+class _OnnxModel:
+    def __init__(self, model_dir: str) -> None:
+        import onnxruntime  # type: ignore
+        from transformers import AutoTokenizer
+
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, _ONNX_MODEL_FILE),
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = [
+            model_input.name for model_input in self.session.get_inputs()
+        ]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, _METADATA_FILE)) as f:
+            self.metadata = json.load(f)
+
+    def _run(self, encoded_input: Any) -> numpy.ndarray:
+        return self.session.run(
+            None,
+            {
+                name: numpy.asarray(encoded_input[name], dtype=numpy.int64)
+                for name in self.input_names
+            },
+        )[0]
+
+
+class OnnxEmbeddingModel(_OnnxModel):
+    """Stands in for the SentenceTransformer, same `encode` semantics"""
+
+    def __init__(self, model_dir: str, max_seq_length: int) -> None:
+        super().__init__(model_dir)
+        self.max_seq_length = max_seq_length
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.metadata["dimension"]
+
+    def _pool(
+        self, token_embeddings: numpy.ndarray, attention_mask: numpy.ndarray
+    ) -> numpy.ndarray:
+        pooling = self.metadata["pooling"]
+        if pooling == "cls":
+            return token_embeddings[:, 0]
+
+        mask = attention_mask[..., None].astype(numpy.float32)
+        if pooling == "max":
+            return numpy.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+        if pooling == "mean":
+            return (token_embeddings * mask).sum(axis=1) / numpy.clip(
+                mask.sum(axis=1), 1e-9, None
+            )
+        raise ValueError(f"Unsupported pooling mode for ONNX models: {pooling}")
+
+    def encode(
+        self,
+        sentences: str | list[str],
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        **kwargs: Any,
+    ) -> numpy.ndarray:
+        is_single_sentence = isinstance(sentences, str)
+        texts = [sentences] if isinstance(sentences, str) else sentences
+
+        embeddings = numpy.empty(
+            (len(texts), self.get_sentence_embedding_dimension()), dtype=numpy.float32
+        )
+        # longest first so that each batch is padded to similar lengths
+        order = numpy.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            batch_inds = order[start : start + batch_size]
+            encoded_input = self.tokenizer(
+                [texts[ind] for ind in batch_inds],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            embeddings[batch_inds] = self._pool(
+                self._run(encoded_input), encoded_input["attention_mask"]
+            )
+
+        if normalize_embeddings or self.metadata["normalize"]:
+            embeddings /= numpy.clip(
+                numpy.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None
+            )
+
+        return embeddings[0] if is_single_sentence else embeddings
+
+
+class OnnxCrossEncoder(_OnnxModel):
+    """Stands in for the CrossEncoder, same `predict` semantics"""
+
+    def __init__(self, model_dir: str, max_length: int) -> None:
+        super().__init__(model_dir)
+        self.max_length = max_length
+
+    def predict(
+        self,
+        sentences: tuple[str, str] | Sequence[tuple[str, str]],
+        batch_size: int = 32,
+        **kwargs: Any,
+    ) -> numpy.ndarray | float:
+        is_single_pair = isinstance(sentences, tuple) and isinstance(sentences[0], str)
+        pairs = [sentences] if is_single_pair else list(sentences)
+
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            pair_batch = pairs[start : start + batch_size]
+            encoded_input = self.tokenizer(
+                [pair[0] for pair in pair_batch],
+                [pair[1] for pair in pair_batch],
+                padding=True,
+                truncation="longest_first",
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            scores.append(self._run(encoded_input)[:, 0])
+
+        all_scores = numpy.concatenate(scores) if scores else numpy.empty(0)
+        if self.metadata["sigmoid"]:
+            all_scores = 1 / (1 + numpy.exp(-all_scores))
+        return all_scores[0] if is_single_pair else all_scores
+
+
+class OnnxIntentModel(_OnnxModel):
+    """Stands in for the TFDistilBertForSequenceClassification, called on the tokenized
+    input and returns the logits as the first output"""
+
+    def __call__(self, model_input: Any) -> tuple[numpy.ndarray]:
+        return (self._run(model_input),)
+
+
+def _ensure_onnx_model_exported(
+    model_name: str, export_func: Any, quantize: bool = ONNX_QUANTIZE
+) -> str:
+    """Exports the model if it isn't cached yet and returns its directory. The lock
+    keeps the API server and background processes from exporting at the same time"""
+    model_dir = _get_onnx_model_dir(model_name, quantize)
+    os.makedirs(ONNX_MODEL_DIR, exist_ok=True)
+    with FileLock(model_dir + ".lock"):
+        if not os.path.exists(os.path.join(model_dir, _METADATA_FILE)):
+            logger.info(f"Exporting {model_name} to ONNX (quantized: {quantize})")
+            export_func(model_name, model_dir, quantize)
+    return model_dir
+
+
+def load_onnx_embedding_model(
+    model_name: str, max_seq_length: int, quantize: bool = ONNX_QUANTIZE
+) -> OnnxEmbeddingModel:
+    model_dir = _ensure_onnx_model_exported(
+        model_name, _export_embedding_model, quantize
+    )
+    return OnnxEmbeddingModel(model_dir, max_seq_length=max_seq_length)
+
+
+def load_onnx_cross_encoder(
+    model_name: str, max_length: int, quantize: bool = ONNX_QUANTIZE
+) -> OnnxCrossEncoder:
+    model_dir = _ensure_onnx_model_exported(model_name, _export_cross_encoder, quantize)
+    return OnnxCrossEncoder(model_dir, max_length=max_length)
+
+
+def load_onnx_intent_model(
+    model_name: str, quantize: bool = ONNX_QUANTIZE
+) -> OnnxIntentModel:
+    model_dir = _ensure_onnx_model_exported(model_name, _export_intent_model, quantize)
+    return OnnxIntentModel(model_dir)
@@ -0,0 +1,170 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from dataclasses import field
+
+import numpy
+
+from danswer.configs.model_configs import RERANK_BATCH_MAX_PAIRS
+from danswer.configs.model_configs import RERANK_BATCH_MAX_WAIT_MS
+from danswer.search.search_utils import get_default_reranking_model_ensemble
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+# How many coalesced batches between logging of the batching stats
+_STATS_LOG_INTERVAL = 100
+
+
+@dataclass
+class _RerankRequest:
+    pairs: list[tuple[str, str]]
+    # Indices into the cross-encoder ensemble of the models to score the pairs with
+    model_indices: list[int]
+    enqueue_time: float
+    done: threading.Event = field(default_factory=threading.Event)
+    # Scores of the pairs keyed by the index of the model that produced them
+    scores: dict[int, numpy.ndarray] = field(default_factory=dict)
+    error: Exception | None = None
+
+
+@dataclass
+class RerankBatchingStats:
+    num_batches: int = 0
+    num_requests: int = 0
+    num_pairs: int = 0
+    max_batch_pairs: int = 0
+    total_queue_wait: float = 0.0
+    max_queue_wait: float = 0.0
+
+    def record(self, batch: list[_RerankRequest], batch_start: float) -> None:
+        self.num_batches += 1
+        self.num_requests += len(batch)
+        batch_pairs = sum(len(request.pairs) for request in batch)
+        self.num_pairs += batch_pairs
+        self.max_batch_pairs = max(self.max_batch_pairs, batch_pairs)
+        for request in batch:
+            queue_wait = batch_start - request.enqueue_time
+            self.total_queue_wait += queue_wait
+            self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+
+    def log(self) -> None:
+        avg_batch_pairs = self.num_pairs / max(self.num_batches, 1)
+        avg_queue_wait_ms = 1000 * self.total_queue_wait / max(self.num_requests, 1)
+        logger.info(
+            f"Rerank batching: {self.num_batches} batches for {self.num_requests} "
+            f"requests, avg batch {avg_batch_pairs:.1f} pairs "
+            f"(max {self.max_batch_pairs}), avg queue wait {avg_queue_wait_ms:.1f}ms "
+            f"(max {1000 * self.max_queue_wait:.1f}ms)"
+        )
+
+
+class CrossEncoderBatcher:
+    """Coalesces the (query, passage) pairs of concurrent rerank requests into a single
+    forward pass per model of the cross-encoder ensemble. A request waits at most
+    `max_wait_ms` for other requests to join its batch, unless the batch already
+    holds `max_batch_pairs` pairs"""
+
+    def __init__(self, max_wait_ms: float, max_batch_pairs: int) -> None:
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_pairs = max_batch_pairs
+        self.stats = RerankBatchingStats()
+        self._queue: queue.Queue[_RerankRequest] = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def predict(
+        self, pairs: list[tuple[str, str]], model_indices: list[int]
+    ) -> list[numpy.ndarray]:
+        """Returns the scores of the pairs from each of the requested models of the
+        ensemble"""
+        request = _RerankRequest(
+            pairs=pairs, model_indices=model_indices, enqueue_time=time.time()
+        )
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return [request.scores[model_ind] for model_ind in model_indices]
+
+    def _collect_batch(self) -> list[_RerankRequest]:
+        batch = [self._queue.get()]
+        num_pairs = len(batch[0].pairs)
+        deadline = batch[0].enqueue_time + self.max_wait
+        while num_pairs < self.max_batch_pairs:
+            # requests that queued up during the previous forward pass are always taken
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            batch.append(request)
+            num_pairs += len(request.pairs)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect_batch()
+            batch_start = time.time()
+            try:
+                for model_ind, encoder in enumerate(
+                    get_default_reranking_model_ensemble()
+                ):
+                    model_requests = [
+                        request
+                        for request in batch
+                        if model_ind in request.model_indices
+                    ]
+                    model_pairs = [
+                        pair for request in model_requests for pair in request.pairs
+                    ]
+                    if not model_pairs:
+                        continue
+                    model_scores = encoder.predict(  # type: ignore
+                        model_pairs, batch_size=len(model_pairs)
+                    )
+                    offset = 0
+                    for request in model_requests:
+                        request.scores[model_ind] = model_scores[
+                            offset : offset + len(request.pairs)
+                        ]
+                        offset += len(request.pairs)
+            except Exception as e:
+                logger.exception("Failed to run batched reranking")
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            for request in batch:
+                request.done.set()
+
+            self.stats.record(batch, batch_start)
+            logger.debug(
+                f"Reranked the pairs of {len(batch)} requests in "
+                f"{time.time() - batch_start:.3f} seconds"
+            )
+            if self.stats.num_batches % _STATS_LOG_INTERVAL == 0:
+                self.stats.log()
+
+
+_RERANK_BATCHER: CrossEncoderBatcher | None = None
+_RERANK_BATCHER_LOCK = threading.Lock()
+
+
+def get_default_rerank_batcher() -> CrossEncoderBatcher:
+    global _RERANK_BATCHER
+    # the API server calls this from many threads, only ever start one batcher
+    with _RERANK_BATCHER_LOCK:
+        if _RERANK_BATCHER is None:
+            _RERANK_BATCHER = CrossEncoderBatcher(
+                max_wait_ms=RERANK_BATCH_MAX_WAIT_MS,
+                max_batch_pairs=RERANK_BATCH_MAX_PAIRS,
+            )
+    return _RERANK_BATCHER
@@ -1,64 +1,130 @@
-from sentence_transformers import CrossEncoder  # type: ignore
-from sentence_transformers import SentenceTransformer  # type: ignore
-from transformers import AutoTokenizer  # type: ignore
-from transformers import TFDistilBertForSequenceClassification  # type: ignore
+import threading
+from typing import TYPE_CHECKING
 
 from danswer.configs.model_configs import CROSS_EMBED_CONTEXT_SIZE
 from danswer.configs.model_configs import CROSS_ENCODER_MODEL_ENSEMBLE
 from danswer.configs.model_configs import DOC_EMBEDDING_CONTEXT_SIZE
 from danswer.configs.model_configs import DOCUMENT_ENCODER_MODEL
+from danswer.configs.model_configs import ENABLE_ONNX_INFERENCE
 from danswer.configs.model_configs import INTENT_MODEL_VERSION
+from danswer.configs.model_configs import ONNX_QUANTIZE
 from danswer.configs.model_configs import QUERY_MAX_CONTEXT_SIZE
 from danswer.configs.model_configs import SKIP_RERANKING
+from danswer.search.onnx_models import load_onnx_cross_encoder
+from danswer.search.onnx_models import load_onnx_embedding_model
+from danswer.search.onnx_models import load_onnx_intent_model
 
+# torch / tensorflow / transformers take seconds to import, they are only imported
+# once a model is actually loaded so that the API server can come up without them
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder  # type: ignore
+    from sentence_transformers import SentenceTransformer  # type: ignore
+    from transformers import AutoTokenizer  # type: ignore
+    from transformers import TFDistilBertForSequenceClassification  # type: ignore
 
-_TOKENIZER: None | AutoTokenizer = None
-_EMBED_MODEL: None | SentenceTransformer = None
-_RERANK_MODELS: None | list[CrossEncoder] = None
-_INTENT_TOKENIZER: None | AutoTokenizer = None
-_INTENT_MODEL: None | TFDistilBertForSequenceClassification = None
 
+_TOKENIZER: "AutoTokenizer | None" = None
+_EMBED_MODEL: "SentenceTransformer | None" = None
+_RERANK_MODELS: "list[CrossEncoder] | None" = None
+_INTENT_TOKENIZER: "AutoTokenizer | None" = None
+_INTENT_MODEL: "TFDistilBertForSequenceClassification | None" = None
+# Models may be loaded by the background warm-up and a request at the same time
+_MODEL_LOAD_LOCK = threading.Lock()
 
-def get_default_tokenizer() -> AutoTokenizer:
+
+def get_default_model_backend() -> str:
+    """How the default models are served. The outputs of the backends and of quantized
+    models differ slightly, so e.g. cached embeddings must not be shared between them"""
+    if not ENABLE_ONNX_INFERENCE:
+        return "pytorch"
+    return "onnx-int8" if ONNX_QUANTIZE else "onnx-fp32"
+
+
+def get_default_tokenizer() -> "AutoTokenizer":
     global _TOKENIZER
     if _TOKENIZER is None:
-        _TOKENIZER = AutoTokenizer.from_pretrained(DOCUMENT_ENCODER_MODEL)
+        with _MODEL_LOAD_LOCK:
+            if _TOKENIZER is None:
+                from transformers import AutoTokenizer
+
+                _TOKENIZER = AutoTokenizer.from_pretrained(DOCUMENT_ENCODER_MODEL)
     return _TOKENIZER
 
 
-def get_default_embedding_model() -> SentenceTransformer:
+def _load_embedding_model() -> "SentenceTransformer":
+    if ENABLE_ONNX_INFERENCE:
+        return load_onnx_embedding_model(
+            DOCUMENT_ENCODER_MODEL, max_seq_length=DOC_EMBEDDING_CONTEXT_SIZE
+        )
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(DOCUMENT_ENCODER_MODEL)
+    model.max_seq_length = DOC_EMBEDDING_CONTEXT_SIZE
+    return model
+
+
+def get_default_embedding_model() -> "SentenceTransformer":
     global _EMBED_MODEL
     if _EMBED_MODEL is None:
-        _EMBED_MODEL = SentenceTransformer(DOCUMENT_ENCODER_MODEL)
-        _EMBED_MODEL.max_seq_length = DOC_EMBEDDING_CONTEXT_SIZE
+        with _MODEL_LOAD_LOCK:
+            if _EMBED_MODEL is None:
+                _EMBED_MODEL = _load_embedding_model()
     return _EMBED_MODEL
 
 
-def get_default_reranking_model_ensemble() -> list[CrossEncoder]:
+def _load_reranking_model_ensemble() -> "list[CrossEncoder]":
+    if ENABLE_ONNX_INFERENCE:
+        return [
+            load_onnx_cross_encoder(model_name, max_length=CROSS_EMBED_CONTEXT_SIZE)
+            for model_name in CROSS_ENCODER_MODEL_ENSEMBLE
+        ]
+
+    from sentence_transformers import CrossEncoder
+
+    models = [CrossEncoder(model_name) for model_name in CROSS_ENCODER_MODEL_ENSEMBLE]
+    for model in models:
+        model.max_length = CROSS_EMBED_CONTEXT_SIZE
+    return models
+
+
+def get_default_reranking_model_ensemble() -> "list[CrossEncoder]":
     global _RERANK_MODELS
     if _RERANK_MODELS is None:
-        _RERANK_MODELS = [
-            CrossEncoder(model_name) for model_name in CROSS_ENCODER_MODEL_ENSEMBLE
-        ]
-        for model in _RERANK_MODELS:
-            model.max_length = CROSS_EMBED_CONTEXT_SIZE
+        with _MODEL_LOAD_LOCK:
+            if _RERANK_MODELS is None:
+                _RERANK_MODELS = _load_reranking_model_ensemble()
     return _RERANK_MODELS
 
 
-def get_default_intent_model_tokenizer() -> AutoTokenizer:
+def get_default_intent_model_tokenizer() -> "AutoTokenizer":
     global _INTENT_TOKENIZER
     if _INTENT_TOKENIZER is None:
-        _INTENT_TOKENIZER = AutoTokenizer.from_pretrained(INTENT_MODEL_VERSION)
+        with _MODEL_LOAD_LOCK:
+            if _INTENT_TOKENIZER is None:
+                from transformers import AutoTokenizer
+
+                _INTENT_TOKENIZER = AutoTokenizer.from_pretrained(INTENT_MODEL_VERSION)
     return _INTENT_TOKENIZER
 
 
-def get_default_intent_model() -> TFDistilBertForSequenceClassification:
+def _load_intent_model() -> "TFDistilBertForSequenceClassification":
+    if ENABLE_ONNX_INFERENCE:
+        return load_onnx_intent_model(INTENT_MODEL_VERSION)
+
+    from transformers import TFDistilBertForSequenceClassification
+
+    model = TFDistilBertForSequenceClassification.from_pretrained(INTENT_MODEL_VERSION)
+    model.max_seq_length = QUERY_MAX_CONTEXT_SIZE
+    return model
+
+
+def get_default_intent_model() -> "TFDistilBertForSequenceClassification":
     global _INTENT_MODEL
     if _INTENT_MODEL is None:
-        _INTENT_MODEL = TFDistilBertForSequenceClassification.from_pretrained(
-            INTENT_MODEL_VERSION
-        )
-        _INTENT_MODEL.max_seq_length = QUERY_MAX_CONTEXT_SIZE
+        with _MODEL_LOAD_LOCK:
+            if _INTENT_MODEL is None:
+                _INTENT_MODEL = _load_intent_model()
     return _INTENT_MODEL
 
 
@@ -81,6 +147,6 @@ def warm_up_models(
 
     intent_tokenizer = get_default_intent_model_tokenizer()
     inputs = intent_tokenizer(
-        warm_up_str, return_tensors="tf", truncation=True, padding=True
+        warm_up_str, return_tensors="np", truncation=True, padding=True
     )
     get_default_intent_model()(inputs)
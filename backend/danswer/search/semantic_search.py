@@ -1,9 +1,10 @@
 import json
+import time
 from collections.abc import Callable
+from typing import TYPE_CHECKING
 from uuid import UUID
 
 import numpy
-from sentence_transformers import SentenceTransformer  # type: ignore
 
 from danswer.chunking.chunk import split_chunk_text_into_mini_chunks
 from danswer.chunking.models import ChunkEmbedding
@@ -16,28 +17,68 @@ from danswer.configs.app_configs import NUM_RETURNED_HITS
 from danswer.configs.model_configs import ASYM_PASSAGE_PREFIX
 from danswer.configs.model_configs import ASYM_QUERY_PREFIX
 from danswer.configs.model_configs import BATCH_SIZE_ENCODE_CHUNKS
+from danswer.configs.model_configs import CROSS_ENCODER_MODEL_ENSEMBLE
 from danswer.configs.model_configs import CROSS_ENCODER_RANGE_MAX
 from danswer.configs.model_configs import CROSS_ENCODER_RANGE_MIN
+from danswer.configs.model_configs import DOC_EMBEDDING_CONTEXT_SIZE
+from danswer.configs.model_configs import DOCUMENT_ENCODER_MODEL
+from danswer.configs.model_configs import ENABLE_RERANK_BATCHING
+from danswer.configs.model_configs import ENABLE_RERANK_CASCADE
+from danswer.configs.model_configs import ENCODE_CHUNKS_LENGTH_BUCKETING
+from danswer.configs.model_configs import ENCODE_CHUNKS_TOKEN_BUDGET
 from danswer.configs.model_configs import NORMALIZE_EMBEDDINGS
+from danswer.configs.model_configs import RERANK_CASCADE_FIRST_STAGE_MODEL
+from danswer.configs.model_configs import RERANK_CASCADE_NUM_SURVIVORS
 from danswer.configs.model_configs import SIM_SCORE_RANGE_HIGH
 from danswer.configs.model_configs import SIM_SCORE_RANGE_LOW
 from danswer.configs.model_configs import SKIP_RERANKING
 from danswer.datastores.datastore_utils import translate_boost_count_to_multiplier
 from danswer.datastores.interfaces import DocumentIndex
 from danswer.datastores.interfaces import IndexFilter
+from danswer.search.embedding_cache import build_embedding_cache_key
+from danswer.search.embedding_cache import EmbeddingCache
+from danswer.search.embedding_cache import get_default_embedding_cache
+from danswer.search.embedding_cache import get_default_query_embedding_cache
+from danswer.search.embedding_cache import QueryEmbeddingCache
 from danswer.search.models import ChunkMetric
 from danswer.search.models import Embedder
 from danswer.search.models import MAX_METRICS_CONTENT
 from danswer.search.models import RerankMetricsContainer
 from danswer.search.models import RetrievalMetricsContainer
+from danswer.search.rerank_batching import get_default_rerank_batcher
 from danswer.search.search_utils import get_default_embedding_model
+from danswer.search.search_utils import get_default_model_backend
 from danswer.search.search_utils import get_default_reranking_model_ensemble
+from danswer.search.search_utils import get_default_tokenizer
 from danswer.server.models import SearchDoc
+from danswer.utils.batching import batch_by_token_budget
 from danswer.utils.logger import setup_logger
 from danswer.utils.timing import log_function_time
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer  # type: ignore
+
 logger = setup_logger()
 
+# Margin between the lowest survivor of a cascaded rerank and the chunks cut before it
+_CASCADE_CUT_SCORE_GAP = 1e-3
+
+
+def _get_cascade_first_stage_ind() -> int | None:
+    if RERANK_CASCADE_FIRST_STAGE_MODEL not in CROSS_ENCODER_MODEL_ENSEMBLE:
+        if ENABLE_RERANK_CASCADE:
+            logger.error(
+                f"Rerank cascade first stage model {RERANK_CASCADE_FIRST_STAGE_MODEL} "
+                f"is not part of the ensemble {CROSS_ENCODER_MODEL_ENSEMBLE}, "
+                "disabling the cascade"
+            )
+        return None
+    return CROSS_ENCODER_MODEL_ENSEMBLE.index(RERANK_CASCADE_FIRST_STAGE_MODEL)
+
+
+# Resolved once so a misconfigured model name does not fail every search
+_CASCADE_FIRST_STAGE_IND = _get_cascade_first_stage_ind()
+
 
 def chunks_to_search_docs(chunks: list[InferenceChunk] | None) -> list[SearchDoc]:
     search_docs = (
@@ -62,20 +103,31 @@ def chunks_to_search_docs(chunks: list[InferenceChunk] | None) -> list[SearchDoc
     return search_docs
 
 
-@log_function_time()
-def semantic_reranking(
+def _get_cross_encoder_scores(
     query: str,
     chunks: list[InferenceChunk],
-    rerank_metrics_callback: Callable[[RerankMetricsContainer], None] | None = None,
-    model_min: int = CROSS_ENCODER_RANGE_MIN,
-    model_max: int = CROSS_ENCODER_RANGE_MAX,
-) -> list[InferenceChunk]:
+    model_indices: list[int],
+    enable_batching: bool,
+) -> list[numpy.ndarray]:
+    """Returns one array of scores for the chunks per requested model of the ensemble"""
+    pairs = [(query, chunk.content) for chunk in chunks]
+    if enable_batching:
+        return get_default_rerank_batcher().predict(pairs, model_indices)
+
     cross_encoders = get_default_reranking_model_ensemble()
-    sim_scores = [
-        encoder.predict([(query, chunk.content) for chunk in chunks])  # type: ignore
-        for encoder in cross_encoders
+    return [
+        cross_encoders[model_ind].predict(pairs)  # type: ignore
+        for model_ind in model_indices
     ]
 
+
+def _normalize_cross_encoder_scores(
+    sim_scores: list[numpy.ndarray],
+    chunks: list[InferenceChunk],
+    model_min: int,
+    model_max: int,
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Returns the boosted and normalized scores along with the raw averaged scores"""
     raw_sim_scores = sum(sim_scores) / len(sim_scores)
 
     cross_models_min = numpy.min(sim_scores)
@@ -89,8 +141,77 @@ def semantic_reranking(
     normalized_b_s_scores = (boosted_sim_scores + cross_models_min - model_min) / (
         model_max - model_min
     )
-    scored_results = list(zip(normalized_b_s_scores, raw_sim_scores, chunks))
-    scored_results.sort(key=lambda x: x[0], reverse=True)
+    return numpy.asarray(normalized_b_s_scores), numpy.asarray(raw_sim_scores)
+
+
+@log_function_time()
+def semantic_reranking(
+    query: str,
+    chunks: list[InferenceChunk],
+    rerank_metrics_callback: Callable[[RerankMetricsContainer], None] | None = None,
+    model_min: int = CROSS_ENCODER_RANGE_MIN,
+    model_max: int = CROSS_ENCODER_RANGE_MAX,
+    enable_batching: bool = ENABLE_RERANK_BATCHING,
+    enable_cascade: bool = ENABLE_RERANK_CASCADE,
+    cascade_num_survivors: int = RERANK_CASCADE_NUM_SURVIVORS,
+) -> list[InferenceChunk]:
+    all_model_indices = list(range(len(CROSS_ENCODER_MODEL_ENSEMBLE)))
+    if (
+        enable_cascade
+        and _CASCADE_FIRST_STAGE_IND is not None
+        and len(all_model_indices) > 1
+        and len(chunks) > cascade_num_survivors
+    ):
+        first_stage_ind = _CASCADE_FIRST_STAGE_IND
+        first_stage_scores = _get_cross_encoder_scores(
+            query, chunks, [first_stage_ind], enable_batching
+        )[0]
+        first_norm_scores, first_raw_scores = _normalize_cross_encoder_scores(
+            [first_stage_scores], chunks, model_min, model_max
+        )
+        # Boosts are already applied so a highly boosted chunk is not cut early
+        first_stage_order = numpy.argsort(-first_norm_scores, kind="stable")
+        survivor_inds = first_stage_order[:cascade_num_survivors]
+        survivors = [chunks[ind] for ind in survivor_inds]
+
+        sim_scores = [first_stage_scores[survivor_inds]] + _get_cross_encoder_scores(
+            query,
+            survivors,
+            [ind for ind in all_model_indices if ind != first_stage_ind],
+            enable_batching,
+        )
+        norm_scores, raw_scores = _normalize_cross_encoder_scores(
+            sim_scores, survivors, model_min, model_max
+        )
+        scored_results = list(zip(norm_scores, raw_scores, survivors))
+        scored_results.sort(key=lambda x: x[0], reverse=True)
+
+        # The chunks cut by the first stage keep its ordering after the survivors. Their
+        # scores are shifted below the lowest survivor so that a chunk which was only
+        # scored by the first stage never outranks one scored by the full ensemble
+        cut_inds = first_stage_order[cascade_num_survivors:]
+        cut_norm_scores = first_norm_scores[cut_inds]
+        score_overlap = cut_norm_scores.max() - norm_scores.min()
+        if score_overlap >= 0:
+            cut_norm_scores = cut_norm_scores - score_overlap - _CASCADE_CUT_SCORE_GAP
+        scored_results.extend(
+            (cut_norm_score, first_raw_scores[ind], chunks[ind])
+            for cut_norm_score, ind in zip(cut_norm_scores, cut_inds)
+        )
+        logger.debug(
+            f"Cascaded reranking cut {len(chunks) - len(survivors)} of {len(chunks)} "
+            "chunks after the first stage"
+        )
+    else:
+        sim_scores = _get_cross_encoder_scores(
+            query, chunks, all_model_indices, enable_batching
+        )
+        norm_scores, raw_scores = _normalize_cross_encoder_scores(
+            sim_scores, chunks, model_min, model_max
+        )
+        scored_results = list(zip(norm_scores, raw_scores, chunks))
+        scored_results.sort(key=lambda x: x[0], reverse=True)
+
     ranked_sim_scores, ranked_raw_scores, ranked_chunks = zip(*scored_results)
 
     logger.debug(f"Reranked similarity scores: {ranked_sim_scores}")
@@ -189,6 +310,30 @@ def retrieve_ranked_documents(
 ) -> tuple[list[InferenceChunk] | None, list[InferenceChunk] | None]:
     """Uses vector similarity to fetch the top num_hits document chunks with a distance cutoff.
     Reranks the top num_rerank out of those (instead of all due to latency)"""
+    top_chunks = datastore.semantic_retrieval(query, user_id, filters, num_hits)
+    return rank_retrieved_documents(
+        query,
+        top_chunks,
+        filters,
+        num_rerank=num_rerank,
+        skip_rerank=skip_rerank,
+        retrieval_metrics_callback=retrieval_metrics_callback,
+        rerank_metrics_callback=rerank_metrics_callback,
+    )
+
+
+def rank_retrieved_documents(
+    query: str,
+    top_chunks: list[InferenceChunk],
+    filters: list[IndexFilter] | None,
+    num_rerank: int = NUM_RERANKED_RESULTS,
+    skip_rerank: bool = SKIP_RERANKING,
+    retrieval_metrics_callback: Callable[[RetrievalMetricsContainer], None]
+    | None = None,
+    rerank_metrics_callback: Callable[[RerankMetricsContainer], None] | None = None,
+) -> tuple[list[InferenceChunk] | None, list[InferenceChunk] | None]:
+    """Second half of retrieve_ranked_documents, for chunks that were retrieved from the
+    datastore separately, e.g. while waiting on the intent model"""
 
     def _log_top_chunk_links(chunks: list[InferenceChunk]) -> None:
         doc_links = [c.source_links[0] for c in chunks if c.source_links is not None]
@@ -196,7 +341,6 @@ def retrieve_ranked_documents(
         files_log_msg = f"Top links from semantic search: {', '.join(doc_links)}"
         logger.info(files_log_msg)
 
-    top_chunks = datastore.semantic_retrieval(query, user_id, filters, num_hits)
     if not top_chunks:
         filters_log_msg = json.dumps(filters, separators=(",", ":")).replace("\n", "")
         logger.warning(
@@ -240,56 +384,142 @@ def retrieve_ranked_documents(
     return ranked_chunks, top_chunks[num_rerank:]
 
 
+def _encode_passages(
+    texts: list[str],
+    embedding_model: "SentenceTransformer",
+    batch_size: int,
+    passage_prefix: str,
+    embedding_cache: EmbeddingCache | None,
+    model_name: str,
+    length_bucketing: bool = False,
+    token_budget: int = ENCODE_CHUNKS_TOKEN_BUDGET,
+) -> numpy.ndarray:
+    """Encodes the passages in batches, reusing the cached embedding of any passage that
+    has been encoded before with the same model and prefix. With `length_bucketing`,
+    batches are built from passages of similar token length up to `token_budget`
+    instead of `batch_size` passages in arrival order.
+    Returns a single float32 matrix with one row per passage, in the order given"""
+    embedding_matrix = numpy.empty(
+        (len(texts), embedding_model.get_sentence_embedding_dimension()),
+        dtype=numpy.float32,
+    )
+
+    uncached_inds = list(range(len(texts)))
+    cache_keys: list[str] = []
+    if embedding_cache is not None:
+        model_backend = get_default_model_backend()
+        cache_keys = [
+            build_embedding_cache_key(
+                text=text,
+                model_name=model_name,
+                model_backend=model_backend,
+                prefix=passage_prefix,
+                normalize_embeddings=NORMALIZE_EMBEDDINGS,
+            )
+            for text in texts
+        ]
+        cached_embeddings = embedding_cache.get_many(cache_keys)
+        uncached_inds = []
+        for ind, key in enumerate(cache_keys):
+            if key in cached_embeddings:
+                embedding_matrix[ind] = cached_embeddings[key]
+            else:
+                uncached_inds.append(ind)
+
+    uncached_texts = [passage_prefix + texts[ind] for ind in uncached_inds]
+    if length_bucketing:
+        token_lengths = [
+            len(input_ids)
+            for input_ids in get_default_tokenizer()(
+                uncached_texts, truncation=True, max_length=DOC_EMBEDDING_CONTEXT_SIZE
+            )["input_ids"]
+        ]
+        index_batches = batch_by_token_budget(token_lengths, token_budget)
+    else:
+        index_batches = [
+            list(range(i, min(i + batch_size, len(uncached_texts))))
+            for i in range(0, len(uncached_texts), batch_size)
+        ]
+
+    for index_batch in index_batches:
+        # Normalize embeddings is only configured via model_configs.py, be sure to use right value for the set loss
+        batch_embeddings = embedding_model.encode(
+            [uncached_texts[ind] for ind in index_batch],
+            normalize_embeddings=NORMALIZE_EMBEDDINGS,
+        )
+        # batches may be out of order, put each embedding back where its text was
+        embedding_matrix[[uncached_inds[ind] for ind in index_batch]] = batch_embeddings
+
+    if embedding_cache is not None:
+        embedding_cache.record_lookup(
+            num_hits=len(texts) - len(uncached_inds), num_misses=len(uncached_inds)
+        )
+        embedding_cache.put_many(
+            {cache_keys[ind]: embedding_matrix[ind] for ind in uncached_inds}
+        )
+        logger.info(
+            f"Embedding cache: {len(texts) - len(uncached_inds)} hits, "
+            f"{len(uncached_inds)} misses for this batch. "
+            f"Totals: {embedding_cache.hits} hits, {embedding_cache.misses} misses"
+        )
+
+    return embedding_matrix
+
+
 @log_function_time()
 def encode_chunks(
     chunks: list[DocAwareChunk],
-    embedding_model: SentenceTransformer | None = None,
+    embedding_model: "SentenceTransformer | None" = None,
     batch_size: int = BATCH_SIZE_ENCODE_CHUNKS,
     enable_mini_chunk: bool = ENABLE_MINI_CHUNK,
     passage_prefix: str = ASYM_PASSAGE_PREFIX,
+    embedding_cache: EmbeddingCache | None = None,
+    model_name: str = DOCUMENT_ENCODER_MODEL,
+    length_bucketing: bool = ENCODE_CHUNKS_LENGTH_BUCKETING,
+    token_budget: int = ENCODE_CHUNKS_TOKEN_BUDGET,
 ) -> list[IndexChunk]:
+    """If no embedding cache is passed in, the default one is used if it's configured.
+    `model_name` must identify `embedding_model` as it is part of the cache key"""
     embedded_chunks: list[IndexChunk] = []
     if embedding_model is None:
         embedding_model = get_default_embedding_model()
+    if embedding_cache is None:
+        embedding_cache = get_default_embedding_cache()
 
     chunk_texts = []
     chunk_mini_chunks_count = {}
     for chunk_ind, chunk in enumerate(chunks):
-        chunk_texts.append(passage_prefix + chunk.content)
+        chunk_texts.append(chunk.content)
         mini_chunk_texts = (
             split_chunk_text_into_mini_chunks(chunk.content)
             if enable_mini_chunk
             else []
         )
-        prefixed_mini_chunk_texts = [passage_prefix + text for text in mini_chunk_texts]
-        chunk_texts.extend(prefixed_mini_chunk_texts)
-        chunk_mini_chunks_count[chunk_ind] = 1 + len(prefixed_mini_chunk_texts)
-
-    text_batches = [
-        chunk_texts[i : i + batch_size] for i in range(0, len(chunk_texts), batch_size)
-    ]
-
-    embeddings_np: list[numpy.ndarray] = []
-    for text_batch in text_batches:
-        # Normalize embeddings is only configured via model_configs.py, be sure to use right value for the set loss
-        embeddings_np.extend(
-            embedding_model.encode(
-                text_batch, normalize_embeddings=NORMALIZE_EMBEDDINGS
-            )
-        )
-    embeddings: list[list[float]] = [embedding.tolist() for embedding in embeddings_np]
+        chunk_texts.extend(mini_chunk_texts)
+        chunk_mini_chunks_count[chunk_ind] = 1 + len(mini_chunk_texts)
+
+    embeddings = _encode_passages(
+        texts=chunk_texts,
+        embedding_model=embedding_model,
+        batch_size=batch_size,
+        passage_prefix=passage_prefix,
+        embedding_cache=embedding_cache,
+        model_name=model_name,
+        length_bucketing=length_bucketing,
+        token_budget=token_budget,
+    )
 
+    # The chunks hold views into the one embedding matrix for the batch, no copies
     embedding_ind_start = 0
     for chunk_ind, chunk in enumerate(chunks):
         num_embeddings = chunk_mini_chunks_count[chunk_ind]
-        chunk_embeddings = embeddings[
-            embedding_ind_start : embedding_ind_start + num_embeddings
-        ]
         new_embedded_chunk = IndexChunk(
             **{k: getattr(chunk, k) for k in chunk.__dataclass_fields__},
             embeddings=ChunkEmbedding(
-                full_embedding=chunk_embeddings[0],
-                mini_chunk_embeddings=chunk_embeddings[1:],
+                full_embedding=embeddings[embedding_ind_start],
+                mini_chunk_embeddings=embeddings[
+                    embedding_ind_start + 1 : embedding_ind_start + num_embeddings
+                ],
             ),
         )
         embedded_chunks.append(new_embedded_chunk)
@@ -300,15 +530,41 @@ def encode_chunks(
 
 def embed_query(
     query: str,
-    embedding_model: SentenceTransformer | None = None,
+    embedding_model: "SentenceTransformer | None" = None,
     prefix: str = ASYM_QUERY_PREFIX,
     normalize_embeddings: bool = NORMALIZE_EMBEDDINGS,
+    query_cache: QueryEmbeddingCache | None = None,
+    model_name: str = DOCUMENT_ENCODER_MODEL,
 ) -> list[float]:
+    """If no query cache is passed in, the default one is used if it's enabled.
+    `model_name` must identify `embedding_model` as it is part of the cache key"""
     model = embedding_model or get_default_embedding_model()
+    if query_cache is None:
+        query_cache = get_default_query_embedding_cache()
+
+    cache_key = build_embedding_cache_key(
+        text=query,
+        model_name=model_name,
+        model_backend=get_default_model_backend(),
+        prefix=prefix,
+        normalize_embeddings=normalize_embeddings,
+    )
+    if query_cache is not None:
+        cached_embedding = query_cache.get(cache_key)
+        if cached_embedding is not None:
+            return cached_embedding.tolist()
+
+    start_time = time.time()
     prefixed_query = prefix + query
     query_embedding = model.encode(
         prefixed_query, normalize_embeddings=normalize_embeddings
     )
+    if query_cache is not None:
+        query_cache.put(
+            cache_key,
+            numpy.asarray(query_embedding, dtype=numpy.float32),
+            encode_time=time.time() - start_time,
+        )
 
     if not isinstance(query_embedding, list):
         query_embedding = query_embedding.tolist()
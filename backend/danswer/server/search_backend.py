@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 from danswer.auth.users import current_user
 from danswer.chunking.models import InferenceChunk
 from danswer.configs.app_configs import DISABLE_GENERATIVE_AI
+from danswer.configs.app_configs import ENABLE_FUSED_RETRIEVAL
 from danswer.configs.app_configs import NUM_DOCUMENT_TOKENS_FED_TO_GENERATIVE_MODEL
 from danswer.configs.constants import IGNORE_FOR_QA
 from danswer.datastores.document_index import get_default_document_index
@@ -23,8 +24,10 @@ from danswer.direct_qa.exceptions import UnknownModelError
 from danswer.direct_qa.interfaces import DanswerAnswerPiece
 from danswer.direct_qa.llm_utils import get_default_qa_model
 from danswer.direct_qa.qa_utils import get_usable_chunks
-from danswer.search.danswer_helper import query_intent
 from danswer.search.danswer_helper import recommend_search_flow
+from danswer.search.danswer_helper import retrieve_documents_with_intent
+from danswer.search.danswer_helper import submit_query_intent
+from danswer.search.fused_search import retrieve_fused_documents
 from danswer.search.keyword_search import retrieve_keyword_documents
 from danswer.search.models import QueryFlow
 from danswer.search.models import SearchType
@@ -183,25 +186,30 @@ def stream_direct_qa(
         use_keyword = question.use_keyword
         offset_count = question.offset if question.offset is not None else 0
 
-        predicted_search, predicted_flow = query_intent(query)
-        if use_keyword is None:
-            use_keyword = predicted_search == SearchType.KEYWORD
-
         user_id = None if user is None else user.id
-        if use_keyword:
-            ranked_chunks: list[InferenceChunk] | None = retrieve_keyword_documents(
-                query,
-                user_id,
-                filters,
-                get_default_document_index(),
+        ranked_chunks: list[InferenceChunk] | None
+        unranked_chunks: list[InferenceChunk] | None
+        if use_keyword is None and ENABLE_FUSED_RETRIEVAL:
+            # Search both ways at once, the intent model no longer gates retrieval
+            intent_future = submit_query_intent(query)
+            ranked_chunks, unranked_chunks = retrieve_fused_documents(
+                query, user_id, filters, get_default_document_index()
             )
-            unranked_chunks: list[InferenceChunk] | None = []
+            predicted_search, predicted_flow = intent_future.result()
         else:
-            ranked_chunks, unranked_chunks = retrieve_ranked_documents(
+            (
+                ranked_chunks,
+                unranked_chunks,
+                predicted_search,
+                predicted_flow,
+            ) = retrieve_documents_with_intent(
                 query,
                 user_id,
                 filters,
                 get_default_document_index(),
+                use_keyword=use_keyword,
+                # the predicted flow is replaced by search below in this case
+                skip_unused_intent=disable_generative_answer,
             )
         if not ranked_chunks:
             logger.debug("No Documents Found")
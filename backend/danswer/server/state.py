@@ -1,8 +1,11 @@
 from fastapi import APIRouter
+from fastapi import Response
 
 from danswer.configs.app_configs import AUTH_TYPE
 from danswer.server.models import AuthTypeResponse
 from danswer.server.models import StatusResponse
+from danswer.utils.warm_up import get_warm_up_status
+from danswer.utils.warm_up import WarmUpStatus
 
 
 router = APIRouter()
@@ -13,6 +16,20 @@ def healthcheck() -> StatusResponse:
     return StatusResponse(success=True, message="ok")
 
 
+@router.get("/ready")
+def readiness_check(response: Response) -> StatusResponse[WarmUpStatus]:
+    """Unlike /health, only succeeds once the models are loaded and the document index
+    is set up, requests before then would block on the loading"""
+    status = get_warm_up_status()
+    if not status.ready:
+        response.status_code = 503
+    return StatusResponse(
+        success=status.ready,
+        message="ready" if status.ready else "warming up",
+        data=status,
+    )
+
+
 @router.get("/auth/type")
 def get_auth_type() -> AuthTypeResponse:
     return AuthTypeResponse(auth_type=AUTH_TYPE)
@@ -21,3 +21,36 @@ def batch_generator(
         if pre_batch_yield:
             pre_batch_yield(batch)
         yield batch
+
+
+def batch_by_token_budget(
+    token_lengths: list[int], token_budget: int
+) -> list[list[int]]:
+    """Groups item indices into batches where the padded size of each batch (number of
+    items times the longest item) stays within the token budget. Items are sorted by
+    length first so that each batch holds similarly sized items and little compute is
+    spent on padding. An item longer than the budget gets a batch to itself.
+    Callers are responsible for putting results back in the original order."""
+    sorted_inds = sorted(
+        range(len(token_lengths)), key=lambda ind: token_lengths[ind], reverse=True
+    )
+
+    batches: list[list[int]] = []
+    current_batch: list[int] = []
+    # items come in descending length, so the first item of a batch is its longest
+    current_max_length = 0
+    for ind in sorted_inds:
+        if (
+            current_batch
+            and current_max_length * (len(current_batch) + 1) > token_budget
+        ):
+            batches.append(current_batch)
+            current_batch = []
+
+        if not current_batch:
+            current_max_length = token_lengths[ind]
+        current_batch.append(ind)
+
+    if current_batch:
+        batches.append(current_batch)
+    return batches
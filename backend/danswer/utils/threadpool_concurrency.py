@@ -0,0 +1,20 @@
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+
+def run_functions_in_parallel(
+    functions_with_args: list[tuple[Callable, tuple]]
+) -> list[Any]:
+    """Runs the functions in separate threads and returns their results in the order
+    they were passed in. If any of the functions raises, the exception is re-raised
+    here once all of them have finished.
+
+    A new pool is used per call so that functions which themselves fan out can't
+    deadlock waiting on threads of a shared pool"""
+    if not functions_with_args:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(functions_with_args)) as executor:
+        futures = [executor.submit(func, *args) for func, args in functions_with_args]
+        return [future.result() for future in futures]
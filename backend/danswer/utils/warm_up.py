@@ -0,0 +1,86 @@
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from pydantic import BaseModel
+
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+WarmUpStep = tuple[str, Callable[[], Any]]
+
+
+class WarmUpStatus(BaseModel):
+    ready: bool
+    pending_steps: list[str]
+    # step name -> seconds it took
+    completed_steps: dict[str, float]
+    # step name -> error message
+    failed_steps: dict[str, str]
+
+
+class _WarmUpTracker:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._finished = False
+        self._pending_steps: list[str] = []
+        self._completed_steps: dict[str, float] = {}
+        self._failed_steps: dict[str, str] = {}
+
+    def run(self, steps: list[WarmUpStep], raise_errors: bool) -> None:
+        with self._lock:
+            self._finished = False
+            self._pending_steps = [name for name, _ in steps]
+
+        warm_up_start = time.time()
+        for name, func in steps:
+            step_start = time.time()
+            try:
+                func()
+            except Exception as e:
+                if raise_errors:
+                    raise
+                # keep going, the remaining steps may still succeed and the failure
+                # is surfaced through the readiness probe
+                logger.exception(f"Warm-up step '{name}' failed")
+                with self._lock:
+                    self._failed_steps[name] = str(e)
+            else:
+                step_time = time.time() - step_start
+                logger.info(f"Warm-up step '{name}' took {step_time:.2f} seconds")
+                with self._lock:
+                    self._completed_steps[name] = step_time
+            with self._lock:
+                self._pending_steps.remove(name)
+
+        with self._lock:
+            self._finished = True
+        logger.info(f"Warm-up finished in {time.time() - warm_up_start:.2f} seconds")
+
+    def get_status(self) -> WarmUpStatus:
+        with self._lock:
+            return WarmUpStatus(
+                ready=self._finished and not self._failed_steps,
+                pending_steps=list(self._pending_steps),
+                completed_steps=dict(self._completed_steps),
+                failed_steps=dict(self._failed_steps),
+            )
+
+
+_WARM_UP_TRACKER = _WarmUpTracker()
+
+
+def run_warm_up(steps: list[WarmUpStep], raise_errors: bool = True) -> None:
+    _WARM_UP_TRACKER.run(steps, raise_errors=raise_errors)
+
+
+def start_background_warm_up(steps: list[WarmUpStep]) -> threading.Thread:
+    thread = threading.Thread(target=run_warm_up, args=(steps, False), daemon=True)
+    thread.start()
+    return thread
+
+
+def get_warm_up_status() -> WarmUpStatus:
+    return _WARM_UP_TRACKER.get_status()
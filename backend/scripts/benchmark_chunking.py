@@ -0,0 +1,226 @@
+# This file is purely for development use, not included in any builds
+# Compares chunk_document against the previous implementation, which re-tokenized the
+# whole chunk built so far for every section, on synthetic documents with many
+# sections. Both must produce exactly the same chunks, so the previous implementation
+# is copied here in full rather than reusing any of the current helpers.
+import argparse
+import random
+import time
+
+from llama_index.text_splitter import SentenceSplitter
+from transformers import AutoTokenizer  # type:ignore
+
+from danswer.chunking.chunk import chunk_document
+from danswer.chunking.chunk import SECTION_SEPARATOR
+from danswer.chunking.models import DocAwareChunk
+from danswer.configs.app_configs import BLURB_SIZE
+from danswer.configs.app_configs import CHUNK_OVERLAP
+from danswer.configs.app_configs import CHUNK_SIZE
+from danswer.configs.constants import DocumentSource
+from danswer.connectors.models import Document
+from danswer.connectors.models import Section
+from danswer.search.search_utils import get_default_tokenizer
+from danswer.utils.text_processing import shared_precompare_cleanup
+
+_WORDS = (
+    "the quick brown fox jumps over a lazy dog while danswer indexes documents "
+    "from many connectors and splits every section into chunks of tokens"
+).split()
+
+
+def _random_text(num_words: int) -> str:
+    sentences = []
+    while num_words > 0:
+        sentence_len = min(num_words, random.randint(5, 20))
+        sentences.append(" ".join(random.choices(_WORDS, k=sentence_len)) + ".")
+        num_words -= sentence_len
+    return " ".join(sentences)
+
+
+def _build_document(doc_ind: int, num_sections: int) -> Document:
+    # Mostly short sections (e.g. messages of a thread, rows of a page) with the
+    # occasional section too large to fit in a chunk
+    return Document(
+        id=f"benchmark-doc-{doc_ind}",
+        sections=[
+            Section(
+                link=f"https://example.com/{doc_ind}#{section_ind}",
+                text=_random_text(random.choice([5, 15, 40, 100, 800])),
+            )
+            for section_ind in range(num_sections)
+        ],
+        source=DocumentSource.WEB,
+        semantic_identifier=f"Benchmark Doc {doc_ind}",
+        metadata={},
+    )
+
+
+def _previous_extract_blurb(text: str, blurb_size: int) -> str:
+    token_count_func = get_default_tokenizer().tokenize
+    blurb_splitter = SentenceSplitter(
+        tokenizer=token_count_func, chunk_size=blurb_size, chunk_overlap=0
+    )
+
+    return blurb_splitter.split_text(text)[0]
+
+
+def _previous_chunk_large_section(
+    section: Section,
+    document: Document,
+    start_chunk_id: int,
+    tokenizer: AutoTokenizer,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    blurb_size: int = BLURB_SIZE,
+) -> list[DocAwareChunk]:
+    section_text = section.text
+    blurb = _previous_extract_blurb(section_text, blurb_size)
+
+    sentence_aware_splitter = SentenceSplitter(
+        tokenizer=tokenizer.tokenize, chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+
+    split_texts = sentence_aware_splitter.split_text(section_text)
+
+    chunks = [
+        DocAwareChunk(
+            source_document=document,
+            chunk_id=start_chunk_id + chunk_ind,
+            blurb=blurb,
+            content=chunk_str,
+            source_links={0: section.link},
+            section_continuation=(chunk_ind != 0),
+        )
+        for chunk_ind, chunk_str in enumerate(split_texts)
+    ]
+    return chunks
+
+
+def _previous_chunk_document(
+    document: Document,
+    chunk_tok_size: int = CHUNK_SIZE,
+    subsection_overlap: int = CHUNK_OVERLAP,
+    blurb_size: int = BLURB_SIZE,
+) -> list[DocAwareChunk]:
+    tokenizer = get_default_tokenizer()
+
+    chunks: list[DocAwareChunk] = []
+    link_offsets: dict[int, str] = {}
+    chunk_text = ""
+    for section in document.sections:
+        section_tok_length = len(tokenizer.tokenize(section.text))
+        current_tok_length = len(tokenizer.tokenize(chunk_text))
+        curr_offset_len = len(shared_precompare_cleanup(chunk_text))
+
+        if section_tok_length > chunk_tok_size:
+            if chunk_text:
+                chunks.append(
+                    DocAwareChunk(
+                        source_document=document,
+                        chunk_id=len(chunks),
+                        blurb=_previous_extract_blurb(chunk_text, blurb_size),
+                        content=chunk_text,
+                        source_links=link_offsets,
+                        section_continuation=False,
+                    )
+                )
+                link_offsets = {}
+                chunk_text = ""
+
+            chunks.extend(
+                _previous_chunk_large_section(
+                    section=section,
+                    document=document,
+                    start_chunk_id=len(chunks),
+                    tokenizer=tokenizer,
+                    chunk_size=chunk_tok_size,
+                    chunk_overlap=subsection_overlap,
+                    blurb_size=blurb_size,
+                )
+            )
+            continue
+
+        if (
+            current_tok_length
+            + len(tokenizer.tokenize(SECTION_SEPARATOR))
+            + section_tok_length
+            <= chunk_tok_size
+        ):
+            chunk_text += (
+                SECTION_SEPARATOR + section.text if chunk_text else section.text
+            )
+            link_offsets[curr_offset_len] = section.link
+        else:
+            chunks.append(
+                DocAwareChunk(
+                    source_document=document,
+                    chunk_id=len(chunks),
+                    blurb=_previous_extract_blurb(chunk_text, blurb_size),
+                    content=chunk_text,
+                    source_links=link_offsets,
+                    section_continuation=False,
+                )
+            )
+            link_offsets = {0: section.link}
+            chunk_text = section.text
+
+    if chunk_text:
+        chunks.append(
+            DocAwareChunk(
+                source_document=document,
+                chunk_id=len(chunks),
+                blurb=_previous_extract_blurb(chunk_text, blurb_size),
+                content=chunk_text,
+                source_links=link_offsets,
+                section_continuation=False,
+            )
+        )
+    return chunks
+
+
+def _to_comparable(chunk: DocAwareChunk) -> tuple:
+    return (
+        chunk.chunk_id,
+        chunk.blurb,
+        chunk.content,
+        chunk.source_links,
+        chunk.section_continuation,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-docs", type=int, default=5)
+    parser.add_argument("--num-sections", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    documents = [
+        _build_document(doc_ind, args.num_sections) for doc_ind in range(args.num_docs)
+    ]
+    # Load the tokenizer outside of the timed sections
+    get_default_tokenizer()
+
+    start = time.time()
+    previous_chunks = [_previous_chunk_document(document) for document in documents]
+    previous_time = time.time() - start
+
+    start = time.time()
+    new_chunks = [chunk_document(document) for document in documents]
+    new_time = time.time() - start
+
+    num_chunks = sum(len(doc_chunks) for doc_chunks in new_chunks)
+    print(
+        f"Chunked {args.num_docs} documents of {args.num_sections} sections "
+        f"into {num_chunks} chunks"
+    )
+    print(f"Previous implementation: {previous_time:.2f}s")
+    print(f"Current implementation: {new_time:.2f}s")
+    print(f"Speedup: {previous_time / new_time:.1f}x")
+
+    for previous_doc_chunks, new_doc_chunks in zip(previous_chunks, new_chunks):
+        assert [_to_comparable(chunk) for chunk in previous_doc_chunks] == [
+            _to_comparable(chunk) for chunk in new_doc_chunks
+        ], "Chunks differ from the previous implementation"
+    print("Chunks are identical")
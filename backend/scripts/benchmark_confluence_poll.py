@@ -0,0 +1,250 @@
+# This file is purely for development use, not included in any builds
+# Counts the Confluence requests a poll makes with the CQL lastmodified search compared
+# to the previous full space scan filtered by modified time, against a recorded space
+# (or a synthetic one) served from memory. Both must produce the same documents.
+#
+# Record a space with:
+#   CONFLUENCE_USER_NAME=... CONFLUENCE_ACCESS_TOKEN=... python \
+#     scripts/benchmark_confluence_poll.py --record <space url> --fixture space.json
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import Any
+from urllib.parse import parse_qs
+from urllib.parse import urlencode
+from urllib.parse import urlparse
+
+from atlassian import Confluence  # type:ignore
+
+from danswer.connectors.confluence.connector import ConfluenceConnector
+from danswer.connectors.confluence.connector import extract_confluence_keys_from_url
+from danswer.connectors.models import Document
+
+_SPACE_URL = "https://benchmark.atlassian.net/wiki/spaces/BENCH/overview"
+_CQL_DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def _record_comments(
+    confluence_client: Confluence, content_id: str
+) -> list[dict[str, Any]]:
+    comments = confluence_client.get_page_child_by_type(
+        content_id, type="comment", start=None, limit=None, expand="body.storage.value"
+    )
+    return [
+        {
+            "id": comment["id"],
+            "body": {"storage": {"value": comment["body"]["storage"]["value"]}},
+            "comments": _record_comments(confluence_client, comment["id"]),
+        }
+        for comment in comments
+    ]
+
+
+def record_space(space_url: str, fixture_path: str) -> None:
+    wiki_base, space = extract_confluence_keys_from_url(space_url)
+    confluence_client = Confluence(
+        url=wiki_base,
+        username=os.environ["CONFLUENCE_USER_NAME"],
+        password=os.environ["CONFLUENCE_ACCESS_TOKEN"],
+        cloud=True,
+    )
+
+    pages: list[dict[str, Any]] = []
+    while True:
+        batch = confluence_client.get_all_pages_from_space(
+            space, start=len(pages), limit=100, expand="body.storage.value,version"
+        )
+        for page in batch:
+            pages.append(
+                {
+                    "id": page["id"],
+                    "title": page["title"],
+                    "body": {"storage": {"value": page["body"]["storage"]["value"]}},
+                    "version": {
+                        "when": page["version"]["when"],
+                        "friendlyWhen": page["version"]["friendlyWhen"],
+                    },
+                    "_links": {"webui": page["_links"]["webui"]},
+                    "comments": _record_comments(confluence_client, page["id"]),
+                }
+            )
+        print(f"Recorded {len(pages)} pages")
+        if len(batch) < 100:
+            break
+
+    with open(fixture_path, "w") as f:
+        json.dump({"space_url": space_url, "pages": pages}, f)
+
+
+def build_synthetic_space(num_pages: int, num_modified: int) -> dict[str, Any]:
+    """Pages last modified over the past year, except for the last num_modified which
+    were modified in the past hour"""
+    now = datetime.now(tz=timezone.utc)
+    pages = []
+    for page_ind in range(num_pages):
+        if page_ind >= num_pages - num_modified:
+            modified = now - timedelta(minutes=page_ind % 60)
+        else:
+            modified = now - timedelta(days=2 + page_ind % 365)
+        pages.append(
+            {
+                "id": str(page_ind),
+                "title": f"Page {page_ind}",
+                "body": {"storage": {"value": f"<p>Content of page {page_ind}</p>"}},
+                "version": {
+                    "when": modified.isoformat(),
+                    "friendlyWhen": modified.strftime("%b %d, %Y"),
+                },
+                "_links": {"webui": f"/spaces/BENCH/pages/{page_ind}"},
+                "comments": [
+                    {
+                        "id": f"{page_ind}-comment",
+                        "body": {"storage": {"value": "<p>A comment</p>"}},
+                        "comments": [],
+                    }
+                ]
+                if page_ind % 3 == 0
+                else [],
+            }
+        )
+    return {"space_url": _SPACE_URL, "pages": pages}
+
+
+class _FixtureConfluence:
+    """Serves the calls the connector makes from the fixture and counts them"""
+
+    def __init__(self, pages: list[dict[str, Any]]) -> None:
+        self.pages = pages
+        self.request_counts: Counter[str] = Counter()
+        self._comments: dict[str, list[dict[str, Any]]] = {}
+        for page in pages:
+            self._index_comments(page)
+
+    def _index_comments(self, content: dict[str, Any]) -> None:
+        self._comments[content["id"]] = content["comments"]
+        for comment in content["comments"]:
+            self._index_comments(comment)
+
+    def get_all_pages_from_space(
+        self, space: str, start: int, limit: int, expand: str
+    ) -> list[dict[str, Any]]:
+        self.request_counts["content (space listing)"] += 1
+        return self.pages[start : start + limit]
+
+    def get_page_child_by_type(
+        self, page_id: str, type: str, start: Any, limit: Any, expand: str
+    ) -> list[dict[str, Any]]:
+        self.request_counts["child comments"] += 1
+        return self._comments[page_id]
+
+    def get(self, path: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
+        self.request_counts["content/search (CQL)"] += 1
+        if params is None:
+            params = {
+                key: values[0] for key, values in parse_qs(urlparse(path).query).items()
+            }
+        cql = params["cql"]
+        limit = int(params["limit"])
+        cursor = int(params.get("cursor", 0))
+
+        def _parse_cql_date(operator: str) -> datetime:
+            match = re.search(f'lastmodified {operator} "(.*?)"', cql)
+            assert match
+            return datetime.strptime(match.group(1), _CQL_DATE_FORMAT).replace(
+                tzinfo=timezone.utc
+            )
+
+        start_time = _parse_cql_date(">=")
+        end_time = _parse_cql_date("<=") + timedelta(minutes=1)
+        matches = sorted(
+            (
+                page
+                for page in self.pages
+                if start_time
+                <= datetime.fromisoformat(page["version"]["when"])
+                < end_time
+            ),
+            key=lambda page: page["version"]["when"],
+        )
+
+        response: dict[str, Any] = {
+            "results": matches[cursor : cursor + limit],
+            "_links": {},
+        }
+        if cursor + limit < len(matches):
+            next_params = {"cql": cql, "limit": limit, "cursor": cursor + limit}
+            response["_links"]["next"] = "/wiki/rest/api/content/search?" + urlencode(
+                next_params
+            )
+        return response
+
+
+def _run(
+    fixture: dict[str, Any], use_cql: bool, start: float, end: float
+) -> tuple[list[Document], Counter[str], float]:
+    connector = ConfluenceConnector(fixture["space_url"])
+    confluence_client = _FixtureConfluence(fixture["pages"])
+    connector.confluence_client = confluence_client
+
+    start_time = time.monotonic()
+    if use_cql:
+        doc_batches = connector.poll_source(start, end)
+    else:
+        # how polling worked before, going through every page of the space
+        start_dt = datetime.fromtimestamp(start, tz=timezone.utc)
+        end_dt = datetime.fromtimestamp(end, tz=timezone.utc)
+        doc_batches = connector._get_doc_batches(
+            connector._iter_space_page_batches(),
+            time_filter=lambda t: start_dt <= t <= end_dt,
+        )
+    docs = [doc for doc_batch in doc_batches for doc in doc_batch]
+    return docs, confluence_client.request_counts, time.monotonic() - start_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixture", help="Space recorded with --record")
+    parser.add_argument("--record", metavar="SPACE_URL")
+    parser.add_argument("--num-pages", type=int, default=20000)
+    parser.add_argument("--num-modified", type=int, default=40)
+    parser.add_argument(
+        "--window-hours", type=float, default=1, help="Length of the polled window"
+    )
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.fixture:
+            parser.error("--record requires --fixture to write to")
+        record_space(args.record, args.fixture)
+        raise SystemExit
+
+    if args.fixture:
+        with open(args.fixture) as f:
+            space = json.load(f)
+    else:
+        space = build_synthetic_space(args.num_pages, args.num_modified)
+
+    poll_end = time.time()
+    poll_start = poll_end - args.window_hours * 60 * 60
+    print(f"{len(space['pages'])} pages, polling the last {args.window_hours} hours")
+
+    results = {}
+    for name, use_cql in [("full space scan", False), ("CQL search", True)]:
+        docs, request_counts, duration = _run(space, use_cql, poll_start, poll_end)
+        results[name] = docs
+        print(
+            f"{name}: {len(docs)} documents, {sum(request_counts.values())} requests "
+            f"({dict(request_counts)}) in {duration:.2f}s"
+        )
+
+    # the CQL search returns the pages by modified time rather than in space order
+    before, after = results.values()
+    assert {doc.id: doc.sections for doc in before} == {
+        doc.id: doc.sections for doc in after
+    }, "The polls produced different documents"
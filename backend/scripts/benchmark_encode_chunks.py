@@ -0,0 +1,103 @@
+# This file is purely for development use, not included in any builds
+# Compares the throughput of fixed size batching against length bucketed batching
+# when encoding chunks on CPU. Make sure EMBEDDING_CACHE_PATH is not set, otherwise
+# the second run will mostly be served from the cache.
+import argparse
+import random
+import time
+
+import numpy
+
+from danswer.chunking.chunk import chunk_document
+from danswer.chunking.models import DocAwareChunk
+from danswer.configs.constants import DocumentSource
+from danswer.configs.model_configs import ENCODE_CHUNKS_TOKEN_BUDGET
+from danswer.connectors.models import Document
+from danswer.connectors.models import Section
+from danswer.search.search_utils import get_default_embedding_model
+from danswer.search.semantic_search import encode_chunks
+
+_WORDS = (
+    "the quick brown fox jumps over a lazy dog while danswer indexes documents "
+    "from many connectors and encodes every chunk into a dense vector"
+).split()
+
+
+def _random_text(num_words: int) -> str:
+    sentences = []
+    while num_words > 0:
+        sentence_len = min(num_words, random.randint(5, 20))
+        sentences.append(" ".join(random.choices(_WORDS, k=sentence_len)) + ".")
+        num_words -= sentence_len
+    return " ".join(sentences)
+
+
+def _build_chunks(num_docs: int) -> list[DocAwareChunk]:
+    chunks: list[DocAwareChunk] = []
+    for doc_ind in range(num_docs):
+        # Mix of short (e.g. Slack threads) and long (e.g. Confluence pages) documents
+        sections = [
+            Section(link=f"https://example.com/{doc_ind}/{ind}", text=_random_text(n))
+            for ind, n in enumerate(
+                random.choices([20, 80, 200, 600], k=random.randint(1, 6))
+            )
+        ]
+        chunks.extend(
+            chunk_document(
+                Document(
+                    id=f"benchmark-doc-{doc_ind}",
+                    sections=sections,
+                    source=DocumentSource.WEB,
+                    semantic_identifier=f"Benchmark Doc {doc_ind}",
+                    metadata={},
+                )
+            )
+        )
+    return chunks
+
+
+def _run(
+    chunks: list[DocAwareChunk], length_bucketing: bool, token_budget: int
+) -> tuple[float, list[numpy.ndarray]]:
+    start = time.time()
+    embedded_chunks = encode_chunks(
+        chunks,
+        enable_mini_chunk=True,
+        length_bucketing=length_bucketing,
+        token_budget=token_budget,
+    )
+    time_taken = time.time() - start
+    embeddings = []
+    for chunk in embedded_chunks:
+        embeddings.append(chunk.embeddings.full_embedding)
+        embeddings.extend(chunk.embeddings.mini_chunk_embeddings)
+    return time_taken, embeddings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-docs", type=int, default=50)
+    parser.add_argument("--token-budget", type=int, default=ENCODE_CHUNKS_TOKEN_BUDGET)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    chunks = _build_chunks(args.num_docs)
+
+    # Load the model outside of the timed sections
+    get_default_embedding_model().encode("Danswer is amazing")
+
+    fixed_time, fixed_embeddings = _run(chunks, False, args.token_budget)
+    bucketed_time, bucketed_embeddings = _run(chunks, True, args.token_budget)
+
+    num_texts = len(fixed_embeddings)
+    print(f"Encoded {num_texts} texts ({len(chunks)} chunks + mini-chunks)")
+    print(f"Fixed batching: {num_texts / fixed_time:.2f} texts/sec")
+    print(f"Length bucketed batching: {num_texts / bucketed_time:.2f} texts/sec")
+
+    # Padding can shift values very slightly, but order must be fully restored
+    max_diff = numpy.max(
+        numpy.abs(numpy.array(fixed_embeddings) - numpy.array(bucketed_embeddings))
+    )
+    print(f"Max absolute difference between the two runs: {max_diff:.2e}")
+    assert max_diff < 1e-3, "Embeddings differ, original order was not restored"
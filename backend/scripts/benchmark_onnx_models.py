@@ -0,0 +1,165 @@
+# This file is purely for development use, not included in any builds
+# Compares the PyTorch / TensorFlow models against their ONNX Runtime exports on CPU:
+# latency, memory increase from loading the model and agreement of the outputs.
+# The ONNX models are exported into ONNX_MODEL_DIR on the first run, which takes a while
+import argparse
+import os
+import random
+import time
+from collections.abc import Callable
+from typing import Any
+
+import numpy
+from sentence_transformers import CrossEncoder  # type: ignore
+from sentence_transformers import SentenceTransformer  # type: ignore
+from transformers import TFDistilBertForSequenceClassification  # type: ignore
+
+from danswer.configs.model_configs import CROSS_EMBED_CONTEXT_SIZE
+from danswer.configs.model_configs import CROSS_ENCODER_MODEL_ENSEMBLE
+from danswer.configs.model_configs import DOC_EMBEDDING_CONTEXT_SIZE
+from danswer.configs.model_configs import DOCUMENT_ENCODER_MODEL
+from danswer.configs.model_configs import INTENT_MODEL_VERSION
+from danswer.search.onnx_models import load_onnx_cross_encoder
+from danswer.search.onnx_models import load_onnx_embedding_model
+from danswer.search.onnx_models import load_onnx_intent_model
+from danswer.search.search_utils import get_default_intent_model_tokenizer
+
+_WORDS = (
+    "how do i reset my password for the vpn when the connector fails to index "
+    "documents from confluence slack github and the web into danswer search"
+).split()
+
+
+def _random_text(num_words: int) -> str:
+    return " ".join(random.choices(_WORDS, k=num_words))
+
+
+def _get_rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _load(name: str, load_func: Callable[[], Any]) -> Any:
+    rss_before = _get_rss_mb()
+    model = load_func()
+    print(f"{name}: loading added {_get_rss_mb() - rss_before:.0f}MB resident memory")
+    return model
+
+
+def _time(func: Callable[[], Any], num_runs: int) -> tuple[Any, float]:
+    # first call is excluded, it includes lazy initialization
+    result = func()
+    start = time.time()
+    for _ in range(num_runs):
+        result = func()
+    return result, (time.time() - start) / num_runs
+
+
+def _benchmark_embedding(texts: list[str], num_runs: int, quantize: bool) -> None:
+    torch_model = _load(
+        "Embedding model (torch)", lambda: SentenceTransformer(DOCUMENT_ENCODER_MODEL)
+    )
+    torch_model.max_seq_length = DOC_EMBEDDING_CONTEXT_SIZE
+    onnx_model = _load(
+        "Embedding model (onnx)",
+        lambda: load_onnx_embedding_model(
+            DOCUMENT_ENCODER_MODEL, DOC_EMBEDDING_CONTEXT_SIZE, quantize=quantize
+        ),
+    )
+
+    torch_embeddings, torch_time = _time(
+        lambda: torch_model.encode(texts, normalize_embeddings=True), num_runs
+    )
+    onnx_embeddings, onnx_time = _time(
+        lambda: onnx_model.encode(texts, normalize_embeddings=True), num_runs
+    )
+    cosine_similarities = numpy.sum(torch_embeddings * onnx_embeddings, axis=1)
+    print(
+        f"Embedding {len(texts)} texts: torch {torch_time:.3f}s, onnx {onnx_time:.3f}s"
+    )
+    print(
+        f"\tCosine similarity torch vs onnx: mean {cosine_similarities.mean():.4f}, "
+        f"min {cosine_similarities.min():.4f}"
+    )
+
+
+def _benchmark_cross_encoders(
+    query: str, passages: list[str], num_runs: int, quantize: bool
+) -> None:
+    pairs = [(query, passage) for passage in passages]
+    for model_name in CROSS_ENCODER_MODEL_ENSEMBLE:
+        torch_model = _load(
+            f"{model_name} (torch)",
+            lambda: CrossEncoder(model_name, max_length=CROSS_EMBED_CONTEXT_SIZE),
+        )
+        onnx_model = _load(
+            f"{model_name} (onnx)",
+            lambda: load_onnx_cross_encoder(
+                model_name, CROSS_EMBED_CONTEXT_SIZE, quantize=quantize
+            ),
+        )
+
+        torch_scores, torch_time = _time(lambda: torch_model.predict(pairs), num_runs)
+        onnx_scores, onnx_time = _time(lambda: onnx_model.predict(pairs), num_runs)
+        # the reranking only depends on the order of the scores
+        same_order = numpy.mean(
+            numpy.argsort(-torch_scores) == numpy.argsort(-onnx_scores)
+        )
+        print(
+            f"Reranking {len(pairs)} pairs with {model_name}: "
+            f"torch {torch_time:.3f}s, onnx {onnx_time:.3f}s"
+        )
+        max_diff = numpy.abs(torch_scores - onnx_scores).max()
+        print(
+            f"\tMax score difference: {max_diff:.4f}, "
+            f"same rank for {100 * same_order:.0f}% of the passages"
+        )
+
+
+def _benchmark_intent_model(queries: list[str], num_runs: int, quantize: bool) -> None:
+    tokenizer = get_default_intent_model_tokenizer()
+    tf_model = _load(
+        "Intent model (tensorflow)",
+        lambda: TFDistilBertForSequenceClassification.from_pretrained(
+            INTENT_MODEL_VERSION
+        ),
+    )
+    onnx_model = _load(
+        "Intent model (onnx)",
+        lambda: load_onnx_intent_model(INTENT_MODEL_VERSION, quantize=quantize),
+    )
+    model_input = tokenizer(queries, return_tensors="np", truncation=True, padding=True)
+
+    tf_logits, tf_time = _time(
+        lambda: numpy.asarray(tf_model(model_input)[0]), num_runs
+    )
+    onnx_logits, onnx_time = _time(lambda: onnx_model(model_input)[0], num_runs)
+    same_class = numpy.mean(tf_logits.argmax(axis=-1) == onnx_logits.argmax(axis=-1))
+    print(
+        f"Intent for {len(queries)} queries: tensorflow {tf_time:.3f}s, "
+        f"onnx {onnx_time:.3f}s"
+    )
+    print(f"\tSame predicted intent for {100 * same_class:.0f}% of the queries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-texts", type=int, default=64)
+    parser.add_argument("--num-runs", type=int, default=5)
+    parser.add_argument(
+        "--no-quantize",
+        action="store_true",
+        help="Compare against the fp32 ONNX export instead of the int8 one",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    quantize = not args.no_quantize
+    passages = [_random_text(random.randint(20, 200)) for _ in range(args.num_texts)]
+    queries = [_random_text(random.randint(3, 15)) for _ in range(args.num_texts)]
+
+    _benchmark_embedding(passages, args.num_runs, quantize)
+    _benchmark_cross_encoders(queries[0], passages, args.num_runs, quantize)
+    _benchmark_intent_model(queries, args.num_runs, quantize)
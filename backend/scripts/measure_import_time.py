@@ -0,0 +1,71 @@
+# This file is purely for development use, not included in any builds
+# Measures how long importing the Danswer entrypoints takes and which packages the
+# time goes to, using `python -X importtime` in a fresh interpreter per module so that
+# modules already imported by a previous measurement don't hide their cost.
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+_DEFAULT_MODULES = [
+    "danswer.main",
+    "danswer.background.update",
+    "danswer.background.celery.celery",
+    "danswer.bots.slack.listener",
+    "danswer.chunking.chunk",
+    "danswer.search.search_utils",
+    "danswer.search.semantic_search",
+]
+
+
+def _import_times(statement: str) -> list[tuple[str, float]]:
+    """(module name, cumulative import time in seconds) of every module imported"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to run '{statement}':\n{result.stderr}")
+
+    import_times = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        import_times.append((name.strip(), int(cumulative) / 1e6))
+    return import_times
+
+
+def _measure(module: str, startup_modules: set[str]) -> tuple[float, dict[str, float]]:
+    """Returns the total import time of the module and the cumulative import time of
+    each top level package it pulls in, in seconds"""
+    total = 0.0
+    package_times: dict[str, float] = defaultdict(float)
+    for name, cumulative in _import_times(f"import {module}"):
+        if name == module:
+            total = cumulative
+        # nested packages (e.g. torch pulled in by sentence_transformers) are counted
+        # both on their own and as part of the package importing them
+        if "." not in name and name not in startup_modules:
+            package_times[name] += cumulative
+    return total, package_times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=_DEFAULT_MODULES)
+    parser.add_argument(
+        "--top", type=int, default=8, help="Number of slowest packages to show"
+    )
+    args = parser.parse_args()
+
+    # imported by the interpreter itself, not by the module being measured
+    startup_modules = {name for name, _ in _import_times("pass")}
+    for module in args.modules:
+        total, package_times = _measure(module, startup_modules)
+        print(f"{module}: {total:.2f}s")
+        slowest = sorted(package_times.items(), key=lambda item: -item[1])
+        for package, package_time in slowest[: args.top]:
+            print(f"\t{package}: {package_time:.2f}s")
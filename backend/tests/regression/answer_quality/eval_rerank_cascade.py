@@ -0,0 +1,112 @@
+import argparse
+import dataclasses
+import time
+
+import yaml
+
+from danswer.chunking.models import InferenceChunk
+from danswer.configs.app_configs import NUM_RERANKED_RESULTS
+from danswer.configs.app_configs import NUM_RETURNED_HITS
+from danswer.configs.model_configs import RERANK_CASCADE_NUM_SURVIVORS
+from danswer.datastores.document_index import get_default_document_index
+from danswer.search.models import RerankMetricsContainer
+from danswer.search.search_utils import warm_up_models
+from danswer.search.semantic_search import semantic_reranking
+from danswer.utils.callbacks import MetricsHander
+
+
+def _rerank(
+    query: str, chunks: list[InferenceChunk], enable_cascade: bool, num_survivors: int
+) -> tuple[RerankMetricsContainer | None, float]:
+    rerank_metrics = MetricsHander[RerankMetricsContainer]()
+    start = time.time()
+    semantic_reranking(
+        query,
+        # reranking reassigns the chunk scores, don't let the runs affect each other
+        [dataclasses.replace(chunk) for chunk in chunks],
+        rerank_metrics_callback=rerank_metrics.record_metric,
+        enable_cascade=enable_cascade,
+        cascade_num_survivors=num_survivors,
+    )
+    return rerank_metrics.metrics, time.time() - start
+
+
+def _top_ids(metrics: RerankMetricsContainer | None, top_k: int) -> list[str]:
+    if metrics is None:
+        return []
+    return [
+        f"{metric.document_id}:{metric.chunk_content_start}"
+        for metric in metrics.metrics[:top_k]
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compares the rankings of the full cross-encoder ensemble against "
+        "the cascaded reranking on the indexed data"
+    )
+    parser.add_argument(
+        "regression_yaml",
+        type=str,
+        help="Path to the Questions YAML file.",
+        default="./tests/regression/answer_quality/sample_questions.yaml",
+        nargs="?",
+    )
+    parser.add_argument(
+        "--num-survivors", type=int, default=RERANK_CASCADE_NUM_SURVIVORS
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=5,
+        help="Number of top reranked chunks to compare between the two modes.",
+    )
+    args = parser.parse_args()
+
+    with open(args.regression_yaml, "r") as file:
+        questions_data = yaml.safe_load(file)
+
+    warm_up_models()
+    document_index = get_default_document_index()
+
+    full_total_time = 0.0
+    cascade_total_time = 0.0
+    total_overlap = 0.0
+    num_questions = 0
+    for sample in questions_data["questions"]:
+        query = sample["question"]
+        top_chunks = document_index.semantic_retrieval(
+            query, None, None, NUM_RETURNED_HITS
+        )
+        if not top_chunks:
+            print(f"Question {sample['id']}: no results, skipping")
+            continue
+        candidates = top_chunks[:NUM_RERANKED_RESULTS]
+
+        full_metrics, full_time = _rerank(query, candidates, False, args.num_survivors)
+        cascade_metrics, cascade_time = _rerank(
+            query, candidates, True, args.num_survivors
+        )
+
+        full_top = _top_ids(full_metrics, args.top_k)
+        cascade_top = _top_ids(cascade_metrics, args.top_k)
+        overlap = len(set(full_top) & set(cascade_top)) / max(len(full_top), 1)
+
+        print(f"Question {sample['id']}: {query}")
+        print(f"\tTop {args.top_k} overlap: {overlap:.2f}")
+        print(f"\tSame top result: {full_top[:1] == cascade_top[:1]}")
+        print(f"\tFull ensemble: {full_time:.3f}s, cascade: {cascade_time:.3f}s")
+
+        full_total_time += full_time
+        cascade_total_time += cascade_time
+        total_overlap += overlap
+        num_questions += 1
+
+    if num_questions:
+        print(
+            f"\nAverage top {args.top_k} overlap: {total_overlap / num_questions:.2f}"
+        )
+        print(
+            f"Average rerank time, full ensemble: {full_total_time / num_questions:.3f}s, "
+            f"cascade: {cascade_total_time / num_questions:.3f}s"
+        )